@@ -1,22 +1,29 @@
+import math
 import tkinter as tk
 from tkinter import ttk
-from math import exp, factorial
+
+from bet_ledger import BetLedger
+from goal_timing import shared_cache
+from match_timeseries import MatchTimeSeries
+from pricing_core import PROFILES, compute_lambdas, next_goal_probability, next_goal_recommendation, state_from_fields
+
+# Markets whose bets this view records
+MARKETS = ("next_goal",)
 
 class FootballBettingModel:
-    def __init__(self, root):
+    def __init__(self, root, ledger=None, match_id="match"):
+        # root is a Tk window, or a frame when hosted by launcher.py
         self.root = root
-        self.root.title("Odds Apex IP Next Goal")
+        # Bets recorded from this view go in the ledger under match_id
+        self.match_id = match_id
+        self.pending_bets = []  # (market, selection, recommendation, odds) from the last calculation
+        if isinstance(root, tk.Wm):
+            self.root.title("Odds Apex IP Next Goal")
         self.create_widgets()
-        # History is still maintained for potential future use
-        self.history = {
-            "home_xg": [],
-            "away_xg": [],
-            "home_sot": [],
-            "away_sot": [],
-            "home_possession": [],
-            "away_possession": []
-        }
-        self.history_length = 10  # Store last 10 updates
+        # In-play stats over time, with momentum features kept up to date per update
+        self.series = MatchTimeSeries()
+        # Open bets; stakes are sized off the balance less their worst-case liability
+        self.ledger = ledger if ledger is not None else BetLedger()
 
     def create_widgets(self):
         # Create a canvas and scrollbar
@@ -84,182 +91,92 @@ class FootballBettingModel:
         self.next_goal_label = ttk.Label(self.scrollable_frame, text="", font=("TkDefaultFont", 10, "bold"))
         self.next_goal_label.grid(row=row+2, column=0, columnspan=2, pady=10)
 
+        # Who scores next and when, from the distribution market_scanner also reads
+        self.timing_label = ttk.Label(self.scrollable_frame, text="")
+        self.timing_label.grid(row=row+3, column=0, columnspan=2, pady=5)
+
+        # Record the last recommendation as placed, or clear this view's open bets
+        bet_frame = ttk.Frame(self.scrollable_frame)
+        bet_frame.grid(row=row+4, column=0, columnspan=2, pady=10)
+        ttk.Button(bet_frame, text="Record Bet", command=self.record_bet).grid(row=0, column=0, padx=5)
+        ttk.Button(bet_frame, text="Clear Bets", command=self.clear_bets).grid(row=0, column=1, padx=5)
+        self.ledger_label = ttk.Label(self.scrollable_frame, text="")
+        self.ledger_label.grid(row=row+5, column=0, columnspan=2, pady=5)
+
     def reset_fields(self):
         for var in self.fields.values():
             if isinstance(var, tk.DoubleVar):
                 var.set(0.0)
             elif isinstance(var, tk.IntVar):
                 var.set(0)
-        self.history = {
-            "home_xg": [],
-            "away_xg": [],
-            "home_sot": [],
-            "away_sot": [],
-            "home_possession": [],
-            "away_possession": []
-        }
-
-    def zero_inflated_poisson_probability(self, lam, k, p_zero=0.06):
-        if k == 0:
-            return p_zero + (1 - p_zero) * exp(-lam)
-        return (1 - p_zero) * ((lam ** k) * exp(-lam)) / factorial(k)
-
-    def time_decay_adjustment(self, lambda_xg, elapsed_minutes, in_game_xg):
-        remaining_minutes = 90 - elapsed_minutes
-        base_decay = exp(-0.01 * elapsed_minutes)
-        base_decay = max(base_decay, 0.6)
-        if in_game_xg > 1.5:
-            base_decay *= 1.15
-        elif remaining_minutes < 10:
-            base_decay *= 0.65
-        adjusted_lambda = lambda_xg * base_decay
-        return max(0.1, adjusted_lambda)
-
-    def dynamic_kelly(self, edge):
-        kelly_fraction = 0.05 * edge
-        return max(0, kelly_fraction)
-
-    def update_history(self, key, value):
-        if key not in self.history:
-            self.history[key] = []
-        if len(self.history[key]) >= self.history_length:
-            self.history[key].pop(0)
-        self.history[key].append(value)
-
-    def adjust_xg_for_scoreline(self, home_goals, away_goals, lambda_home, lambda_away, elapsed_minutes):
-        goal_diff = home_goals - away_goals
-        if goal_diff == 1:
-            lambda_home *= 0.9
-            lambda_away *= 1.2
-        elif goal_diff == -1:
-            lambda_home *= 1.2
-            lambda_away *= 0.9
-        elif goal_diff == 0:
-            lambda_home *= 1.05
-            lambda_away *= 1.05
-        elif abs(goal_diff) >= 2:
-            lambda_home *= 0.8
-            lambda_away *= 1.3 if goal_diff > 0 else 0.8
-        if elapsed_minutes > 75 and abs(goal_diff) >= 1:
-            lambda_home *= 0.85
-            lambda_away *= 1.15 if goal_diff > 0 else 0.85
-        return lambda_home, lambda_away
+        self.series.clear()
 
     def calculate_fair_odds(self):
-        # Retrieve user inputs
-        home_xg = self.fields["Home Xg"].get()
-        away_xg = self.fields["Away Xg"].get()
-        elapsed_minutes = self.fields["Elapsed Minutes"].get()
-        home_goals = self.fields["Home Goals"].get()
-        away_goals = self.fields["Away Goals"].get()
-        in_game_home_xg = self.fields["In-Game Home Xg"].get()
-        in_game_away_xg = self.fields["In-Game Away Xg"].get()
-        home_possession = self.fields["Home Possession %"].get()
-        away_possession = self.fields["Away Possession %"].get()
-        account_balance = self.fields["Account Balance"].get()
-        live_next_goal_odds = self.fields["Live Next Goal Odds"].get()
-
-        home_avg_goals_scored = self.fields["Home Avg Goals Scored"].get()
-        home_avg_goals_conceded = self.fields["Home Avg Goals Conceded"].get()
-        away_avg_goals_scored = self.fields["Away Avg Goals Scored"].get()
-        away_avg_goals_conceded = self.fields["Away Avg Goals Conceded"].get()
-
-        home_sot = self.fields["Home Shots on Target"].get()
-        away_sot = self.fields["Away Shots on Target"].get()
+        state = state_from_fields(self.fields)
+        account_balance = self.ledger.available_bankroll(state["account_balance"])
+        live_next_goal_odds = state["live_next_goal_odds"]
 
-        # Retrieve new metrics for attacking intent and set pieces
-        home_op_box_touches = self.fields["Home Opp Box Touches"].get()
-        away_op_box_touches = self.fields["Away Opp Box Touches"].get()
-        home_corners = self.fields["Home Corners"].get()
-        away_corners = self.fields["Away Corners"].get()
+        # Record this update in the match time series
+        self.series.append_fields(self.fields)
 
-        # Update history (if needed)
-        self.update_history("home_xg", home_xg)
-        self.update_history("away_xg", away_xg)
-        self.update_history("home_sot", home_sot)
-        self.update_history("away_sot", away_sot)
-        self.update_history("home_possession", home_possession)
-        self.update_history("away_possession", away_possession)
-
-        remaining_minutes = 90 - elapsed_minutes
-        lambda_home = self.time_decay_adjustment(in_game_home_xg + (home_xg * remaining_minutes / 90), elapsed_minutes, in_game_home_xg)
-        lambda_away = self.time_decay_adjustment(in_game_away_xg + (away_xg * remaining_minutes / 90), elapsed_minutes, in_game_away_xg)
-
-        lambda_home, lambda_away = self.adjust_xg_for_scoreline(home_goals, away_goals, lambda_home, lambda_away, elapsed_minutes)
-
-        lambda_home = (lambda_home * 0.85) + ((home_avg_goals_scored / max(0.75, away_avg_goals_conceded)) * 0.15)
-        lambda_away = (lambda_away * 0.85) + ((away_avg_goals_scored / max(0.75, home_avg_goals_conceded)) * 0.15)
-
-        lambda_home *= 1 + ((home_possession - 50) / 200)
-        lambda_away *= 1 + ((away_possession - 50) / 200)
-
-        if in_game_home_xg > 1.2:
-            lambda_home *= 1.15
-        if in_game_away_xg > 1.2:
-            lambda_away *= 1.15
-
-        lambda_home *= 1 + (home_sot / 20)
-        lambda_away *= 1 + (away_sot / 20)
-
-        # Adjust lambda based on touches in the opposition box and corners.
-        lambda_home *= 1 + ((home_op_box_touches - 20) / 200)
-        lambda_away *= 1 + ((away_op_box_touches - 20) / 200)
-        lambda_home *= 1 + ((home_corners - 4) / 50)
-        lambda_away *= 1 + ((away_corners - 4) / 50)
-
-        # Next goal probability settings (using a simplified model)
-        goal_probability = 1 - exp(-((lambda_home + lambda_away) * remaining_minutes / 45))
-        goal_probability = max(0.30, min(0.90, goal_probability))
+        # Lambda chain, goal probability and staking from the shared pricing core
+        lambda_home, lambda_away = compute_lambdas(state, "next_goal")
+        goal_probability = next_goal_probability(lambda_home, lambda_away, 90 - state["elapsed_minutes"])
         fair_next_goal_odds = 1 / goal_probability
 
         # Build the output text header
         next_goal_text = f"⚽ Goal Probability: {goal_probability:.2%} → Fair Next Goal Odds: {fair_next_goal_odds:.2f}\n"
 
-        # Determine recommendation based on the relationship between live and fair odds
-        recommendation_type = "none"
-        if live_next_goal_odds > 0:
-            if fair_next_goal_odds > live_next_goal_odds:
-                # Lay bet recommended (fair odds higher than live odds)
-                edge_lay = (fair_next_goal_odds - live_next_goal_odds) / fair_next_goal_odds
-                if edge_lay > 0:
-                    kelly_fraction_lay = self.dynamic_kelly(edge_lay)
-                    liability_lay = account_balance * kelly_fraction_lay
-                    # For lay bets, the liability is the stake and profit is what you earn from the backer's stake.
-                    profit_lay = liability_lay / (live_next_goal_odds - 1) if (live_next_goal_odds - 1) > 0 else 0
-                    next_goal_text += (f"Lay Next Goal at {live_next_goal_odds:.2f} | "
-                                       f"Liability: {liability_lay:.2f} | Profit: {profit_lay:.2f}\n")
-                    recommendation_type = "lay"
-                else:
-                    next_goal_text += "No value bet found\n"
-                    recommendation_type = "none"
-            elif live_next_goal_odds > fair_next_goal_odds:
-                # Back bet recommended (live odds higher than fair odds)
-                edge_back = (live_next_goal_odds - fair_next_goal_odds) / fair_next_goal_odds
-                if edge_back > 0:
-                    kelly_fraction_back = self.dynamic_kelly(edge_back)
-                    stake_back = account_balance * kelly_fraction_back
-                    profit_back = stake_back * (live_next_goal_odds - 1)
-                    next_goal_text += (f"Back Next Goal at {live_next_goal_odds:.2f} | "
-                                       f"Stake: {stake_back:.2f} | Profit: {profit_back:.2f}\n")
-                    recommendation_type = "back"
-                else:
-                    next_goal_text += "No value bet found\n"
-                    recommendation_type = "none"
-            else:
-                next_goal_text += "No bet found\n"
-                recommendation_type = "none"
-        else:
-            next_goal_text += "No bet found\n"
-            recommendation_type = "none"
-
-        # Set the label color based on recommendation:
-        # Lay bets in red, Back bets in blue, and no bet in black.
-        if recommendation_type == "lay":
+        recommendation = next_goal_recommendation(fair_next_goal_odds, live_next_goal_odds, account_balance,
+                                                  PROFILES["next_goal"]["kelly"])
+        self.pending_bets = []
+        if recommendation["side"] is not None and live_next_goal_odds > 1:
+            self.pending_bets.append(("next_goal", "goal", recommendation, live_next_goal_odds))
+        if recommendation["side"] == "lay":
+            # For lay bets, the liability is the stake and profit is what you earn from the backer's stake.
+            next_goal_text += (f"Lay Next Goal at {live_next_goal_odds:.2f} | "
+                               f"Liability: {recommendation['liability']:.2f} | Profit: {recommendation['profit']:.2f}\n")
+            # Lay bets in red, Back bets in blue, and no bet in black.
             self.next_goal_label.config(text=next_goal_text, foreground="red")
-        elif recommendation_type == "back":
+        elif recommendation["side"] == "back":
+            next_goal_text += (f"Back Next Goal at {live_next_goal_odds:.2f} | "
+                               f"Stake: {recommendation['stake']:.2f} | Profit: {recommendation['profit']:.2f}\n")
             self.next_goal_label.config(text=next_goal_text, foreground="blue")
         else:
+            next_goal_text += "No bet found\n"
             self.next_goal_label.config(text=next_goal_text, foreground="black")
+        self.show_goal_timing(state)
+
+    def show_goal_timing(self, state):
+        try:
+            timing = shared_cache("next_goal").get(state)
+        except ImportError:
+            # The minute-by-minute distribution needs numpy
+            self.timing_label.config(text="")
+            return
+        expected = timing["expected_minute"]
+        expected_text = "-" if math.isnan(expected) else f"{expected:.0f}'"
+        self.timing_label.config(text=f"⏱ Next goal: Home {timing['prob_home_next']:.2%} | "
+                                      f"Away {timing['prob_away_next']:.2%} | "
+                                      f"None {1 - timing['prob_goal']:.2%} | "
+                                      f"Expected minute: {expected_text}\n")
+
+    def record_bet(self):
+        # Enter the last calculation's recommendations in the ledger as matched at the live odds
+        placed = [bet for bet in (self.ledger.place_recommendation(self.match_id, *pending)
+                                  for pending in self.pending_bets) if bet is not None]
+        self.pending_bets = []
+        self.show_ledger(f"Recorded {len(placed)} bet(s)" if placed else "No bet to record")
+
+    def clear_bets(self):
+        # Remove this view's open bets, e.g. once the market has been settled
+        for market in MARKETS:
+            self.ledger.void(self.match_id, market)
+        self.show_ledger("Bets cleared")
+
+    def show_ledger(self, message):
+        self.ledger_label.config(text=f"{message} | Open bets: {self.ledger.open_bets} | "
+                                      f"Open liability: {self.ledger.open_liability:.2f}")
 
 if __name__ == "__main__":
     root = tk.Tk()
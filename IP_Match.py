@@ -1,22 +1,28 @@
 import tkinter as tk
 from tkinter import ttk
-from math import exp, factorial
+
+from bet_ledger import BetLedger
+from match_timeseries import MatchTimeSeries
+from pricing_core import (PROFILES, compute_lambdas, fair_odds, match_odds_recommendation, match_outcome_probabilities,
+                          state_from_fields)
+
+# Markets whose bets this view records
+MARKETS = ("match_odds",)
 
 class FootballBettingModel:
-    def __init__(self, root):
+    def __init__(self, root, ledger=None, match_id="match"):
+        # root is a Tk window, or a frame when hosted by launcher.py
         self.root = root
-        self.root.title("Odds Apex IP Match Odds")
+        # Bets recorded from this view go in the ledger under match_id
+        self.match_id = match_id
+        self.pending_bets = []  # (market, selection, recommendation, odds) from the last calculation
+        if isinstance(root, tk.Wm):
+            self.root.title("Odds Apex IP Match Odds")
         self.create_widgets()
-        # History is maintained for potential future use
-        self.history = {
-            "home_xg": [],
-            "away_xg": [],
-            "home_sot": [],
-            "away_sot": [],
-            "home_possession": [],
-            "away_possession": []
-        }
-        self.history_length = 10  # Store last 10 updates
+        # In-play stats over time, with momentum features kept up to date per update
+        self.series = MatchTimeSeries()
+        # Open bets; stakes are sized off the balance less their worst-case liability
+        self.ledger = ledger if ledger is not None else BetLedger()
 
     def create_widgets(self):
         # Create a canvas and scrollbar for scrolling
@@ -87,232 +93,85 @@ class FootballBettingModel:
         self.recommendation_text.tag_configure("normal", foreground="black")
         self.recommendation_text.config(state="disabled")
 
+        # Record the last recommendation as placed, or clear this view's open bets
+        bet_frame = ttk.Frame(self.scrollable_frame)
+        bet_frame.grid(row=row+3, column=0, columnspan=2, pady=10)
+        ttk.Button(bet_frame, text="Record Bet", command=self.record_bet).grid(row=0, column=0, padx=5)
+        ttk.Button(bet_frame, text="Clear Bets", command=self.clear_bets).grid(row=0, column=1, padx=5)
+        self.ledger_label = ttk.Label(self.scrollable_frame, text="")
+        self.ledger_label.grid(row=row+4, column=0, columnspan=2, pady=5)
+
     def reset_fields(self):
         for var in self.fields.values():
             if isinstance(var, tk.DoubleVar):
                 var.set(0.0)
             elif isinstance(var, tk.IntVar):
                 var.set(0)
-        self.history = {
-            "home_xg": [],
-            "away_xg": [],
-            "home_sot": [],
-            "away_sot": [],
-            "home_possession": [],
-            "away_possession": []
-        }
-
-    def zero_inflated_poisson_probability(self, lam, k, p_zero=0.06):
-        if k == 0:
-            return p_zero + (1 - p_zero) * exp(-lam)
-        return (1 - p_zero) * ((lam ** k) * exp(-lam)) / factorial(k)
-
-    def time_decay_adjustment(self, lambda_xg, elapsed_minutes, in_game_xg):
-        remaining_minutes = 90 - elapsed_minutes
-        base_decay = exp(-0.01 * elapsed_minutes)
-        base_decay = max(base_decay, 0.6)
-        if in_game_xg > 1.5:
-            base_decay *= 1.15
-        elif remaining_minutes < 10:
-            base_decay *= 0.65
-        adjusted_lambda = lambda_xg * base_decay
-        return max(0.1, adjusted_lambda)
-
-    def adjust_xg_for_scoreline(self, home_goals, away_goals, lambda_home, lambda_away, elapsed_minutes):
-        goal_diff = home_goals - away_goals
-        if goal_diff == 1:
-            lambda_home *= 0.9
-            lambda_away *= 1.2
-        elif goal_diff == -1:
-            lambda_home *= 1.2
-            lambda_away *= 0.9
-        elif goal_diff == 0:
-            lambda_home *= 1.05
-            lambda_away *= 1.05
-        elif abs(goal_diff) >= 2:
-            lambda_home *= 0.8
-            lambda_away *= 1.3 if goal_diff > 0 else 0.8
-        if elapsed_minutes > 75 and abs(goal_diff) >= 1:
-            lambda_home *= 0.85
-            lambda_away *= 1.15 if goal_diff > 0 else 0.85
-        return lambda_home, lambda_away
+        self.series.clear()
 
     def calculate_fair_odds(self):
-        # Retrieve user inputs
-        home_xg = self.fields["Home Xg"].get()
-        away_xg = self.fields["Away Xg"].get()
-        elapsed_minutes = self.fields["Elapsed Minutes"].get()
-        home_goals = self.fields["Home Goals"].get()
-        away_goals = self.fields["Away Goals"].get()
-        in_game_home_xg = self.fields["In-Game Home Xg"].get()
-        in_game_away_xg = self.fields["In-Game Away Xg"].get()
-        home_possession = self.fields["Home Possession %"].get()
-        away_possession = self.fields["Away Possession %"].get()
-
-        home_avg_goals_scored = self.fields["Home Avg Goals Scored"].get()
-        home_avg_goals_conceded = self.fields["Home Avg Goals Conceded"].get()
-        away_avg_goals_scored = self.fields["Away Avg Goals Scored"].get()
-        away_avg_goals_conceded = self.fields["Away Avg Goals Conceded"].get()
-
-        home_sot = self.fields["Home Shots on Target"].get()
-        away_sot = self.fields["Away Shots on Target"].get()
-
-        # New metrics for attacking intent and set pieces
-        home_op_box_touches = self.fields["Home Opp Box Touches"].get()
-        away_op_box_touches = self.fields["Away Opp Box Touches"].get()
-        home_corners = self.fields["Home Corners"].get()
-        away_corners = self.fields["Away Corners"].get()
-
-        # Live odds for match outcomes
-        live_odds_home = self.fields["Live Odds Home"].get()
-        live_odds_draw = self.fields["Live Odds Draw"].get()
-        live_odds_away = self.fields["Live Odds Away"].get()
+        state = state_from_fields(self.fields)
+        settings = PROFILES["match_odds"]
 
         # Account Balance (formerly "Profit")
-        account_balance = self.fields["Account Balance"].get()
-
-        # Update history (if needed)
-        self.update_history("home_xg", home_xg)
-        self.update_history("away_xg", away_xg)
-        self.update_history("home_sot", home_sot)
-        self.update_history("away_sot", away_sot)
-        self.update_history("home_possession", home_possession)
-        self.update_history("away_possession", away_possession)
-
-        remaining_minutes = 90 - elapsed_minutes
-        lambda_home = self.time_decay_adjustment(in_game_home_xg + (home_xg * remaining_minutes / 90), elapsed_minutes, in_game_home_xg)
-        lambda_away = self.time_decay_adjustment(in_game_away_xg + (away_xg * remaining_minutes / 90), elapsed_minutes, in_game_away_xg)
-
-        lambda_home, lambda_away = self.adjust_xg_for_scoreline(home_goals, away_goals, lambda_home, lambda_away, elapsed_minutes)
-
-        lambda_home = (lambda_home * 0.85) + ((home_avg_goals_scored / max(0.75, away_avg_goals_conceded)) * 0.15)
-        lambda_away = (lambda_away * 0.85) + ((away_avg_goals_scored / max(0.75, home_avg_goals_conceded)) * 0.15)
-
-        lambda_home *= 1 + ((home_possession - 50) / 200)
-        lambda_away *= 1 + ((away_possession - 50) / 200)
-
-        if in_game_home_xg > 1.2:
-            lambda_home *= 1.15
-        if in_game_away_xg > 1.2:
-            lambda_away *= 1.15
-
-        lambda_home *= 1 + (home_sot / 20)
-        lambda_away *= 1 + (away_sot / 20)
-
-        # Adjust lambda based on touches in the opposition box and corners.
-        lambda_home *= 1 + ((home_op_box_touches - 20) / 200)
-        lambda_away *= 1 + ((away_op_box_touches - 20) / 200)
-        lambda_home *= 1 + ((home_corners - 4) / 50)
-        lambda_away *= 1 + ((away_corners - 4) / 50)
-
-        # Calculate match outcome probabilities using the zero-inflated Poisson model
-        home_win_probability = 0
-        away_win_probability = 0
-        draw_probability = 0
-        for home_goals_remaining in range(6):
-            for away_goals_remaining in range(6):
-                prob = self.zero_inflated_poisson_probability(lambda_home, home_goals_remaining) * \
-                       self.zero_inflated_poisson_probability(lambda_away, away_goals_remaining)
-                if home_goals + home_goals_remaining > away_goals + away_goals_remaining:
-                    home_win_probability += prob
-                elif home_goals + home_goals_remaining < away_goals + away_goals_remaining:
-                    away_win_probability += prob
-                else:
-                    draw_probability += prob
-
-        total_prob = home_win_probability + away_win_probability + draw_probability
-        if total_prob > 0:
-            home_win_probability /= total_prob
-            away_win_probability /= total_prob
-            draw_probability /= total_prob
-
-        # Calculate fair odds from probabilities
-        fair_odds_home = 1 / home_win_probability if home_win_probability > 0 else float('inf')
-        fair_odds_draw = 1 / draw_probability if draw_probability > 0 else float('inf')
-        fair_odds_away = 1 / away_win_probability if away_win_probability > 0 else float('inf')
-
-        # For each market, calculate the edge and recommended stake using quarter Kelly (0.25 factor).
-
-        # Home market:
-        if fair_odds_home > live_odds_home:
-            # Lay opportunity:
-            edge_home = (fair_odds_home - live_odds_home) / fair_odds_home
-            recommended_liability_home = account_balance * 0.25 * edge_home
-            recommended_lay_stake_home = (recommended_liability_home / (live_odds_home - 1)) if (live_odds_home - 1) > 0 else 0
-            home_line = (f"Lay Home: Edge: {edge_home:.2%}, Liability: {recommended_liability_home:.2f}, "
-                         f"Lay Stake: {recommended_lay_stake_home:.2f}\n")
-            home_tag = "lay"
-        elif fair_odds_home < live_odds_home:
-            # Back opportunity:
-            edge_home = (live_odds_home - fair_odds_home) / fair_odds_home
-            recommended_stake_home = account_balance * 0.25 * edge_home
-            profit_home = recommended_stake_home * (live_odds_home - 1)
-            home_line = (f"Back Home: Edge: {edge_home:.2%}, Stake: {recommended_stake_home:.2f}, "
-                         f"Profit: {profit_home:.2f}\n")
-            home_tag = "back"
-        else:
-            home_line = "Home: No clear edge.\n"
-            home_tag = "normal"
-        
-        # Draw market:
-        if fair_odds_draw > live_odds_draw:
-            edge_draw = (fair_odds_draw - live_odds_draw) / fair_odds_draw
-            recommended_liability_draw = account_balance * 0.25 * edge_draw
-            recommended_lay_stake_draw = (recommended_liability_draw / (live_odds_draw - 1)) if (live_odds_draw - 1) > 0 else 0
-            draw_line = (f"Lay Draw: Edge: {edge_draw:.2%}, Liability: {recommended_liability_draw:.2f}, "
-                         f"Lay Stake: {recommended_lay_stake_draw:.2f}\n")
-            draw_tag = "lay"
-        elif fair_odds_draw < live_odds_draw:
-            edge_draw = (live_odds_draw - fair_odds_draw) / fair_odds_draw
-            recommended_stake_draw = account_balance * 0.25 * edge_draw
-            profit_draw = recommended_stake_draw * (live_odds_draw - 1)
-            draw_line = (f"Back Draw: Edge: {edge_draw:.2%}, Stake: {recommended_stake_draw:.2f}, "
-                         f"Profit: {profit_draw:.2f}\n")
-            draw_tag = "back"
-        else:
-            draw_line = "Draw: No clear edge.\n"
-            draw_tag = "normal"
-        
-        # Away market:
-        if fair_odds_away > live_odds_away:
-            edge_away = (fair_odds_away - live_odds_away) / fair_odds_away
-            recommended_liability_away = account_balance * 0.25 * edge_away
-            recommended_lay_stake_away = (recommended_liability_away / (live_odds_away - 1)) if (live_odds_away - 1) > 0 else 0
-            away_line = (f"Lay Away: Edge: {edge_away:.2%}, Liability: {recommended_liability_away:.2f}, "
-                         f"Lay Stake: {recommended_lay_stake_away:.2f}\n")
-            away_tag = "lay"
-        elif fair_odds_away < live_odds_away:
-            edge_away = (live_odds_away - fair_odds_away) / fair_odds_away
-            recommended_stake_away = account_balance * 0.25 * edge_away
-            profit_away = recommended_stake_away * (live_odds_away - 1)
-            away_line = (f"Back Away: Edge: {edge_away:.2%}, Stake: {recommended_stake_away:.2f}, "
-                         f"Profit: {profit_away:.2f}\n")
-            away_tag = "back"
-        else:
-            away_line = "Away: No clear edge.\n"
-            away_tag = "normal"
+        account_balance = self.ledger.available_bankroll(state["account_balance"])
+
+        # Record this update in the match time series
+        self.series.append_fields(self.fields)
+
+        # Lambda chain and zero-inflated Poisson outcome grid from the shared pricing core
+        lambda_home, lambda_away = compute_lambdas(state, "match_odds")
+        probabilities = match_outcome_probabilities(lambda_home, lambda_away, state["home_goals"],
+                                                    state["away_goals"], settings["p_zero"])
+        fair = [fair_odds(probability) for probability in probabilities]
+        live = [state["live_odds_home"], state["live_odds_draw"], state["live_odds_away"]]
+
+        # For each market, the edge and recommended stake using quarter Kelly (0.25 factor).
+        lines = []
+        self.pending_bets = []
+        for name, fair_price, live_price in zip(("Home", "Draw", "Away"), fair, live):
+            rec = match_odds_recommendation(fair_price, live_price, account_balance, settings["kelly"])
+            if rec["side"] is not None and live_price > 1:
+                self.pending_bets.append(("match_odds", name.lower(), rec, live_price))
+            if rec["side"] == "lay":
+                lines.append((f"Lay {name}: Edge: {rec['edge']:.2%}, Liability: {rec['liability']:.2f}, "
+                              f"Lay Stake: {rec['stake']:.2f}\n", "lay"))
+            elif rec["side"] == "back":
+                lines.append((f"Back {name}: Edge: {rec['edge']:.2%}, Stake: {rec['stake']:.2f}, "
+                              f"Profit: {rec['profit']:.2f}\n", "back"))
+            else:
+                lines.append((f"{name}: No clear edge.\n", "normal"))
 
         # Build a summary header
         summary = (
-            f"Fair Odds - Home: {fair_odds_home:.2f}, Draw: {fair_odds_draw:.2f}, Away: {fair_odds_away:.2f}\n"
-            f"Live Odds - Home: {live_odds_home:.2f}, Draw: {live_odds_draw:.2f}, Away: {live_odds_away:.2f}\n\n"
+            f"Fair Odds - Home: {fair[0]:.2f}, Draw: {fair[1]:.2f}, Away: {fair[2]:.2f}\n"
+            f"Live Odds - Home: {live[0]:.2f}, Draw: {live[1]:.2f}, Away: {live[2]:.2f}\n\n"
         )
 
         # Update the recommendation text widget with multi-colored recommendations.
         self.recommendation_text.config(state="normal")
         self.recommendation_text.delete("1.0", tk.END)
         self.recommendation_text.insert(tk.END, summary, "normal")
-        self.recommendation_text.insert(tk.END, home_line, home_tag)
-        self.recommendation_text.insert(tk.END, draw_line, draw_tag)
-        self.recommendation_text.insert(tk.END, away_line, away_tag)
+        for line, tag in lines:
+            self.recommendation_text.insert(tk.END, line, tag)
         self.recommendation_text.config(state="disabled")
 
-    def update_history(self, key, value):
-        if key not in self.history:
-            self.history[key] = []
-        if len(self.history[key]) >= self.history_length:
-            self.history[key].pop(0)
-        self.history[key].append(value)
+    def record_bet(self):
+        # Enter the last calculation's recommendations in the ledger as matched at the live odds
+        placed = [bet for bet in (self.ledger.place_recommendation(self.match_id, *pending)
+                                  for pending in self.pending_bets) if bet is not None]
+        self.pending_bets = []
+        self.show_ledger(f"Recorded {len(placed)} bet(s)" if placed else "No bet to record")
+
+    def clear_bets(self):
+        # Remove this view's open bets, e.g. once the market has been settled
+        for market in MARKETS:
+            self.ledger.void(self.match_id, market)
+        self.show_ledger("Bets cleared")
+
+    def show_ledger(self, message):
+        self.ledger_label.config(text=f"{message} | Open bets: {self.ledger.open_bets} | "
+                                      f"Open liability: {self.ledger.open_liability:.2f}")
 
 if __name__ == "__main__":
     root = tk.Tk()
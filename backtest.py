@@ -0,0 +1,374 @@
+"""
+Walk-forward backtest of IP_Match's match-odds strategy on replayed ticks.
+
+Each match is replayed snapshot by snapshot (stats plus live 1X2 odds, usually
+one per minute) through IP_Match's model. Whenever the app would recommend a
+lay or back with at least min_edge, the quarter-Kelly bet it prints is filled
+at the live odds (less any slippage; a lay is re-sized at the filled odds so
+it keeps the recommended liability) and recorded in a BetLedger. The market
+is settled on the final score, less commission on net winnings.
+
+The fair odds of every snapshot are priced per match in worker processes.
+The snapshots of all matches are then replayed in time order (kickoff plus
+elapsed minutes) against one ledger, so every stake comes out of the bankroll
+left after the open liability of all the matches in play at the time, and
+the bankroll includes every match settled before then. Without a kickoff
+column the matches are played one after another in file order.
+
+Reported: ROI (net profit over the amount risked: back stakes plus lay
+liabilities), bankroll growth, maximum drawdown of the bankroll after each
+round of settlements, and stake-weighted CLV. CLV compares each fill with the
+odds clv_horizon minutes later (or the last snapshot), which stands in for a
+closing line in-play: odds/later - 1 for a back, later/odds - 1 for a lay.
+
+Snapshot files are CSV with a match id column (see fixture_loader.ID_COLUMNS),
+the in-play inputs under pricing_core.STATE_KEYS or IP_Match's field labels,
+and optionally "kickoff" (epoch seconds or ISO 8601) and
+"final_home_goals"/"final_away_goals" (otherwise the last snapshot's score).
+
+    python backtest.py snapshots.csv [--processes N] [--bankroll 1000] [--min-edge 0.05] [--out report.json]
+    python backtest.py --synthetic 380
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from math import exp, isfinite
+
+from batch_pricing import price_states
+from bet_ledger import BetLedger
+from fixture_loader import ID_COLUMNS
+from pricing_core import (FIELD_KEYS, PROFILES, STATE_KEYS, match_odds_recommendation,
+                          match_outcome_probabilities, new_state)
+
+OUTCOMES = ("home", "draw", "away")
+KICKOFF_COLUMNS = ("kickoff", "kickoff_time", "start_time")
+# Minutes from kickoff to the end of a match, for matches whose last snapshot is earlier
+MATCH_LENGTH = 110
+
+
+# --- loading ---
+
+
+def _timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def load_snapshots(path):
+    """
+    Matches from a snapshot CSV, in kickoff order: a list of dicts with
+    match_id, kickoff (None without a kickoff column), final (home, away)
+    goals and columns (a column dict of states ordered by elapsed minutes).
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        keys = [FIELD_KEYS.get(name, name) for name in header]
+        id_index = next((i for i, key in enumerate(keys) if key in ID_COLUMNS), None)
+        if id_index is None:
+            raise ValueError("%s has no match id column (one of %s)" % (path, ", ".join(ID_COLUMNS)))
+        state_index = [(key, i) for i, key in enumerate(keys) if key in STATE_KEYS]
+        kickoff_index = next((i for i, key in enumerate(keys) if key in KICKOFF_COLUMNS), None)
+        final_index = [keys.index(key) if key in keys else None for key in ("final_home_goals", "final_away_goals")]
+
+        matches = {}
+        for row in reader:
+            if not row:
+                continue
+            match_id = row[id_index]
+            match = matches.get(match_id)
+            if match is None:
+                match = matches[match_id] = {"match_id": match_id, "kickoff": None, "final": None, "states": []}
+                if kickoff_index is not None:
+                    match["kickoff"] = _timestamp(row[kickoff_index])
+            state = new_state(**{key: float(row[i]) for key, i in state_index if row[i] != ""})
+            state["home_goals"] = int(state["home_goals"])
+            state["away_goals"] = int(state["away_goals"])
+            match["states"].append(state)
+            if None not in final_index and row[final_index[0]] != "":
+                match["final"] = (int(float(row[final_index[0]])), int(float(row[final_index[1]])))
+
+    out = []
+    for order, match in enumerate(matches.values()):
+        states = sorted(match.pop("states"), key=lambda state: state["elapsed_minutes"])
+        if match["final"] is None:
+            match["final"] = (states[-1]["home_goals"], states[-1]["away_goals"])
+        match["columns"] = {key: [state[key] for state in states] for key in STATE_KEYS}
+        match["order"] = order
+        out.append(match)
+    if all(match["kickoff"] is not None for match in out):
+        out.sort(key=lambda match: (match["kickoff"], match["order"]))
+    return out
+
+
+def synthetic_season(matches=380, seed=0, per_round=10):
+    """
+    Seeded season of minute-by-minute snapshots in the shape load_snapshots
+    returns. Goals follow hidden scoring rates the model only sees through
+    noisy stats, and the live odds are a noisy, overround book on those rates.
+    """
+    rng = random.Random(seed)
+    season = []
+    for m in range(matches):
+        home_rate = rng.uniform(0.8, 2.2)
+        away_rate = rng.uniform(0.6, 1.8)
+        state = new_state(home_avg_goals_scored=rng.uniform(0.8, 2.4), home_avg_goals_conceded=rng.uniform(0.7, 2.0),
+                          away_avg_goals_scored=rng.uniform(0.6, 2.0), away_avg_goals_conceded=rng.uniform(0.8, 2.4),
+                          home_xg=home_rate * rng.uniform(0.8, 1.2), away_xg=away_rate * rng.uniform(0.8, 1.2),
+                          home_possession=50.0, away_possession=50.0)
+        columns = {key: [] for key in STATE_KEYS}
+        for minute in range(1, 91):
+            state["elapsed_minutes"] = float(minute)
+            state["in_game_home_xg"] += rng.expovariate(90 / home_rate) if rng.random() < 0.3 else 0.0
+            state["in_game_away_xg"] += rng.expovariate(90 / away_rate) if rng.random() < 0.3 else 0.0
+            state["home_sot"] += rng.random() < home_rate / 20
+            state["away_sot"] += rng.random() < away_rate / 20
+            state["home_corners"] += rng.random() < 0.055
+            state["away_corners"] += rng.random() < 0.045
+            state["home_op_box_touches"] += rng.random() < home_rate / 4
+            state["away_op_box_touches"] += rng.random() < away_rate / 4
+            state["home_possession"] = min(75.0, max(25.0, state["home_possession"] + rng.uniform(-1, 1)))
+            state["away_possession"] = 100 - state["home_possession"]
+            if rng.random() < home_rate / 90:
+                state["home_goals"] += 1
+            if rng.random() < away_rate / 90:
+                state["away_goals"] += 1
+            remaining = (90 - minute) / 90
+            probabilities = match_outcome_probabilities(home_rate * remaining, away_rate * remaining,
+                                                        state["home_goals"], state["away_goals"], 0.0)
+            for outcome, p in zip(OUTCOMES, probabilities):
+                odds = 1 / max(0.001, min(0.999, p * 1.04 * exp(rng.gauss(0, 0.05))))
+                state["live_odds_" + outcome] = max(1.01, min(1000.0, odds))
+            for key in STATE_KEYS:
+                columns[key].append(state[key])
+        season.append({"match_id": "s%d" % m, "kickoff": (m // per_round) * 7 * 86400.0,
+                       "final": (state["home_goals"], state["away_goals"]), "columns": columns, "order": m})
+    return season
+
+
+# --- simulation ---
+
+
+def _winner(final):
+    home, away = final
+    return "home" if home > away else "away" if away > home else "draw"
+
+
+def _bet_pnl(side, odds, stake, won):
+    if side == "back":
+        return stake * (odds - 1) if won else -stake
+    return -stake * (odds - 1) if won else stake
+
+
+def price_match(match, profile="match_odds", backend="python"):
+    """
+    Fair 1X2 odds at every snapshot of one match: {outcome: list}. This is the
+    expensive part of a backtest and needs nothing from other matches, so it
+    runs in the worker processes.
+    """
+    prices = price_states(match["columns"], profile, backend=backend)
+    return {outcome: [float(fair) for fair in prices["fair_" + outcome]] for outcome in OUTCOMES}
+
+
+def _events(matches, last_minute):
+    """
+    Every snapshot up to last_minute and every settlement, in time order as
+    (time, kind, match index, snapshot index); kind 0 settles a match, and at
+    equal times settlements come first so a kickoff sees them.
+    """
+    timed = all(match["kickoff"] is not None for match in matches)
+    events = []
+    for order, match in enumerate(matches):
+        # Without kickoffs, one match a day in file order
+        start = match["kickoff"] if timed else order * 86400.0
+        minutes = match["columns"]["elapsed_minutes"]
+        events.append((start + 60 * max(MATCH_LENGTH, minutes[-1] + 20), 0, order, -1))
+        for i, minute in enumerate(minutes):
+            if minute > last_minute:
+                break
+            events.append((start + 60 * minute, 1, order, i))
+    events.sort()
+    return events
+
+
+def simulate(matches, fairs, bankroll=1000.0, min_edge=0.05, max_bets=1, slippage=0.0, commission=0.05,
+             clv_horizon=10.0, last_minute=90.0, kelly=PROFILES["match_odds"]["kelly"]):
+    """
+    Replay every match's snapshots in time order against one BetLedger, so a
+    stake is sized off the bankroll less the open liability of every match in
+    play at the time. fairs holds price_match() for each match. Returns (bets,
+    curve): bets as {match_id: [(minute, outcome, side, odds, stake, risked,
+    pnl, later_odds), ...]} and the bankroll after each round of settlements.
+    """
+    ledger = BetLedger(bankroll)
+    balance = bankroll
+    curve = [bankroll]
+    placed = [dict.fromkeys(OUTCOMES, 0) for _ in matches]
+    bets = [[] for _ in matches]
+    last_settled = None
+    for at, kind, order, i in _events(matches, last_minute):
+        match = matches[order]
+        match_id = match["match_id"]
+        if kind == 0:
+            if bets[order]:
+                net = ledger.settle(match_id, "match_odds", _winner(match["final"]))
+                balance += net * (1 - commission) if net > 0 else net
+            # Matches finishing together are one point on the curve
+            if at == last_settled:
+                curve[-1] = balance
+            else:
+                curve.append(balance)
+            last_settled = at
+            continue
+        columns = match["columns"]
+        for outcome in OUTCOMES:
+            live = columns["live_odds_" + outcome][i]
+            fair = fairs[order][outcome][i]
+            if placed[order][outcome] >= max_bets or live <= 1 or not isfinite(fair):
+                continue
+            rec = match_odds_recommendation(fair, live, ledger.available_bankroll(balance), kelly)
+            if rec["side"] is None or rec["edge"] < min_edge or rec["stake"] <= 0:
+                continue
+            odds = live * (1 - slippage) if rec["side"] == "back" else live * (1 + slippage)
+            if odds <= 1:
+                continue
+            # A lay is re-sized at the filled odds so it keeps the recommended liability
+            bet = ledger.place_recommendation(match_id, "match_odds", outcome, rec, odds)
+            if bet is not None:
+                placed[order][outcome] += 1
+                bets[order].append((i, bet))
+
+    out = {}
+    for match, match_bets in zip(matches, bets):
+        minutes = match["columns"]["elapsed_minutes"]
+        winner = _winner(match["final"])
+        rows = out[match["match_id"]] = []
+        for i, bet in match_bets:
+            later = i
+            while later + 1 < len(minutes) and minutes[later] < minutes[i] + clv_horizon:
+                later += 1
+            rows.append((minutes[i], bet.selection, bet.side, bet.odds, bet.stake, bet.liability,
+                        _bet_pnl(bet.side, bet.odds, bet.stake, bet.selection == winner),
+                        match["columns"]["live_odds_" + bet.selection][later]))
+    return out, curve
+
+
+def _max_drawdown(curve):
+    peak = curve[0]
+    worst = worst_amount = 0.0
+    for value in curve:
+        peak = max(peak, value)
+        if peak > 0 and (peak - value) / peak > worst:
+            worst = (peak - value) / peak
+            worst_amount = peak - value
+    return worst, worst_amount
+
+
+def _summary(rows):
+    """
+    Totals over bet rows: bets, risked, profit, roi, clv, hit rate.
+    """
+    risked = profit = clv_weighted = stake_total = 0.0
+    wins = 0
+    for minute, outcome, side, odds, stake, liability, pnl, later in rows:
+        risked += liability
+        profit += pnl
+        stake_total += stake
+        clv = odds / later - 1 if side == "back" else later / odds - 1
+        clv_weighted += clv * stake
+        wins += pnl > 0
+    return {
+        "bets": len(rows),
+        "risked": risked,
+        "gross_profit": profit,
+        "roi_gross": profit / risked if risked else 0.0,
+        "clv": clv_weighted / stake_total if stake_total else 0.0,
+        "hit_rate": wins / len(rows) if rows else 0.0,
+    }
+
+
+def backtest(matches, bankroll=1000.0, processes=None, min_edge=0.05, max_bets=1, slippage=0.0, commission=0.05,
+             clv_horizon=10.0, last_minute=90.0, profile="match_odds", backend="python"):
+    """
+    Run the walk-forward backtest over matches (as returned by load_snapshots)
+    and return the report dict. processes=1 runs in this process.
+    """
+    price = partial(price_match, profile=profile, backend=backend)
+    processes = processes or os.cpu_count() or 1
+    start = time.perf_counter()
+    if processes == 1 or len(matches) < 2:
+        fairs = list(map(price, matches))
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            fairs = list(pool.map(price, matches, chunksize=max(1, len(matches) // (processes * 8))))
+    bets, curve = simulate(matches, fairs, bankroll, min_edge, max_bets, slippage, commission, clv_horizon,
+                           last_minute, PROFILES[profile]["kelly"])
+    simulated = time.perf_counter() - start
+    rows = [row for match_rows in bets.values() for row in match_rows]
+    net = curve[-1] - bankroll
+    drawdown, drawdown_amount = _max_drawdown(curve)
+    report = {
+        "matches": len(matches),
+        "snapshots": sum(len(m["columns"]["elapsed_minutes"]) for m in matches),
+        "matches_bet": sum(1 for match_rows in bets.values() if match_rows),
+        "starting_bankroll": bankroll,
+        "final_bankroll": curve[-1],
+        "net_profit": net,
+        "growth": net / bankroll if bankroll else 0.0,
+        "max_drawdown": drawdown,
+        "max_drawdown_amount": drawdown_amount,
+    }
+    report.update(_summary(rows))
+    report["roi"] = net / report["risked"] if report["risked"] else 0.0
+    report["by_selection"] = {
+        "%s_%s" % (side, outcome): _summary([row for row in rows if row[1] == outcome and row[2] == side])
+        for outcome in OUTCOMES for side in ("back", "lay")
+    }
+    report["processes"] = processes
+    report["seconds"] = time.perf_counter() - start
+    report["snapshots_per_second"] = report["snapshots"] / simulated if simulated else 0.0
+    report["curve"] = curve
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", help="snapshot CSV")
+    parser.add_argument("--synthetic", type=int, help="backtest a seeded synthetic season of this many matches")
+    parser.add_argument("--processes", type=int)
+    parser.add_argument("--bankroll", type=float, default=1000.0)
+    parser.add_argument("--min-edge", type=float, default=0.05)
+    parser.add_argument("--max-bets", type=int, default=1, help="bets per selection per match")
+    parser.add_argument("--slippage", type=float, default=0.0, help="fraction of the odds lost on each fill")
+    parser.add_argument("--commission", type=float, default=0.05)
+    parser.add_argument("--clv-horizon", type=float, default=10.0)
+    parser.add_argument("--backend", default="python")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+    if args.path:
+        matches = load_snapshots(args.path)
+    elif args.synthetic:
+        matches = synthetic_season(args.synthetic)
+    else:
+        parser.error("give a snapshot file or --synthetic")
+    report = backtest(matches, args.bankroll, args.processes, args.min_edge, args.max_bets, args.slippage,
+                      args.commission, args.clv_horizon, backend=args.backend)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        report.pop("curve")
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Checkpoint size and save/load/restore times for a busy LivePricingEngine.
+
+Drives an engine with price surfaces, a ledger and an edge monitor over
+`matches` matches from the seeded feed in memory_report, then saves through a
+Checkpointer and restores into a fresh engine. The save is reported as the
+time the pricing loop is held (taking the snapshot) and the time the writer
+thread spends pickling it.
+
+    python benchmarks/bench_checkpoint.py [matches] [ticks] [path]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checkpoint
+from bet_ledger import BetLedger
+from edge_signals import EdgeMonitor
+from live_engine import LivePricingEngine
+from memory_report import tick_feed
+
+
+def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    path = sys.argv[3] if len(sys.argv) > 3 else os.path.join(tempfile.gettempdir(), "bench_engine.ckpt")
+
+    ledger = BetLedger(1000.0)
+    engine = LivePricingEngine(surfaces=True, ledger=ledger, signals=EdgeMonitor())
+    for i, (match_id, changes) in enumerate(tick_feed(matches, ticks)):
+        if changes is None:
+            engine.remove(match_id)
+        else:
+            engine.update(match_id, **changes)
+            if i % 50 == 0:
+                ledger.place(match_id, "match_odds", "home", "lay", 3.0, 2.0)
+    engine.surfaces.wait_idle(120)
+
+    checkpointer = checkpoint.Checkpointer(engine, path, interval=3600)
+    held, pickled = [], []
+    for _ in range(3):
+        checkpointer.save_async()
+        checkpointer.flush()
+        held.append(checkpointer.last_snapshot_seconds)
+        pickled.append(checkpointer.last_pickle_seconds)
+    checkpointer.close(final=False)
+    if checkpointer.error is not None:
+        raise checkpointer.error
+
+    start = time.perf_counter()
+    snapshot = checkpoint.load(path)
+    loaded = time.perf_counter() - start
+    restored = LivePricingEngine(surfaces=True, signals=EdgeMonitor())
+    start = time.perf_counter()
+    restored.restore_snapshot(snapshot)
+    installed = time.perf_counter() - start
+    restored.surfaces.wait_idle(120)
+    rebuilt = time.perf_counter() - start
+
+    print(f"{len(engine.matches)} live matches, {ledger.open_bets} open bets, "
+          f"checkpoint {checkpointer.last_size / 1e6:.1f} MB")
+    print(f"save: pricing loop held {min(held) * 1e3:.1f} ms, "
+          f"writer pickles in {min(pickled) * 1e3:.1f} ms")
+    print(f"load: {loaded * 1e3:.1f} ms, restore into engine: {installed * 1e3:.2f} ms, "
+          f"surfaces rebuilt after {rebuilt * 1e3:.0f} ms")
+    engine.close()
+    restored.close()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
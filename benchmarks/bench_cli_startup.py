@@ -0,0 +1,83 @@
+"""
+Cold start of the headless CLI.
+
+Runs `python odds_cli.py <model> ...` for every model `runs` times in fresh
+interpreters and prints the best and median wall time of each, next to a bare
+`python -c pass`, plus the modules the CLI spent longest importing (from
+-X importtime). Exits 1 if any model's best start-up, less the bare
+interpreter's best, exceeds max_ms or if tkinter, numpy or an app module was
+imported, so it can gate CI. Start-up times are noisy (a median can move by
+15 ms between runs on a busy machine), so the gate uses the best of the runs
+and the default budget is about twice the overhead measured so far.
+
+    python benchmarks/bench_cli_startup.py [runs] [max_ms]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, "odds_cli.py")
+
+STATE = ["home_avg_goals_scored=1.5", "away_avg_goals_scored=1.2", "home_xg=1.6", "away_xg=1.1",
+         "elapsed_minutes=60", "in_game_home_xg=0.9", "home_sot=4", "live_next_goal_odds=2.4",
+         "live_odds_home=2.1", "live_odds_draw=3.4", "live_odds_away=4.0", "account_balance=1000"]
+FIXTURE = ["avg_goals_home_scored=1.6", "avg_goals_away_scored=1.2", "home_xg_scored=1.7",
+           "away_xg_scored=1.1", "position_home=4", "position_away=12", "live_over_odds=1.9"]
+COMMANDS = {
+    "next-goal": ["next-goal"] + STATE,
+    "match-odds": ["match-odds"] + STATE,
+    "combined": ["combined"] + STATE,
+    "over-2.5": ["over-2.5"] + FIXTURE,
+}
+FORBIDDEN = ("tkinter", "_tkinter", "numpy", "numba", "pyarrow", "IP_Goal", "IP_Match", "combined", "PM_Goal")
+
+
+def timed(argv, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def imports(argv):
+    """
+    [(cumulative microseconds, module)] imported by argv, slowest first.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime"] + argv[1:], check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, cumulative, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        modules.append((int(cumulative), name))
+    return sorted(modules, reverse=True)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    max_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    bare, bare_median = timed([sys.executable, "-c", "pass"], runs)
+    print(f"{'python -c pass':>14}: best {bare * 1e3:6.1f} ms, median {bare_median * 1e3:6.1f} ms")
+    failed = False
+    for model, args in COMMANDS.items():
+        argv = [sys.executable, CLI] + args
+        best, median = timed(argv, runs)
+        loaded = imports(argv)
+        bad = sorted({name for _, name in loaded if name.split(".")[0] in FORBIDDEN})
+        over = (best - bare) * 1e3 > max_ms
+        failed = failed or over or bool(bad)
+        slowest = ", ".join(f"{name} {us / 1e3:.1f}" for us, name in loaded[:3])
+        print(f"{model:>14}: best {best * 1e3:6.1f} ms, median {median * 1e3:6.1f} ms "
+              f"(best +{(best - bare) * 1e3:.1f} over bare){' OVER BUDGET' if over else ''}; "
+              f"slowest imports (ms): {slowest}" + (f"; imported {', '.join(bad)}" if bad else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+float32 compact mode vs float64 for batch pricing.
+
+Prices n seeded in-play states on the (n, 6, 6) match odds grid and n seeded
+fixtures on the (n, 10, 10) Over 2.5 grid in both precisions, and reports
+throughput, peak traced memory and the float32 error against float64.
+
+    python benchmarks/bench_compact.py [n] [backend]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_pricing import price_fixtures, price_states, random_fixtures
+from pricing_kernels import get_backend, random_columns
+
+
+def measure(fn, columns, compact, backend):
+    import numpy as np
+    columns = {key: np.asarray(value, dtype="float32" if compact else "float64") for key, value in columns.items()}
+    fn(columns, compact=compact, backend=backend)  # warm up (and JIT compile)
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = fn(columns, compact=compact, backend=backend)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def max_errors(reference, compact):
+    import numpy as np
+    errors = {}
+    for key, ref in reference.items():
+        ref = np.asarray(ref, dtype=np.float64)
+        got = np.asarray(compact[key], dtype=np.float64)
+        if key.startswith("fair"):
+            mask = np.isfinite(ref) & (ref < 100)
+            errors[key + " (rel)"] = float(np.max(np.abs(got[mask] - ref[mask]) / ref[mask]))
+        elif key.startswith("lambda"):
+            errors[key + " (rel)"] = float(np.max(np.abs(got - ref) / ref))
+        else:
+            errors[key + " (abs)"] = float(np.max(np.abs(got - ref)))
+    return errors
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    backend = get_backend(sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"backend: {backend.name}, n = {n}")
+    for label, fn, columns in (("match odds (n, 6, 6)", price_states, random_columns(n)),
+                               ("over 2.5 (n, 10, 10)", price_fixtures, random_fixtures(n))):
+        ref, t64, m64 = measure(fn, columns, False, backend)
+        out, t32, m32 = measure(fn, columns, True, backend)
+        print(f"\n{label}")
+        print(f"  float64: {n / t64:>12,.0f} states/s  peak {m64 / 2**20:8.1f} MiB")
+        print(f"  float32: {n / t32:>12,.0f} states/s  peak {m32 / 2**20:8.1f} MiB")
+        print(f"  speedup {t64 / t32:.2f}x, memory {m32 / m64:.2f}x")
+        for key, err in max_errors(ref, out).items():
+            print(f"  max error {key:<24} {err:.2e}")
+
+
+if __name__ == "__main__":
+    main()
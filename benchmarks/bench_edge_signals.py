@@ -0,0 +1,70 @@
+"""
+Downstream traffic with and without edge signals.
+
+Drives a LivePricingEngine over `matches` matches from the seeded feed in
+memory_report (with the live odds drifting as well), and compares the price
+updates a consumer would have to re-read against the edge signals emitted.
+A second subscriber that sleeps on every signal shows that a slow consumer
+only loses its own signals and never slows the pricing loop.
+
+    python benchmarks/bench_edge_signals.py [matches] [ticks]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edge_signals import EdgeBus, EdgeMonitor
+from live_engine import LivePricingEngine
+from memory_report import tick_feed
+
+
+def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    rng = random.Random(1)
+    odds = {}
+    feed = []
+    for match_id, changes in tick_feed(matches, ticks):
+        if changes is not None:
+            market = odds.setdefault(match_id, [2.4, 3.3, 3.1, 1.9])
+            for i in range(4):
+                market[i] = max(1.02, market[i] * rng.uniform(0.98, 1.02))
+            changes.update(live_odds_home=market[0], live_odds_draw=market[1], live_odds_away=market[2],
+                           live_next_goal_odds=market[3])
+        else:
+            odds.pop(match_id, None)
+        feed.append((match_id, changes))
+
+    received = []
+    bus = EdgeBus()
+    subscribers = [bus.subscribe(received.append, name="fast"),
+                   bus.subscribe(lambda signal: time.sleep(0.001), maxsize=100, name="slow")]
+    monitor = EdgeMonitor(bus=bus)
+    engine = LivePricingEngine(surfaces=False, signals=monitor)
+
+    start = time.perf_counter()
+    updates = 0
+    for match_id, changes in feed:
+        if changes is None:
+            engine.remove(match_id)
+        else:
+            engine.update(match_id, **changes)
+            updates += 1
+    elapsed = time.perf_counter() - start
+    bus.close()
+    engine.close()
+
+    lines = updates * len(monitor.markets)
+    print(f"{matches} matches, {updates:,} price updates ({lines:,} lay/back lines rewritten without signals)")
+    print(f"edge signals emitted: {monitor.emitted:,} ({lines / max(1, monitor.emitted):,.0f}x fewer)")
+    print(f"pricing loop: {updates / elapsed:,.0f} updates/s with signals on")
+    for sub in subscribers:
+        print(f"subscriber {sub.name}: delivered {sub.delivered:,}, dropped {sub.dropped:,}, errors {sub.errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Cold and warm times for pricing a fixture file.
+
+Writes n seeded fixtures to a temporary CSV, then for each backend (the
+automatic choice, then every backend by name) prices the file with
+fixture_loader.price_file in a fresh interpreter, so the cold figure
+includes importing the loader, the backend and its dependencies, followed by
+a second, warm pass in the same process.
+
+    python benchmarks/bench_fixture_loader.py [n]
+"""
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_pricing import random_fixtures
+from pricing_core import FIXTURE_KEYS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import sys, time
+start = time.perf_counter()
+from fixture_loader import price_file
+from pricing_kernels import get_backend
+def run():
+    return sum(len(chunk) for chunk, _ in price_file(sys.argv[1]))
+count = run()
+cold = time.perf_counter() - start
+start = time.perf_counter()
+run()
+warm = time.perf_counter() - start
+print(get_backend().name, count, cold, warm)
+"""
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    fixtures = random_fixtures(n, seed=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixtures.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("fixture",) + FIXTURE_KEYS)
+            for i in range(n):
+                writer.writerow([i] + [fixtures[key][i] for key in FIXTURE_KEYS])
+        for backend in ("", "numpy", "numba", "python"):
+            env = dict(os.environ, ODDS_APEX_BACKEND=backend)
+            result = subprocess.run([sys.executable, "-c", CHILD, path], cwd=ROOT, env=env,
+                                    capture_output=True, text=True)
+            if result.returncode:
+                print(f"{backend or 'default':>8}: unavailable ({result.stderr.strip().splitlines()[-1]})")
+                continue
+            name, count, cold, warm = result.stdout.split()
+            print(f"{backend or 'default':>8} ({name}): {int(count):,} fixtures, cold {float(cold) * 1e3:6.0f} ms "
+                  f"(imports included), warm {float(warm) * 1e3:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
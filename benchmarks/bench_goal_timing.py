@@ -0,0 +1,47 @@
+"""
+Next goal distributions: one vectorised call against one call per match,
+and what the per-state cache saves when several consumers look at the same
+matches.
+
+    python benchmarks/bench_goal_timing.py [matches] [consumers]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from goal_timing import GoalTimingCache, goal_before, next_goal_distribution
+from pricing_kernels import random_columns
+
+
+def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    consumers = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    columns = random_columns(matches, seed=0)
+    states = [{key: values[i] for key, values in columns.items()} for i in range(matches)]
+    next_goal_distribution(random_columns(10, seed=1))  # warm-up: imports and JIT
+
+    start = time.perf_counter()
+    distribution = next_goal_distribution(columns)
+    vectorised = time.perf_counter() - start
+    goal_before(distribution, 75)
+
+    start = time.perf_counter()
+    for state in states:
+        next_goal_distribution({key: [value] for key, value in state.items()})
+    looped = time.perf_counter() - start
+
+    cache = GoalTimingCache()
+    start = time.perf_counter()
+    for _ in range(consumers):
+        cache.get_many(states)
+    cached = time.perf_counter() - start
+
+    print(f"{matches} matches: vectorised {vectorised * 1e3:.1f} ms ({vectorised / matches * 1e6:.1f} us/match), "
+          f"one call per match {looped * 1e3:.0f} ms ({looped / vectorised:.0f}x slower)")
+    print(f"{consumers} consumers through the cache: {cached * 1e3:.1f} ms, {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
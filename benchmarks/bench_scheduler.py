@@ -0,0 +1,82 @@
+"""
+Goal latency under overload, with and without the priority scheduler.
+
+Replays the seeded feed from memory_report on a simulated clock: `rate` ticks
+arrive per second across `matches` matches while the pricing loop only
+prices `capacity` updates per second (drained every 0.1 s). The same feed
+goes through an UpdateScheduler ranked by urgency and through one that only
+looks at staleness (first come, first served), and the script prints how long
+score changes waited to be priced in each, plus what was coalesced and shed.
+
+    python benchmarks/bench_scheduler.py [matches] [ticks] [rate] [capacity]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_engine import LivePricingEngine
+from memory_report import tick_feed
+from update_scheduler import UpdateScheduler
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run(feed, rate, capacity, weights, max_pending):
+    clock = SimulatedClock()
+    engine = LivePricingEngine(surfaces=False)
+    scheduler = UpdateScheduler(engine, max_pending=max_pending, weights=weights, clock=clock)
+    goal_waits = []
+    goals_at = {}  # match_id -> time its first unpriced score change arrived
+    step = 0.1
+    per_drain = max(1, int(capacity * step))
+    next_drain = step
+    for i, (match_id, changes) in enumerate(feed):
+        clock.now = i / rate
+        while clock.now >= next_drain:
+            for priced_id, _ in scheduler.drain(max_updates=per_drain):
+                if priced_id in goals_at:
+                    goal_waits.append(clock.now - goals_at.pop(priced_id))
+            next_drain += step
+        if changes is None:
+            scheduler.pending.pop(match_id, None)
+            goals_at.pop(match_id, None)
+            engine.remove(match_id)
+            continue
+        state = engine.matches.get(match_id)
+        if state is not None and (changes["home_goals"], changes["away_goals"]) != (state["home_goals"],
+                                                                                    state["away_goals"]):
+            goals_at.setdefault(match_id, clock.now)
+        scheduler.submit(match_id, **changes)
+    engine.close()
+    goal_waits.sort()
+    return scheduler.stats(), goal_waits
+
+
+def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 30000
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    capacity = float(sys.argv[4]) if len(sys.argv) > 4 else 600
+    feed = list(tick_feed(matches, ticks))
+    fifo = {"goal": 0.0, "exposure": 0.0, "late": 0.0, "edge": 0.0, "staleness": 1.0}
+    print(f"{matches} matches, {ticks:,} ticks at {rate:,.0f}/s, pricing capacity {capacity:,.0f}/s")
+    for name, weights, max_pending in (("first come first served", fifo, 10 ** 9),
+                                       ("urgency, no shedding", None, 10 ** 9),
+                                       ("urgency, shedding to 100", None, 100)):
+        stats, waits = run(feed, rate, capacity, weights, max_pending)
+        p50 = waits[len(waits) // 2] if waits else 0.0
+        p95 = waits[int(len(waits) * 0.95)] if waits else 0.0
+        print(f"{name:>26}: goal wait p50 {p50 * 1e3:6.0f} ms, p95 {p95 * 1e3:6.0f} ms over {len(waits)} goals; "
+              f"coalesced {stats['coalesced']:,}, dispatched {stats['dispatched']:,}, shed {stats['shed']:,} "
+              f"({stats['shed_ticks']:,} ticks, {stats['shed_inputs']:,} inputs kept), waiting at end {stats['pending']}")
+
+
+if __name__ == "__main__":
+    main()
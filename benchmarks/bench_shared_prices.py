@@ -0,0 +1,79 @@
+"""
+One writer, many readers on a shared_prices table.
+
+The writer publishes `updates` records round-robin over `matches` matches,
+with every price field of an update set to the same value. Reader processes
+read random matches in a loop and count records whose fields disagree, which
+would mean the seqlock let a torn read through.
+
+    python benchmarks/bench_shared_prices.py [readers] [matches] [updates]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_prices import PRICE_FIELDS, SharedPriceReader, SharedPriceTable
+
+
+def fake_prices(value):
+    prices = {name: value for name in PRICE_FIELDS}
+    prices["over"] = [value] * 5
+    for market in ("next_goal", "home", "draw", "away"):
+        prices[market] = {"side": "back", "stake": value}
+    return prices
+
+
+def reader(name, matches, stop, results):
+    table = SharedPriceReader(name)
+    rng = random.Random(os.getpid())
+    reads = torn = 0
+    while not stop.is_set():
+        record = table.read("m%d" % rng.randrange(matches))
+        if record is None:
+            continue
+        reads += 1
+        values = {record[field] for field in PRICE_FIELDS}
+        if len(values) != 1:
+            torn += 1
+    results.put((reads, torn, table.torn_retries))
+    table.close()
+
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    matches = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    updates = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+
+    table = SharedPriceTable(capacity=matches)
+    for m in range(matches):
+        table.publish("m%d" % m, fake_prices(0.0))
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=reader, args=(table.name, matches, stop, results))
+             for _ in range(readers)]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    for i in range(updates):
+        table.publish("m%d" % (i % matches), fake_prices(float(i)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    table.close()
+
+    reads = sum(r[0] for r in totals)
+    print(f"writer: {updates / elapsed:,.0f} updates/s over {matches} matches")
+    print(f"readers: {readers} processes, {reads / elapsed:,.0f} reads/s total")
+    print(f"seqlock retries: {sum(r[2] for r in totals)}, inconsistent records: {sum(r[1] for r in totals)}")
+
+
+if __name__ == "__main__":
+    main()
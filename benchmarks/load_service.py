@@ -0,0 +1,84 @@
+"""
+Localhost load test for pricing_service.
+
+Starts the service in-process on an ephemeral port, then drives it from
+`connections` keep-alive clients, each sending `requests` /match-odds (and
+/next-goal, /over-under) requests back to back. Reports client-side
+throughput and latency percentiles alongside the service's own /metrics.
+
+    python benchmarks/load_service.py [connections] [requests] [max_delay_ms]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_pricing import random_fixtures
+from pricing_kernels import random_columns
+from pricing_service import PricingService
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(port, bodies, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for path, body in bodies:
+        start = time.perf_counter()
+        status, _ = await request(reader, writer, "POST", path, body)
+        latencies.append(time.perf_counter() - start)
+        assert status == 200, status
+    writer.close()
+
+
+async def main(connections, requests, max_delay_ms):
+    service = PricingService(max_delay_ms=max_delay_ms)
+    _, port = await service.start("127.0.0.1", 0)
+    columns = random_columns(requests)
+    states = [{key: values[i] for key, values in columns.items()} for i in range(requests)]
+    fixtures_columns = random_fixtures(requests)
+    fixtures = [{key: values[i] for key, values in fixtures_columns.items()} for i in range(requests)]
+    paths = ("/match-odds", "/next-goal", "/over-under")
+    bodies = [(paths[i % 3], fixtures[i] if i % 3 == 2 else states[i]) for i in range(requests)]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, bodies, latencies) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    _, metrics = await request(reader, writer, "GET", "/metrics")
+    writer.close()
+    await service.close()
+
+    latencies.sort()
+    total = connections * requests
+    print(f"{connections} connections x {requests} requests, max delay {max_delay_ms} ms")
+    print(f"throughput {total / elapsed:,.0f} req/s")
+    for q in (0.50, 0.95, 0.99):
+        print(f"client p{int(q * 100)} {latencies[int(q * (len(latencies) - 1))] * 1000:.2f} ms")
+    print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    asyncio.run(main(int(args[0]) if args else 64,
+                     int(args[1]) if len(args) > 1 else 300,
+                     args[2] if len(args) > 2 else 2.0))
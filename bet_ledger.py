@@ -0,0 +1,230 @@
+"""
+Bet ledger with incremental exposure and P&L.
+
+Records backs and lays per match and market and keeps, for every market, the
+profit or loss if each outcome wins. Each bet changes one market by a
+constant amount of work (markets have two or three outcomes), and the
+ledger-wide worst-case liability is a running total, so both placing a bet
+and asking for the open liability are O(1) however many bets are open.
+"""
+# Outcomes of the markets the apps price
+MARKET_OUTCOMES = {
+    "match_odds": ("home", "draw", "away"),
+    "next_goal": ("goal", "no_goal"),
+    "over_under_2.5": ("over", "under"),
+}
+
+
+class Bet:
+    __slots__ = ("bet_id", "match_id", "market", "selection", "side", "odds", "stake")
+
+    def __init__(self, bet_id, match_id, market, selection, side, odds, stake):
+        self.bet_id = bet_id
+        self.match_id = match_id
+        self.market = market
+        self.selection = selection
+        self.side = side
+        self.odds = odds
+        self.stake = stake
+
+    @property
+    def liability(self):
+        # What the bet loses if it goes wrong
+        return self.stake if self.side == "back" else self.stake * (self.odds - 1)
+
+
+class MarketBook:
+    """
+    Open position in one market of one match.
+
+    pnl(outcome) = base + delta[outcome]: a back of S at odds o on s moves
+    base by -S and delta[s] by S*o; a lay moves base by +S and delta[s] by -S*o.
+    """
+    __slots__ = ("outcomes", "base", "delta", "bets", "exposure")
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.base = 0.0
+        self.delta = dict.fromkeys(outcomes, 0.0)
+        self.bets = []
+        self.exposure = 0.0
+
+    def add(self, bet):
+        if bet.side == "back":
+            self.base -= bet.stake
+            self.delta[bet.selection] += bet.stake * bet.odds
+        else:
+            self.base += bet.stake
+            self.delta[bet.selection] -= bet.stake * bet.odds
+        self.bets.append(bet)
+        return self._update_exposure()
+
+    def copy(self):
+        other = MarketBook(self.outcomes)
+        other.base = self.base
+        other.delta = dict(self.delta)
+        other.bets = list(self.bets)
+        other.exposure = self.exposure
+        return other
+
+    def pnl(self):
+        return {outcome: self.base + self.delta[outcome] for outcome in self.outcomes}
+
+    def _update_exposure(self):
+        """
+        Recompute worst-case loss; returns the change so the ledger total can follow.
+        """
+        worst = min(self.delta.values()) + self.base
+        exposure = max(0.0, -worst)
+        change = exposure - self.exposure
+        self.exposure = exposure
+        return change
+
+
+class BetLedger:
+    def __init__(self, starting_balance=0.0):
+        self.starting_balance = starting_balance
+        self.books = {}          # (match_id, market) -> MarketBook
+        self.realised_pnl = 0.0
+        self.open_liability = 0.0  # sum of worst-case losses over open markets
+        self.open_bets = 0
+        self.next_bet_id = 1
+
+    def place(self, match_id, market, selection, side, odds, stake):
+        """
+        Record a matched bet. side is "back" or "lay"; for a lay the stake is
+        the backer's stake, so the liability is stake * (odds - 1).
+        """
+        if side not in ("back", "lay"):
+            raise ValueError("side must be 'back' or 'lay', not %r" % side)
+        if odds <= 1 or stake <= 0:
+            raise ValueError("odds must be above 1 and stake positive")
+        book = self.books.get((match_id, market))
+        if book is None:
+            outcomes = MARKET_OUTCOMES.get(market)
+            if outcomes is None:
+                raise ValueError("unknown market %r" % market)
+            book = self.books[match_id, market] = MarketBook(outcomes)
+        if selection not in book.delta:
+            raise ValueError("%r is not an outcome of %s" % (selection, market))
+        bet = Bet(self.next_bet_id, match_id, market, selection, side, odds, stake)
+        self.next_bet_id += 1
+        self.open_liability += book.add(bet)
+        self.open_bets += 1
+        return bet
+
+    def place_recommendation(self, match_id, market, selection, recommendation, odds):
+        """
+        Record a pricing_core recommendation dict as placed at the given odds.
+        A lay is sized from its liability (next goal lays carry no stake), so
+        the bet risks what was recommended even if the odds have moved.
+        Returns None when there is no bet to place.
+        """
+        side = recommendation.get("side")
+        if side is None:
+            return None
+        if side == "lay":
+            if odds <= 1:
+                raise ValueError("odds must be above 1 and stake positive")
+            stake = recommendation["liability"] / (odds - 1)
+        else:
+            stake = recommendation["stake"]
+        if stake <= 0:
+            return None
+        return self.place(match_id, market, selection, side, odds, stake)
+
+    def settle(self, match_id, market, winner):
+        """
+        Settle a market on its winning outcome; returns the realised P&L.
+        """
+        book = self.books.pop((match_id, market), None)
+        if book is None:
+            return 0.0
+        pnl = book.base + book.delta[winner]
+        self.realised_pnl += pnl
+        self.open_liability -= book.exposure
+        self.open_bets -= len(book.bets)
+        return pnl
+
+    def void(self, match_id, market):
+        book = self.books.pop((match_id, market), None)
+        if book is not None:
+            self.open_liability -= book.exposure
+            self.open_bets -= len(book.bets)
+
+    def copy(self):
+        """
+        An independent copy of the ledger; placed bets are shared, as they never change.
+        """
+        other = BetLedger(self.starting_balance)
+        other.books = {key: book.copy() for key, book in self.books.items()}
+        other.realised_pnl = self.realised_pnl
+        other.open_liability = self.open_liability
+        other.open_bets = self.open_bets
+        other.next_bet_id = self.next_bet_id
+        return other
+
+    def exposure(self, match_id, market):
+        """
+        P&L for each outcome of an open market (empty if none is open).
+        """
+        book = self.books.get((match_id, market))
+        return book.pnl() if book is not None else {}
+
+    def worst_case(self, match_id, market):
+        book = self.books.get((match_id, market))
+        return book.exposure if book is not None else 0.0
+
+    def available_bankroll(self, balance=None):
+        """
+        Bankroll left for new stakes: the balance less the worst-case liability
+        of every open market. With no balance given, the ledger's own
+        starting balance plus realised P&L is used.
+        """
+        if balance is None:
+            balance = self.starting_balance + self.realised_pnl
+        return max(0.0, balance - self.open_liability)
+
+
+def _self_check():
+    """
+    Place a lay and a back from each in-play market's recommendation and
+    check the ledger's liability and bankroll; returns a list of failures.
+    """
+    from pricing_core import match_odds_recommendation, next_goal_recommendation
+    failures = []
+    balance = 1000.0
+    cases = [
+        ("next_goal", "goal", next_goal_recommendation(2.4, 2.0, balance, 0.05), 2.0),
+        ("next_goal", "goal", next_goal_recommendation(2.0, 2.4, balance, 0.05), 2.4),
+        ("match_odds", "home", match_odds_recommendation(2.4, 2.0, balance, 0.25), 2.0),
+        ("match_odds", "away", match_odds_recommendation(3.0, 3.6, balance, 0.25), 3.6),
+    ]
+    for match_id, (market, selection, recommendation, odds) in enumerate(cases):
+        ledger = BetLedger()
+        bet = ledger.place_recommendation(match_id, market, selection, recommendation, odds)
+        side = recommendation["side"]
+        if bet is None or bet.side != side:
+            failures.append("%s %s: no %s bet placed" % (market, selection, side))
+            continue
+        expected = recommendation["liability"] if side == "lay" else recommendation["stake"]
+        if abs(ledger.open_liability - expected) > 1e-9 or abs(bet.liability - expected) > 1e-9:
+            failures.append("%s %s %s: liability %.6f, expected %.6f"
+                            % (market, selection, side, ledger.open_liability, expected))
+        if abs(ledger.available_bankroll(balance) - (balance - expected)) > 1e-9:
+            failures.append("%s %s %s: available bankroll %.6f, expected %.6f"
+                            % (market, selection, side, ledger.available_bankroll(balance), balance - expected))
+        ledger.void(match_id, market)
+        if ledger.open_liability or ledger.open_bets:
+            failures.append("%s %s %s: void left bets open" % (market, selection, side))
+    return failures
+
+
+if __name__ == "__main__":
+    import sys
+
+    problems = _self_check()
+    for problem in problems:
+        print(problem)
+    print("ok" if not problems else "%d failures" % len(problems))
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,243 @@
+"""
+Online model/market blend weights per league and market.
+
+The blended probability is p = p_model + w * (p_market - p_model), the same
+as PM_Goal's blend_factor. Each settled result gives one observation of
+r = outcome - p_model against d = p_market - p_model. The weight is the
+posterior mean of a Bayesian regression r = w * d + noise, which needs only
+two running sums, S_dd and S_dr, so each update is O(1).
+
+Sums decay by `forgetting` per observation so the weight can follow a market
+that gets sharper or looser. A league borrows its prior from the pooled
+weight of its market, and that pooled weight is shrunk towards
+`prior_weight`, so a new league starts at the market-wide value.
+
+Weights are kept in one JSON file, WEIGHTS_PATH (blend_weights.json next to
+this module, or $ODDS_APEX_BLEND_WEIGHTS). Settled fixtures are fed in with
+
+    python blend_weights.py settle results.csv    fixture inputs, league and total goals per row
+    python blend_weights.py show                  current weight per league
+
+and every Over 2.5 pricing path (fixture_loader, pricing_service, odds_cli,
+PM_Goal) prices each fixture with its league's weight from that file. With
+no file every league gets prior_weight, PM_Goal's original 70/30 blend.
+"""
+import json
+import os
+import sys
+from math import sqrt
+
+DEFAULT_MARKET = "over_2.5"
+OVER_LINE = 2.5
+WEIGHTS_PATH = (os.environ.get("ODDS_APEX_BLEND_WEIGHTS") or
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), "blend_weights.json"))
+# Columns of a results file holding the total goals, or the two scores
+TOTAL_COLUMNS = ("total_goals", "goals")
+SCORE_COLUMNS = (("final_home_goals", "final_away_goals"), ("home_goals", "away_goals"))
+
+
+class BlendWeights:
+    def __init__(self, prior_weight=0.3, prior_strength=0.5, forgetting=0.999, noise_variance=0.25):
+        # prior_strength is in units of S_dd: with a typical |d| of 0.05 the
+        # default is worth about 200 settled results
+        self.prior_weight = prior_weight
+        self.prior_strength = prior_strength
+        self.forgetting = forgetting
+        self.noise_variance = noise_variance
+        self.stats = {}   # (league, market) -> [S_dd, S_dr, n]
+        self.pooled = {}  # market -> [S_dd, S_dr, n]
+
+    def _accumulate(self, table, key, d, r):
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = [0.0, 0.0, 0]
+        f = self.forgetting
+        stats[0] = stats[0] * f + d * d
+        stats[1] = stats[1] * f + d * r
+        stats[2] += 1
+
+    def update(self, league, p_model, p_market, outcome, market=DEFAULT_MARKET):
+        """
+        Record one settled result: outcome is 1 if the selection won, else 0.
+        p_market is the market-implied probability (1 / odds), as PM_Goal uses it.
+        """
+        d = p_market - p_model
+        r = outcome - p_model
+        self._accumulate(self.stats, (league, market), d, r)
+        self._accumulate(self.pooled, market, d, r)
+
+    def _posterior(self, stats, prior):
+        if stats is None:
+            return prior
+        w = (self.prior_strength * prior + stats[1]) / (self.prior_strength + stats[0])
+        return min(1.0, max(0.0, w))
+
+    def market_weight(self, market=DEFAULT_MARKET):
+        return self._posterior(self.pooled.get(market), self.prior_weight)
+
+    def weight(self, league, market=DEFAULT_MARKET):
+        """
+        Current blend weight (share given to the market) for a league.
+        """
+        return self._posterior(self.stats.get((league, market)), self.market_weight(market))
+
+    def uncertainty(self, league, market=DEFAULT_MARKET):
+        """
+        Posterior standard deviation of the league's weight.
+        """
+        stats = self.stats.get((league, market))
+        s_dd = stats[0] if stats is not None else 0.0
+        return sqrt(self.noise_variance / (self.prior_strength + s_dd))
+
+    def blend_factors(self, leagues, market=DEFAULT_MARKET):
+        """
+        Per-row weights for batch_pricing.price_fixtures, one per league label.
+        """
+        cache = {}
+        factors = []
+        for league in leagues:
+            w = cache.get(league)
+            if w is None:
+                w = cache[league] = self.weight(league, market)
+            factors.append(w)
+        return factors
+
+    # --- persistence ---
+
+    def state(self):
+        return {
+            "settings": [self.prior_weight, self.prior_strength, self.forgetting, self.noise_variance],
+            "stats": [[league, market] + stats for (league, market), stats in self.stats.items()],
+            "pooled": {market: stats for market, stats in self.pooled.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        weights = cls(*state["settings"])
+        weights.stats = {(league, market): [s_dd, s_dr, n] for league, market, s_dd, s_dr, n in state["stats"]}
+        weights.pooled = {market: list(stats) for market, stats in state["pooled"].items()}
+        return weights
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.state(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_state(json.load(f))
+
+
+def load_weights(path=None):
+    """
+    The weights saved at path (WEIGHTS_PATH by default), or fresh weights if
+    nothing has been saved yet.
+    """
+    path = path or WEIGHTS_PATH
+    if not os.path.exists(path):
+        return BlendWeights()
+    return BlendWeights.load(path)
+
+
+class WeightsFile:
+    """
+    The weights in a file, re-read whenever the file changes, for long-running
+    pricers (the service, the app) while settlements are written elsewhere.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or WEIGHTS_PATH
+        self._mtime = None
+        self._weights = BlendWeights()
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self._weights = BlendWeights.load(self.path) if mtime is not None else BlendWeights()
+            self._mtime = mtime
+        return self._weights
+
+
+def settle_fixtures(weights, columns, leagues, total_goals, line=OVER_LINE):
+    """
+    Record settled fixtures: columns is a column dict of pricing_core.FIXTURE_KEYS,
+    leagues and total_goals one entry per row. Over `line` won if the total
+    went over it. Fixtures without a market price teach nothing and are
+    skipped; returns the number recorded.
+    """
+    from batch_pricing import price_fixtures
+    p_model = price_fixtures(columns, 0.0)["over_prob_model"]
+    recorded = 0
+    for i, (league, total) in enumerate(zip(leagues, total_goals)):
+        odds = columns["live_over_odds"][i]
+        if odds <= 1:
+            continue
+        weights.update(league, float(p_model[i]), 1 / odds, 1 if total > line else 0)
+        recorded += 1
+    return recorded
+
+
+def read_results(path):
+    """
+    (columns, leagues, total goals) from a results CSV: PM_Goal's inputs under
+    FIXTURE_KEYS or its labels, a league column (see fixture_loader) and the
+    total goals, or the final score.
+    """
+    import csv
+    from fixture_loader import LEAGUE_COLUMNS
+    from pricing_core import FIXTURE_KEYS, FIXTURE_LABELS
+
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        names = {FIXTURE_LABELS.get(name.strip(), name.strip().lower()): name for name in reader.fieldnames}
+        missing = [key for key in FIXTURE_KEYS if key not in names]
+        if missing:
+            raise ValueError("%s is missing columns: %s" % (path, ", ".join(missing)))
+        league = next((names[key] for key in LEAGUE_COLUMNS if key in names), None)
+        total = next((names[key] for key in TOTAL_COLUMNS if key in names), None)
+        scores = next(([names[home], names[away]] for home, away in SCORE_COLUMNS
+                       if home in names and away in names), None)
+        if total is None and scores is None:
+            raise ValueError("%s has no total goals column (%s) or final score" % (path, ", ".join(TOTAL_COLUMNS)))
+        columns = {key: [] for key in FIXTURE_KEYS}
+        leagues = []
+        totals = []
+        for line, row in enumerate(reader, 2):
+            try:
+                values = {key: float(row[names[key]]) for key in FIXTURE_KEYS}
+                goals = float(row[total]) if total is not None else sum(float(row[name]) for name in scores)
+            except (TypeError, ValueError):
+                raise ValueError("%s line %d: not a number" % (path, line)) from None
+            for key, value in values.items():
+                columns[key].append(value)
+            leagues.append(row[league] if league is not None else None)
+            totals.append(goals)
+    return columns, leagues, totals
+
+
+def main(argv):
+    if argv[:1] == ["settle"] and len(argv) == 2:
+        weights = load_weights()
+        recorded = settle_fixtures(weights, *read_results(argv[1]))
+        weights.save(WEIGHTS_PATH)
+        print("recorded %d settled fixtures in %s" % (recorded, WEIGHTS_PATH))
+        return 0
+    if argv == ["show"]:
+        weights = load_weights()
+        print("%-24s %8s %8s %6s" % ("league", "weight", "sd", "n"))
+        print("%-24s %8.3f %8s %6d" % ("(all)", weights.market_weight(), "",
+                                       weights.pooled.get(DEFAULT_MARKET, [0, 0, 0])[2]))
+        for (league, market), stats in sorted(weights.stats.items(), key=lambda item: str(item[0])):
+            if market == DEFAULT_MARKET:
+                print("%-24s %8.3f %8.3f %6d" % (league, weights.weight(league), weights.uncertainty(league),
+                                                 stats[2]))
+        return 0
+    print("usage: python blend_weights.py settle results.csv | show", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,190 @@
+"""
+Checkpoint and restore of a LivePricingEngine.
+
+A checkpoint is a single binary file: an 8-byte magic, the payload length, a
+CRC32 of the payload, then LivePricingEngine.snapshot() pickled with protocol 5.
+It is written to a temporary file in the same directory, fsynced and renamed
+over the previous checkpoint, so a crash mid-write leaves the last good one in
+place. Loading maps the file and unpickles straight from the mapping. Price
+surfaces are not stored: they are the bulk of the engine's memory, and the
+restored engine rebuilds them from the match states in the background.
+
+Checkpointer does this periodically: the caller's thread only takes the
+snapshot (copies of the per-match dicts and series, so it is consistent), and
+a background thread pickles it and writes the file.
+
+    checkpointer = Checkpointer(engine, "engine.ckpt", interval=30)
+    for match_id, changes in feed:
+        engine.update(match_id, **changes)
+        checkpointer.maybe_save()
+
+    engine = LivePricingEngine(...)
+    restore(engine, "engine.ckpt")
+"""
+import gc
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b"OACKPT01"
+HEADER = struct.Struct("<8sQI")
+
+
+class CheckpointError(Exception):
+    """
+    The file is not a checkpoint, or it is truncated or corrupt.
+    """
+
+
+def dumps(engine):
+    return encode(engine.snapshot())
+
+
+def encode(snapshot):
+    payload = pickle.dumps(snapshot, protocol=5)
+    return HEADER.pack(MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = os.path.join(directory, ".%s.%d.tmp" % (os.path.basename(path), os.getpid()))
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def save(engine, path):
+    data = dumps(engine)
+    write_atomic(path, data)
+    return len(data)
+
+
+def load(path):
+    """
+    The snapshot dict stored in a checkpoint file.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            raise CheckpointError("%s is too short to be a checkpoint" % path)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, length, crc = HEADER.unpack_from(mapped, 0)
+            if magic != MAGIC:
+                raise CheckpointError("%s is not an engine checkpoint" % path)
+            if HEADER.size + length != size:
+                raise CheckpointError("%s is truncated" % path)
+            with memoryview(mapped) as view:
+                payload = view[HEADER.size:]
+                try:
+                    if zlib.crc32(payload) != crc:
+                        raise CheckpointError("%s failed its checksum" % path)
+                    # Unpickling creates only live objects; collecting midway just costs time
+                    enabled = gc.isenabled()
+                    gc.disable()
+                    try:
+                        return pickle.loads(payload)
+                    finally:
+                        if enabled:
+                            gc.enable()
+                finally:
+                    payload.release()
+
+
+def restore(engine, path):
+    """
+    Load a checkpoint into a freshly built engine; returns the engine.
+    """
+    engine.restore_snapshot(load(path))
+    return engine
+
+
+class Checkpointer:
+    def __init__(self, engine, path, interval=30.0):
+        self.engine = engine
+        self.path = path
+        self.interval = interval
+        self.last_saved = time.monotonic()
+        self.saves = 0
+        self.last_size = 0
+        self.last_snapshot_seconds = 0.0  # spent in the caller's thread
+        self.last_pickle_seconds = 0.0    # spent in the writer thread
+        self.error = None
+        self._pending = None
+        self._writing = False
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def maybe_save(self, now=None):
+        """
+        Snapshot the engine if `interval` seconds have passed; cheap otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        if now - self.last_saved < self.interval:
+            return False
+        self.save_async()
+        self.last_saved = now
+        return True
+
+    def save_async(self):
+        start = time.perf_counter()
+        snapshot = self.engine.snapshot()
+        self.last_snapshot_seconds = time.perf_counter() - start
+        with self._cond:
+            # Only the newest snapshot matters if the disk falls behind
+            self._pending = snapshot
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                snapshot, self._pending = self._pending, None
+                if snapshot is None:
+                    return
+                self._writing = True
+            try:
+                start = time.perf_counter()
+                data = encode(snapshot)
+                self.last_pickle_seconds = time.perf_counter() - start
+                write_atomic(self.path, data)
+                self.saves += 1
+                self.last_size = len(data)
+            except OSError as exc:
+                self.error = exc
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wait until the latest snapshot is on disk.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._writing, timeout)
+
+    def close(self, final=True):
+        """
+        Stop the writer, saving one last snapshot first unless final is False.
+        """
+        if final:
+            self.save_async()
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
@@ -1,22 +1,28 @@
 import tkinter as tk
 from tkinter import ttk
-from math import exp, factorial
+
+from bet_ledger import BetLedger
+from match_timeseries import MatchTimeSeries
+from pricing_core import (PROFILES, compute_lambdas, fair_odds, match_odds_recommendation, match_outcome_probabilities,
+                          next_goal_probability, state_from_fields)
+
+# Markets whose bets this view records
+MARKETS = ("match_odds",)
 
 class CombinedFootballBettingModel:
-    def __init__(self, root):
+    def __init__(self, root, ledger=None, match_id="match"):
+        # root is a Tk window, or a frame when hosted by launcher.py
         self.root = root
-        self.root.title("Odds Apex")
+        # Bets recorded from this view go in the ledger under match_id
+        self.match_id = match_id
+        self.pending_bets = []  # (market, selection, recommendation, odds) from the last calculation
+        if isinstance(root, tk.Wm):
+            self.root.title("Odds Apex")
         self.create_widgets()
-        # History maintained for potential future use
-        self.history = {
-            "home_xg": [],
-            "away_xg": [],
-            "home_sot": [],
-            "away_sot": [],
-            "home_possession": [],
-            "away_possession": []
-        }
-        self.history_length = 10  # last 10 updates
+        # In-play stats over time, with momentum features kept up to date per update
+        self.series = MatchTimeSeries()
+        # Open bets; stakes are sized off the balance less their worst-case liability
+        self.ledger = ledger if ledger is not None else BetLedger()
 
     def create_widgets(self):
         # Create a scrollable frame
@@ -88,178 +94,37 @@ class CombinedFootballBettingModel:
         self.output_text.tag_configure("normal", foreground="black")
         self.output_text.config(state="disabled")
 
+        # Record the last recommendation as placed, or clear this view's open bets
+        bet_frame = ttk.Frame(self.scrollable_frame)
+        bet_frame.grid(row=row+1, column=0, columnspan=2, pady=10)
+        ttk.Button(bet_frame, text="Record Bet", command=self.record_bet).grid(row=0, column=0, padx=5)
+        ttk.Button(bet_frame, text="Clear Bets", command=self.clear_bets).grid(row=0, column=1, padx=5)
+        self.ledger_label = ttk.Label(self.scrollable_frame, text="")
+        self.ledger_label.grid(row=row+2, column=0, columnspan=2, pady=5)
+
     def reset_fields(self):
         for var in self.fields.values():
             if isinstance(var, tk.DoubleVar):
                 var.set(0.0)
             elif isinstance(var, tk.IntVar):
                 var.set(0)
-        self.history = {
-            "home_xg": [],
-            "away_xg": [],
-            "home_sot": [],
-            "away_sot": [],
-            "home_possession": [],
-            "away_possession": []
-        }
-
-    # ----- Common Methods -----
-    def zero_inflated_poisson_probability(self, lam, k, p_zero=0.01):
-        """
-        A slight variation of Poisson to allow for 'zero inflation' 
-        (i.e., more 0-goal outcomes than standard Poisson).
-        Loosened by reducing p_zero from 0.06 to 0.02.
-        """
-        if k == 0:
-            return p_zero + (1 - p_zero) * exp(-lam)
-        return (1 - p_zero) * ((lam ** k) * exp(-lam)) / factorial(k)
-
-    def time_decay_adjustment(self, lambda_xg, elapsed_minutes, in_game_xg):
-        """
-        Applies a time-decay factor to the expected goals for the remainder.
-        Loosened by using a gentler decay factor.
-        """
-        remaining_minutes = 90 - elapsed_minutes
-        base_decay = exp(-0.005 * elapsed_minutes)  # gentler decay than before
-        # Lower the floor remains at 0.4
-        base_decay = max(base_decay, 0.4)
-        # If less than 10 minutes remain, scale further
-        if remaining_minutes < 10:
-            base_decay *= 0.75  # was 0.65 before
-        adjusted_lambda = lambda_xg * base_decay
-        # Enforce a minimum
-        adjusted_lambda = max(0.1, adjusted_lambda)
-        return adjusted_lambda
-
-    def adjust_xg_for_scoreline(self, home_goals, away_goals, lambda_home, lambda_away, elapsed_minutes):
-        """
-        Adjust the xG based on the current scoreline.
-        For instance, if a team is leading, they may play more defensively, etc.
-        """
-        goal_diff = home_goals - away_goals
-
-        # Basic scoring-intensity adjustments
-        if goal_diff == 1:
-            lambda_home *= 0.9
-            lambda_away *= 1.2
-        elif goal_diff == -1:
-            lambda_home *= 1.2
-            lambda_away *= 0.9
-        elif abs(goal_diff) >= 2:
-            if goal_diff > 0:
-                lambda_home *= 0.8
-                lambda_away *= 1.3
-            else:
-                lambda_home *= 0.8
-                lambda_away *= 0.8
-
-        # If we are after 75th minute and there's a lead, 
-        # trailing team might push more, leading team might be cautious
-        if elapsed_minutes > 75 and abs(goal_diff) >= 1:
-            if goal_diff > 0:
-                lambda_home *= 0.85
-                lambda_away *= 1.15
-            else:
-                lambda_home *= 1.15
-                lambda_away *= 0.85
-
-        return lambda_home, lambda_away
-
-    def update_history(self, key, value):
-        """
-        Keep a rolling history of the last N values for a particular key (like xG, SoT, etc.).
-        """
-        if key not in self.history:
-            self.history[key] = []
-        if len(self.history[key]) >= self.history_length:
-            self.history[key].pop(0)
-        self.history[key].append(value)
-
-    def dynamic_kelly(self, edge):
-        """
-        Simple Kelly fraction: use 25% of the edge as the stake fraction.
-        """
-        kelly_fraction = 0.25 * edge
-        return max(0, kelly_fraction)
+        self.series.clear()
 
     # ----- Combined Calculation -----
     def calculate_all(self):
-        f = self.fields
-        # Retrieve common inputs
-        home_xg = f["Home Xg"].get()
-        away_xg = f["Away Xg"].get()
-        elapsed_minutes = f["Elapsed Minutes"].get()
-        home_goals = f["Home Goals"].get()
-        away_goals = f["Away Goals"].get()
-        in_game_home_xg = f["In-Game Home Xg"].get()
-        in_game_away_xg = f["In-Game Away Xg"].get()
-        home_possession = f["Home Possession %"].get()
-        away_possession = f["Away Possession %"].get()
-        home_avg_goals_scored = f["Home Avg Goals Scored"].get()
-        home_avg_goals_conceded = f["Home Avg Goals Conceded"].get()
-        away_avg_goals_scored = f["Away Avg Goals Scored"].get()
-        away_avg_goals_conceded = f["Away Avg Goals Conceded"].get()
-        home_sot = f["Home Shots on Target"].get()
-        away_sot = f["Away Shots on Target"].get()
-        home_op_box_touches = f["Home Opp Box Touches"].get()
-        away_op_box_touches = f["Away Opp Box Touches"].get()
-        home_corners = f["Home Corners"].get()
-        away_corners = f["Away Corners"].get()
-        live_next_goal_odds = f["Live Next Goal Odds"].get()  # Not used in insights now
-        live_odds_home = f["Live Odds Home"].get()
-        live_odds_draw = f["Live Odds Draw"].get()
-        live_odds_away = f["Live Odds Away"].get()
-        account_balance = f["Account Balance"].get()
+        state = state_from_fields(self.fields)
+        settings = PROFILES["combined"]
+        account_balance = self.ledger.available_bankroll(state["account_balance"])
 
-        # Update history
-        self.update_history("home_xg", home_xg)
-        self.update_history("away_xg", away_xg)
-        self.update_history("home_sot", home_sot)
-        self.update_history("away_sot", away_sot)
-        self.update_history("home_possession", home_possession)
-        self.update_history("away_possession", away_possession)
+        # Record this update in the match time series
+        self.series.append_fields(self.fields)
 
-        remaining_minutes = 90 - elapsed_minutes
-        fraction_remaining = max(0.0, remaining_minutes / 90.0)
+        # The combined profile's gentler decay, its scoreline rules and every
+        # in-game adjustment scaled by the fraction of the match remaining
+        lambda_home, lambda_away = compute_lambdas(state, "combined")
 
         # --- Next Goal Calculation (for Betting Insights) ---
-        home_xg_remainder = home_xg * fraction_remaining
-        away_xg_remainder = away_xg * fraction_remaining
-
-        lambda_home = self.time_decay_adjustment(home_xg_remainder, elapsed_minutes, in_game_home_xg)
-        lambda_away = self.time_decay_adjustment(away_xg_remainder, elapsed_minutes, in_game_away_xg)
-
-        # Scoreline adjustments
-        lambda_home, lambda_away = self.adjust_xg_for_scoreline(home_goals, away_goals,
-                                                                lambda_home, lambda_away, elapsed_minutes)
-
-        # 15% pre-match weighting scaled by fraction_remaining
-        pm_component_home = (home_avg_goals_scored / max(0.75, away_avg_goals_conceded))
-        pm_component_away = (away_avg_goals_scored / max(0.75, home_avg_goals_conceded))
-        lambda_home = (lambda_home * 0.85) + (pm_component_home * 0.15 * fraction_remaining)
-        lambda_away = (lambda_away * 0.85) + (pm_component_away * 0.15 * fraction_remaining)
-
-        # Scale possession, SoT, box touches, corners, "hot" xG by fraction_remaining
-        lambda_home *= 1 + ((home_possession - 50) / 200) * fraction_remaining
-        lambda_away *= 1 + ((away_possession - 50) / 200) * fraction_remaining
-
-        if in_game_home_xg > 1.2:
-            lambda_home *= (1 + 0.15 * fraction_remaining)
-        if in_game_away_xg > 1.2:
-            lambda_away *= (1 + 0.15 * fraction_remaining)
-
-        lambda_home *= 1 + (home_sot / 20) * fraction_remaining
-        lambda_away *= 1 + (away_sot / 20) * fraction_remaining
-
-        lambda_home *= 1 + ((home_op_box_touches - 20) / 200) * fraction_remaining
-        lambda_away *= 1 + ((away_op_box_touches - 20) / 200) * fraction_remaining
-
-        lambda_home *= 1 + ((home_corners - 4) / 50) * fraction_remaining
-        lambda_away *= 1 + ((away_corners - 4) / 50) * fraction_remaining
-
-        # Calculate next goal probability
-        goal_probability = 1 - exp(-((lambda_home + lambda_away) * (remaining_minutes / 45.0)))
-        goal_probability = max(0.30, min(0.90, goal_probability))
+        goal_probability = next_goal_probability(lambda_home, lambda_away, 90 - state["elapsed_minutes"])
 
         # Determine goal expectation level based on probability thresholds
         if goal_probability < 0.40:
@@ -278,112 +143,30 @@ class CombinedFootballBettingModel:
         lines_insight.append(f"Expected Goals: {expected_goals_range} ({level})")
 
         # --- Match Odds Calculation ---
-        home_xg_remainder_mo = home_xg * fraction_remaining
-        away_xg_remainder_mo = away_xg * fraction_remaining
-
-        lambda_home_mo = self.time_decay_adjustment(home_xg_remainder_mo, elapsed_minutes, in_game_home_xg)
-        lambda_away_mo = self.time_decay_adjustment(away_xg_remainder_mo, elapsed_minutes, in_game_away_xg)
-
-        # Scoreline adjustments
-        lambda_home_mo, lambda_away_mo = self.adjust_xg_for_scoreline(home_goals, away_goals,
-                                                                      lambda_home_mo, lambda_away_mo, elapsed_minutes)
-
-        # Blend with pre-match stats, scaled by fraction_remaining
-        pm_component_home_mo = (home_avg_goals_scored / max(0.75, away_avg_goals_conceded))
-        pm_component_away_mo = (away_avg_goals_scored / max(0.75, home_avg_goals_conceded))
-        lambda_home_mo = (lambda_home_mo * 0.85) + (pm_component_home_mo * 0.15 * fraction_remaining)
-        lambda_away_mo = (lambda_away_mo * 0.85) + (pm_component_away_mo * 0.15 * fraction_remaining)
-
-        # Possession-based tweak, scaled
-        lambda_home_mo *= 1 + ((home_possession - 50) / 200) * fraction_remaining
-        lambda_away_mo *= 1 + ((away_possession - 50) / 200) * fraction_remaining
-
-        # If in-game xG is high, slight boost (scaled)
-        if in_game_home_xg > 1.2:
-            lambda_home_mo *= (1 + 0.15 * fraction_remaining)
-        if in_game_away_xg > 1.2:
-            lambda_away_mo *= (1 + 0.15 * fraction_remaining)
-
-        # Shots, box touches, corners, all scaled
-        lambda_home_mo *= 1 + (home_sot / 20) * fraction_remaining
-        lambda_away_mo *= 1 + (away_sot / 20) * fraction_remaining
-        lambda_home_mo *= 1 + ((home_op_box_touches - 20) / 200) * fraction_remaining
-        lambda_away_mo *= 1 + ((away_op_box_touches - 20) / 200) * fraction_remaining
-        lambda_home_mo *= 1 + ((home_corners - 4) / 50) * fraction_remaining
-        lambda_away_mo *= 1 + ((away_corners - 4) / 50) * fraction_remaining
-
-        # Compute outcome probabilities (0..5 goals for each side in the remainder)
-        home_win_prob = 0
-        away_win_prob = 0
-        draw_prob = 0
-
-        for gh in range(6):
-            for ga in range(6):
-                prob = (self.zero_inflated_poisson_probability(lambda_home_mo, gh) *
-                        self.zero_inflated_poisson_probability(lambda_away_mo, ga))
-                if home_goals + gh > away_goals + ga:
-                    home_win_prob += prob
-                elif home_goals + gh < away_goals + ga:
-                    away_win_prob += prob
-                else:
-                    draw_prob += prob
-
-        total = home_win_prob + away_win_prob + draw_prob
-        if total > 0:
-            home_win_prob /= total
-            away_win_prob /= total
-            draw_prob /= total
-
-        fair_odds_home = 1 / home_win_prob if home_win_prob > 0 else float('inf')
-        fair_odds_draw = 1 / draw_prob if draw_prob > 0 else float('inf')
-        fair_odds_away = 1 / away_win_prob if away_win_prob > 0 else float('inf')
+        # Outcome probabilities (0..5 goals for each side in the remainder)
+        probabilities = match_outcome_probabilities(lambda_home, lambda_away, state["home_goals"],
+                                                    state["away_goals"], settings["p_zero"])
+        fair = [fair_odds(probability) for probability in probabilities]
+        live = [state["live_odds_home"], state["live_odds_draw"], state["live_odds_away"]]
 
         lines_mo = []
+        self.pending_bets = []
         lines_mo.append("--- Match Odds Calculation ---")
-        lines_mo.append(f"Fair Odds - Home: {fair_odds_home:.2f}, Draw: {fair_odds_draw:.2f}, Away: {fair_odds_away:.2f}")
-        lines_mo.append(f"Live Odds - Home: {live_odds_home:.2f}, Draw: {live_odds_draw:.2f}, Away: {live_odds_away:.2f}")
-
-        # Home market
-        if fair_odds_home > live_odds_home:
-            edge = (fair_odds_home - live_odds_home) / fair_odds_home
-            liability = account_balance * self.dynamic_kelly(edge)
-            lay_stake = liability / (live_odds_home - 1) if (live_odds_home - 1) > 0 else 0
-            lines_mo.append(f"Lay Home: Edge: {edge:.2%}, Liability: {liability:.2f}, Lay Stake: {lay_stake:.2f}")
-        elif fair_odds_home < live_odds_home:
-            edge = (live_odds_home - fair_odds_home) / fair_odds_home
-            stake = account_balance * self.dynamic_kelly(edge)
-            profit = stake * (live_odds_home - 1)
-            lines_mo.append(f"Back Home: Edge: {edge:.2%}, Stake: {stake:.2f}, Profit: {profit:.2f}")
-        else:
-            lines_mo.append("Home: No clear edge.")
-
-        # Draw market
-        if fair_odds_draw > live_odds_draw:
-            edge = (fair_odds_draw - live_odds_draw) / fair_odds_draw
-            liability = account_balance * self.dynamic_kelly(edge)
-            lay_stake = liability / (live_odds_draw - 1) if (live_odds_draw - 1) > 0 else 0
-            lines_mo.append(f"Lay Draw: Edge: {edge:.2%}, Liability: {liability:.2f}, Lay Stake: {lay_stake:.2f}")
-        elif fair_odds_draw < live_odds_draw:
-            edge = (live_odds_draw - fair_odds_draw) / fair_odds_draw
-            stake = account_balance * self.dynamic_kelly(edge)
-            profit = stake * (live_odds_draw - 1)
-            lines_mo.append(f"Back Draw: Edge: {edge:.2%}, Stake: {stake:.2f}, Profit: {profit:.2f}")
-        else:
-            lines_mo.append("Draw: No clear edge.")
-
-        # Away market
-        if fair_odds_away > live_odds_away:
-            edge = (fair_odds_away - live_odds_away) / fair_odds_away
-            liability = account_balance * self.dynamic_kelly(edge)
-            lay_stake = liability / (live_odds_away - 1) if (live_odds_away - 1) > 0 else 0
-            lines_mo.append(f"Lay Away: Edge: {edge:.2%}, Liability: {liability:.2f}, Lay Stake: {lay_stake:.2f}")
-        elif fair_odds_away < live_odds_away:
-            edge = (live_odds_away - fair_odds_away) / fair_odds_away
-            stake = account_balance * self.dynamic_kelly(edge)
-            profit = stake * (live_odds_away - 1)
-            lines_mo.append(f"Back Away: Edge: {edge:.2%}, Stake: {stake:.2f}, Profit: {profit:.2f}")
-        else:
-            lines_mo.append("Away: No clear edge.")
+        lines_mo.append(f"Fair Odds - Home: {fair[0]:.2f}, Draw: {fair[1]:.2f}, Away: {fair[2]:.2f}")
+        lines_mo.append(f"Live Odds - Home: {live[0]:.2f}, Draw: {live[1]:.2f}, Away: {live[2]:.2f}")
+
+        for name, fair_price, live_price in zip(("Home", "Draw", "Away"), fair, live):
+            rec = match_odds_recommendation(fair_price, live_price, account_balance, settings["kelly"])
+            if rec["side"] is not None and live_price > 1:
+                self.pending_bets.append(("match_odds", name.lower(), rec, live_price))
+            if rec["side"] == "lay":
+                lines_mo.append(f"Lay {name}: Edge: {rec['edge']:.2%}, Liability: {rec['liability']:.2f}, "
+                                f"Lay Stake: {rec['stake']:.2f}")
+            elif rec["side"] == "back":
+                lines_mo.append(f"Back {name}: Edge: {rec['edge']:.2%}, Stake: {rec['stake']:.2f}, "
+                                f"Profit: {rec['profit']:.2f}")
+            else:
+                lines_mo.append(f"{name}: No clear edge.")
 
         # Combine all lines and display output
         combined_lines = []
@@ -407,6 +190,23 @@ class CombinedFootballBettingModel:
 
         self.output_text.config(state="disabled")
 
+    def record_bet(self):
+        # Enter the last calculation's recommendations in the ledger as matched at the live odds
+        placed = [bet for bet in (self.ledger.place_recommendation(self.match_id, *pending)
+                                  for pending in self.pending_bets) if bet is not None]
+        self.pending_bets = []
+        self.show_ledger(f"Recorded {len(placed)} bet(s)" if placed else "No bet to record")
+
+    def clear_bets(self):
+        # Remove this view's open bets, e.g. once the market has been settled
+        for market in MARKETS:
+            self.ledger.void(self.match_id, market)
+        self.show_ledger("Bets cleared")
+
+    def show_ledger(self, message):
+        self.ledger_label.config(text=f"{message} | Open bets: {self.ledger.open_bets} | "
+                                      f"Open liability: {self.ledger.open_liability:.2f}")
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = CombinedFootballBettingModel(root)
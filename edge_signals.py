@@ -0,0 +1,264 @@
+"""
+Edge-threshold signals with hysteresis, fanned out to subscribers.
+
+EdgeMonitor watches the recommendations in each price dict (next_goal, home,
+draw, away) and emits an EdgeSignal only when a market's edge moves to a
+different threshold level, or switches side. A level is entered when the edge
+reaches its threshold and left only once the edge falls `hysteresis` below
+it, so an edge hovering on a threshold does not flap.
+
+EdgeBus hands each signal to every subscriber through its own bounded queue
+and worker thread. publish() never waits: if a subscriber falls behind, its
+queue fills and further signals for it are dropped and counted, and the
+pricing loop and the other subscribers carry on.
+"""
+import json
+import math
+import queue
+import threading
+import time
+
+MARKETS = ("next_goal", "home", "draw", "away")
+
+
+class EdgeSignal:
+    __slots__ = ("match_id", "market", "side", "level", "previous_level", "edge", "recommendation", "timestamp")
+
+    def __init__(self, match_id, market, side, level, previous_level, edge, recommendation, timestamp):
+        self.match_id = match_id
+        self.market = market
+        self.side = side                      # "back", "lay", or None once closed
+        self.level = level                    # threshold now reached (0.0 when closed)
+        self.previous_level = previous_level
+        self.edge = edge
+        self.recommendation = recommendation  # the pricing_core recommendation dict
+        self.timestamp = timestamp
+
+    @property
+    def kind(self):
+        if not self.level:
+            return "close"
+        if not self.previous_level:
+            return "open"
+        return "up" if self.level > self.previous_level else "down"
+
+    def as_dict(self):
+        out = {name: getattr(self, name) for name in self.__slots__}
+        out["kind"] = self.kind
+        return out
+
+    def __repr__(self):
+        return "EdgeSignal(%s %s %s %s edge=%.4f)" % (self.match_id, self.market, self.kind, self.side, self.edge)
+
+
+class EdgeMonitor:
+    """
+    Per match and market, tracks (side, level) and emits a signal on change.
+    """
+
+    def __init__(self, thresholds=(0.05, 0.10, 0.20), hysteresis=0.02, bus=None, markets=MARKETS):
+        self.thresholds = tuple(sorted(thresholds))
+        self.hysteresis = hysteresis
+        self.bus = bus
+        self.markets = markets
+        self.positions = {}  # (match_id, market) -> (side, level)
+        self.observed = 0
+        self.emitted = 0
+
+    def _level(self, edge, current):
+        """
+        Highest threshold the edge holds: reached outright, or still within
+        the hysteresis band of the level already held.
+        """
+        level = 0.0
+        for threshold in self.thresholds:
+            if edge >= threshold or (threshold <= current and edge >= threshold - self.hysteresis):
+                level = threshold
+            else:
+                break
+        return level
+
+    def observe(self, match_id, prices, timestamp=None):
+        """
+        Check one match's latest prices; returns the signals emitted (usually none).
+        """
+        signals = []
+        self.observed += 1
+        for market in self.markets:
+            rec = prices.get(market)
+            if rec is None:
+                continue
+            side = rec.get("side")
+            edge = rec.get("edge", 0.0) if side is not None else 0.0
+            key = (match_id, market)
+            held_side, held = self.positions.get(key, (None, 0.0))
+            level = self._level(edge, held if side == held_side else 0.0)
+            if side != held_side and held and level:
+                # Switched side: close the old position before opening the new one
+                signals.append(EdgeSignal(match_id, market, None, 0.0, held, edge, rec, timestamp))
+                held = 0.0
+            if level == held:
+                continue
+            if level:
+                self.positions[key] = (side, level)
+            else:
+                self.positions.pop(key, None)
+                side = None
+            signals.append(EdgeSignal(match_id, market, side, level, held, edge, rec, timestamp))
+        if signals:
+            now = time.time() if timestamp is None else timestamp
+            for signal in signals:
+                signal.timestamp = now
+            self._emit(signals)
+        return signals
+
+    def forget(self, match_id, timestamp=None):
+        """
+        Drop a finished match, closing any signals still open for it.
+        """
+        now = time.time() if timestamp is None else timestamp
+        signals = []
+        for market in self.markets:
+            held = self.positions.pop((match_id, market), None)
+            if held is not None:
+                signals.append(EdgeSignal(match_id, market, None, 0.0, held[1], 0.0, None, now))
+        self._emit(signals)
+        return signals
+
+    def _emit(self, signals):
+        self.emitted += len(signals)
+        if self.bus is not None:
+            for signal in signals:
+                self.bus.publish(signal)
+
+
+class Subscription:
+    """
+    One subscriber's queue and worker thread.
+    """
+
+    def __init__(self, handler, maxsize, name):
+        self.handler = handler
+        self.name = name
+        self.queue = queue.Queue(maxsize)
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, name="edge-signals-%s" % name, daemon=True)
+        self.thread.start()
+
+    def offer(self, signal):
+        try:
+            self.queue.put_nowait(signal)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            signal = self.queue.get()
+            if signal is None:
+                break
+            try:
+                self.handler(signal)
+                self.delivered += 1
+            except Exception:
+                # A failing subscriber must not stop its own deliveries or anyone else's
+                self.errors += 1
+
+    def close(self, timeout=None):
+        """
+        Stop the worker once it has delivered what is queued. A queue still
+        full after timeout seconds (a stuck handler) is emptied instead, and
+        its signals counted as dropped.
+        """
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.dropped += 1
+            self.queue.put_nowait(None)
+        self.thread.join(timeout)
+        closer = getattr(self.handler, "close", None)
+        if closer is not None:
+            closer()
+
+
+class EdgeBus:
+    def __init__(self):
+        self.subscriptions = []
+
+    def subscribe(self, handler, maxsize=10000, name=None):
+        """
+        handler is any callable taking an EdgeSignal, e.g. QueueSink or JsonLinesSink.
+        """
+        subscription = Subscription(handler, maxsize, name or str(len(self.subscriptions)))
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.remove(subscription)
+        subscription.close()
+
+    def publish(self, signal):
+        for subscription in self.subscriptions:
+            subscription.offer(signal)
+
+    def stats(self):
+        return {s.name: {"delivered": s.delivered, "dropped": s.dropped, "errors": s.errors, "queued": s.queue.qsize()}
+                for s in self.subscriptions}
+
+    def close(self, timeout=5.0):
+        """
+        Deliver what is queued, then stop every worker.
+        """
+        for subscription in self.subscriptions:
+            subscription.close(timeout)
+        self.subscriptions = []
+
+
+class QueueSink:
+    """
+    Forwards signals to a queue another thread or process reads
+    (queue.Queue, multiprocessing.Queue, ...).
+    """
+
+    def __init__(self, target):
+        self.target = target
+
+    def __call__(self, signal):
+        self.target.put(signal.as_dict())
+
+
+def _finite(value):
+    """
+    value with every infinite or nan float (an unbounded edge, fair odds of a
+    zero probability) replaced by None, which JSON can carry.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+class JsonLinesSink:
+    """
+    Appends each signal to a file as one JSON object per line; infinite and
+    nan numbers are written as null.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "a")
+
+    def __call__(self, signal):
+        self.file.write(json.dumps(_finite(signal.as_dict()), allow_nan=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
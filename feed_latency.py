@@ -0,0 +1,138 @@
+"""
+Feed-to-signal latency and input staleness for the live engine.
+
+Every update a LivePricingEngine receives may carry source_time, the epoch
+time the feed produced it. The engine stamps each input group with it (each
+market's live odds, and the in-game stats; a clock tick or goal alone does
+not refresh the stats)
+and, once the update has been priced, published and passed to the edge
+monitor, records now - source_time here.
+
+Latencies go into fixed log-spaced histograms (8 buckets per decade from
+10 us to 100 s), one for the whole engine and one per match, so recording is
+O(1), memory per match is constant and percentiles are exact to within one
+bucket (about 33%). Suppressed recommendations are counted per reason.
+export() gives everything as a dict for JSON, prometheus() as Prometheus text.
+"""
+import bisect
+from array import array
+
+from pricing_core import RATE_KEYS
+
+# Recommendation in a price dict -> the live odds it was made against
+ODDS_KEYS = {
+    "next_goal": "live_next_goal_odds",
+    "home": "live_odds_home",
+    "draw": "live_odds_draw",
+    "away": "live_odds_away",
+}
+
+# Inputs stamped as "stats": the in-game counters and possession. The score and
+# clock are not stats, so a goal or clock tick does not make old stats look fresh
+STATS_KEYS = frozenset(RATE_KEYS + ("home_possession", "away_possession"))
+
+BUCKETS_PER_DECADE = 8
+# Bucket upper bounds in seconds; one more bucket takes anything slower
+BOUNDS = tuple(10 ** (-5 + i / BUCKETS_PER_DECADE) for i in range(7 * BUCKETS_PER_DECADE + 1))
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = array("L", bytes(array("L").itemsize * (len(BOUNDS) + 1)))
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BOUNDS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile, capped at the largest value seen.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BOUNDS, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class FeedLatency:
+    def __init__(self):
+        self.overall = LatencyHistogram()
+        self.matches = {}  # match_id -> LatencyHistogram
+        self.suppressed = {"stale_odds": 0, "stale_stats": 0}
+        self.out_of_order = 0  # input values dropped for being older than the ones held
+
+    def record(self, match_id, seconds):
+        histogram = self.matches.get(match_id)
+        if histogram is None:
+            histogram = self.matches[match_id] = LatencyHistogram()
+        histogram.record(seconds)
+        self.overall.record(seconds)
+
+    def count_suppressed(self, reason):
+        self.suppressed[reason] += 1
+
+    def count_out_of_order(self, inputs):
+        self.out_of_order += inputs
+
+    def forget(self, match_id):
+        self.matches.pop(match_id, None)
+
+    def export(self, input_ages=None):
+        """
+        Counters and latency summaries; input_ages ({match_id: {input: age}}) is
+        included as-is, e.g. from LivePricingEngine.input_ages().
+        """
+        out = {
+            "latency": self.overall.summary(),
+            "suppressed": dict(self.suppressed),
+            "out_of_order_inputs": self.out_of_order,
+            "matches": {match_id: histogram.summary() for match_id, histogram in self.matches.items()},
+        }
+        if input_ages is not None:
+            out["input_age_seconds"] = input_ages
+        return out
+
+    def prometheus(self, prefix="odds_apex"):
+        """
+        The engine-wide histogram and counters in Prometheus text format.
+        """
+        name = prefix + "_feed_to_signal_seconds"
+        lines = ["# TYPE %s histogram" % name]
+        cumulative = 0
+        for bound, count in zip(BOUNDS, self.overall.counts):
+            cumulative += count
+            lines.append('%s_bucket{le="%.6g"} %d' % (name, bound, cumulative))
+        lines.append('%s_bucket{le="+Inf"} %d' % (name, self.overall.count))
+        lines.append("%s_sum %.9g" % (name, self.overall.total))
+        lines.append("%s_count %d" % (name, self.overall.count))
+        counter = prefix + "_recommendations_suppressed_total"
+        lines.append("# TYPE %s counter" % counter)
+        for reason, count in self.suppressed.items():
+            lines.append('%s{reason="%s"} %d' % (counter, reason, count))
+        counter = prefix + "_out_of_order_inputs_total"
+        lines.append("# TYPE %s counter" % counter)
+        lines.append("%s %d" % (counter, self.out_of_order))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,279 @@
+"""
+Bulk loading and pricing of pre-match fixtures for the Over 2.5 model.
+
+Files are read in chunks of chunk_rows into typed columns (one array per
+PM_Goal input), validated column-wise, and priced a whole chunk at a time
+with batch_pricing.price_fixtures. Rows that fail validation are reported
+and left out of the chunk instead of failing the batch, and memory stays
+bounded by the chunk size however large the file is.
+
+CSV is always supported. Parquet and Arrow IPC (.parquet, .arrow, .feather)
+are read through pyarrow when it is installed.
+"""
+import csv
+import math
+import os
+from array import array
+
+from batch_pricing import price_fixtures
+from pricing_core import FIXTURE_INT_KEYS, FIXTURE_KEYS, FIXTURE_LABELS
+
+# Optional column identifying each fixture, copied through to the output
+ID_COLUMNS = ("fixture", "fixture_id", "match_id", "match")
+# Optional column naming each fixture's league, used to look up blend weights
+LEAGUE_COLUMNS = ("league", "competition", "division")
+
+OUTPUT_KEYS = ("lambda_home", "lambda_away", "over_prob_model", "over_prob", "fair_over")
+
+
+class BadRow:
+    """
+    A row left out of pricing: its line in the file (header is line 1) and why.
+    """
+    __slots__ = ("line", "column", "value", "reason")
+
+    def __init__(self, line, column, value, reason):
+        self.line = line
+        self.column = column
+        self.value = value
+        self.reason = reason
+
+    def __repr__(self):
+        return f"BadRow(line={self.line}, column={self.column!r}, value={self.value!r}, reason={self.reason!r})"
+
+
+class FixtureChunk:
+    """
+    One chunk of valid fixtures: typed columns keyed by FIXTURE_KEYS, the file
+    line of each row, the fixture ids and leagues (if the file has those
+    columns) and the rows rejected from this chunk.
+    """
+
+    def __init__(self, columns, lines, ids, bad_rows, leagues=None):
+        self.columns = columns
+        self.lines = lines
+        self.ids = ids
+        self.leagues = leagues
+        self.bad_rows = bad_rows
+
+    def __len__(self):
+        return len(self.lines)
+
+
+def _resolve_header(header):
+    """
+    Map file column names onto FIXTURE_KEYS; returns ({key: index}, id_index, league_index).
+    """
+    index = {}
+    id_index = league_index = None
+    for i, name in enumerate(header):
+        name = name.strip()
+        key = FIXTURE_LABELS.get(name, name)
+        if key in FIXTURE_KEYS:
+            index[key] = i
+        elif name.lower() in ID_COLUMNS and id_index is None:
+            id_index = i
+        elif name.lower() in LEAGUE_COLUMNS and league_index is None:
+            league_index = i
+    missing = [key for key in FIXTURE_KEYS if key not in index]
+    if missing:
+        raise ValueError("fixture file is missing columns: " + ", ".join(missing))
+    return index, id_index, league_index
+
+
+def _parse_column(key, raw, lines, bad):
+    """
+    Convert one column of strings to floats. The whole column goes through
+    float() in one pass; only if that fails is it re-parsed cell by cell, with
+    unparseable cells recorded in bad and set to nan.
+    """
+    try:
+        return array("d", map(float, raw))
+    except (TypeError, ValueError):
+        pass
+    values = array("d", bytes(8 * len(raw)))
+    for i, text in enumerate(raw):
+        try:
+            values[i] = float(text)
+        except (TypeError, ValueError):
+            values[i] = math.nan
+            bad.setdefault(i, BadRow(lines[i], key, text, "not a number"))
+    return values
+
+
+def _validate(columns, lines, bad):
+    """
+    Column-wise range checks; with numpy each check is one array expression.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    checks = []
+    for key in FIXTURE_KEYS:
+        if key in FIXTURE_INT_KEYS:
+            checks.append((key, "not a whole number", lambda v: v == math.floor(v) if math.isfinite(v) else False))
+        if key.startswith(("avg_goals", "injuries", "home_xg", "away_xg")):
+            checks.append((key, "negative", lambda v: v >= 0))
+        if key == "live_over_odds":
+            # 0 means no market price, as in PM_Goal
+            checks.append((key, "odds must be 0 or above 1", lambda v: v == 0 or v > 1))
+        checks.append((key, "not finite", math.isfinite))
+
+    if np is not None:
+        arrays = {key: np.frombuffer(columns[key], dtype=np.float64) for key in FIXTURE_KEYS}
+        vector_checks = {
+            "not a whole number": lambda v: np.isfinite(v) & (v == np.floor(v)),
+            "negative": lambda v: v >= 0,
+            "odds must be 0 or above 1": lambda v: (v == 0) | (v > 1),
+            "not finite": np.isfinite,
+        }
+        for key, reason, _ in checks:
+            values = arrays[key]
+            for i in np.flatnonzero(~vector_checks[reason](values)):
+                bad.setdefault(int(i), BadRow(lines[i], key, float(values[i]), reason))
+        return
+
+    for key, reason, ok in checks:
+        for i, value in enumerate(columns[key]):
+            if i not in bad and not ok(value):
+                bad[i] = BadRow(lines[i], key, value, reason)
+
+
+def _build_chunk(raw_columns, raw_ids, lines, skipped=(), raw_leagues=None):
+    """
+    Typed, validated chunk from raw cell values; lines holds the file line of
+    each row and skipped any rows already rejected while reading.
+    """
+    n = len(lines)
+    bad = {}
+    columns = {key: _parse_column(key, raw_columns[key], lines, bad) for key in FIXTURE_KEYS}
+    _validate(columns, lines, bad)
+    lines = array("l", lines)
+    ids = raw_ids
+    leagues = raw_leagues
+    if bad:
+        keep = [i for i in range(n) if i not in bad]
+        columns = {key: array("d", (values[i] for i in keep)) for key, values in columns.items()}
+        lines = array("l", (lines[i] for i in keep))
+        if ids is not None:
+            ids = [ids[i] for i in keep]
+        if leagues is not None:
+            leagues = [leagues[i] for i in keep]
+    bad_rows = sorted(list(bad.values()) + list(skipped), key=lambda row: row.line)
+    return FixtureChunk(columns, lines, ids, bad_rows, leagues)
+
+
+def iter_csv_chunks(path, chunk_rows=10000):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        index, id_index, league_index = _resolve_header(header)
+        width = max(max(index.values()), id_index or 0, league_index or 0) + 1
+
+        def empty():
+            return ({key: [] for key in FIXTURE_KEYS}, ([] if id_index is not None else None), [], [],
+                    ([] if league_index is not None else None))
+
+        raw, raw_ids, lines, skipped, raw_leagues = empty()
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                skipped.append(BadRow(reader.line_num, None, len(row), "too few columns"))
+                continue
+            for key, i in index.items():
+                raw[key].append(row[i])
+            if raw_ids is not None:
+                raw_ids.append(row[id_index])
+            if raw_leagues is not None:
+                raw_leagues.append(row[league_index])
+            lines.append(reader.line_num)
+            if len(lines) == chunk_rows:
+                yield _build_chunk(raw, raw_ids, lines, skipped, raw_leagues)
+                raw, raw_ids, lines, skipped, raw_leagues = empty()
+        if lines or skipped:
+            yield _build_chunk(raw, raw_ids, lines, skipped, raw_leagues)
+
+
+def iter_arrow_chunks(path, chunk_rows=10000):
+    """
+    Chunks of at most chunk_rows from a Parquet or Arrow IPC file; needs pyarrow.
+    """
+    import pyarrow as pa
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        with pq.ParquetFile(path) as parquet:
+            yield from _arrow_chunks(parquet.iter_batches(batch_size=chunk_rows), chunk_rows)
+    else:
+        import pyarrow.ipc as ipc
+        with pa.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            yield from _arrow_chunks(batches, chunk_rows)
+
+
+def _arrow_chunks(batches, chunk_rows):
+    first_line = 2
+    for batch in batches:
+        # IPC batches are as large as the writer made them; slicing is zero-copy
+        for offset in range(0, batch.num_rows, chunk_rows):
+            part = batch.slice(offset, chunk_rows)
+            index, id_index, league_index = _resolve_header(part.schema.names)
+            raw = {key: part.column(i).to_pylist() for key, i in index.items()}
+            ids = [str(v) for v in part.column(id_index).to_pylist()] if id_index is not None else None
+            leagues = ([str(v) for v in part.column(league_index).to_pylist()]
+                       if league_index is not None else None)
+            # Typed columns pass straight through _parse_column; nulls come back as bad rows
+            yield _build_chunk(raw, ids, range(first_line, first_line + part.num_rows), (), leagues)
+            first_line += part.num_rows
+
+
+def iter_chunks(path, chunk_rows=10000):
+    if os.path.splitext(path)[1].lower() in (".parquet", ".arrow", ".feather", ".ipc"):
+        return iter_arrow_chunks(path, chunk_rows)
+    return iter_csv_chunks(path, chunk_rows)
+
+
+def price_file(path, blend_factor=None, chunk_rows=10000, compact=False):
+    """
+    Price every valid fixture in a file, one chunk at a time.
+    Yields (chunk, prices) where prices holds OUTPUT_KEYS columns for the chunk's rows.
+    blend_factor may be a blend_weights.BlendWeights, giving each row the
+    current weight of its league (or the market-wide weight without a league
+    column); by default the saved weights (blend_weights.load_weights) are used.
+    """
+    if blend_factor is None:
+        from blend_weights import load_weights
+        blend_factor = load_weights()
+    for chunk in iter_chunks(path, chunk_rows):
+        if len(chunk):
+            factors = blend_factor
+            if hasattr(blend_factor, "blend_factors"):
+                factors = blend_factor.blend_factors(chunk.leagues or [None] * len(chunk))
+            prices = price_fixtures(chunk.columns, factors, compact)
+        else:
+            prices = {key: array("d") for key in OUTPUT_KEYS}
+        yield chunk, prices
+
+
+def price_file_to_csv(path, out_path, blend_factor=None, chunk_rows=10000, compact=False):
+    """
+    Price a fixture file and write one output row per valid fixture.
+    Returns (rows priced, list of BadRow).
+    """
+    priced = 0
+    bad_rows = []
+    with open(out_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("line", "fixture") + OUTPUT_KEYS)
+        for chunk, prices in price_file(path, blend_factor, chunk_rows, compact):
+            bad_rows.extend(chunk.bad_rows)
+            ids = chunk.ids if chunk.ids is not None else [""] * len(chunk)
+            columns = [prices[key] for key in OUTPUT_KEYS]
+            for i in range(len(chunk)):
+                writer.writerow([chunk.lines[i], ids[i]] + [f"{float(c[i]):.6f}" for c in columns])
+            priced += len(chunk)
+    return priced, bad_rows
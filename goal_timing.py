@@ -0,0 +1,223 @@
+"""
+Distribution of the time to the next goal, and who scores it.
+
+IP_Goal reduces the rest of the match to one clamped probability,
+1 - exp(-(lambda_home + lambda_away) * remaining / 45). Here the remaining
+minutes are split into one-minute bins (minute m covers [m, m + 1), up to
+90) with a hazard per team and bin of
+
+    lambda / 45 * decay(minute) / decay(elapsed) * share of the bin still to play
+
+where lambda is the profile's lambda chain and decay is the factor
+time_decay_adjustment applies at a given minute: the exponential decay with
+its floor and the extra cut in the last ten minutes, or the boost for a side
+with in-game xG over 1.5. The hazard therefore starts at IP_Goal's rate and
+drops off as the match gets late; with no decay left to apply, the
+probability of a goal equals IP_Goal's unclamped one. From the hazards,
+
+    home[m], away[m]   probability the next goal is scored in minute m, by that side
+    no_goal            probability of no more goals
+
+Everything is computed for a whole column dict of states at once (numpy, as
+batch_pricing; lambdas come from the active pricing_kernels backend), and
+goal_before() prices "goal before minute X" markets from the result.
+GoalTimingCache keeps the distribution per match state; shared_cache() is the
+one IP_Goal and market_scanner use, so they share one computation per state.
+"""
+from pricing_core import PROFILES, STATE_KEYS
+from pricing_kernels import get_backend
+
+MINUTES = 90
+RATE_SCALE = 45.0  # IP_Goal's remaining / 45
+
+# The inputs a distribution depends on: live odds and the bankroll do not move it
+TIMING_KEYS = tuple(key for key in STATE_KEYS if not key.startswith("live_") and key != "account_balance")
+
+
+def _decay(np, minute, in_game_xg, variant):
+    """
+    time_decay_adjustment's multiplier at `minute`, elementwise.
+    """
+    remaining = 90 - minute
+    if variant == "combined":
+        decay = np.maximum(np.exp(-0.005 * minute), 0.4)
+        return np.where(remaining < 10, decay * 0.75, decay)
+    decay = np.maximum(np.exp(-0.01 * minute), 0.6)
+    late = np.where(remaining < 10, decay * 0.65, decay)
+    return np.where(in_game_xg > 1.5, decay * 1.15, late)
+
+
+def hazards(columns, profile="next_goal", backend=None):
+    """
+    Per-minute goal hazards for a column dict of states (keys as
+    pricing_core.STATE_KEYS). Returns (home, away), each an (n, 90) array.
+    """
+    import numpy as np
+    variant = PROFILES[profile]["variant"]
+    kernels = get_backend(backend) if isinstance(backend, (str, type(None))) else backend
+    lambda_home, lambda_away = kernels.lambda_chain(columns, profile)
+    lambda_home = np.asarray(lambda_home, dtype=np.float64)
+    lambda_away = np.asarray(lambda_away, dtype=np.float64)
+    n = len(lambda_home)
+    elapsed = np.asarray(columns["elapsed_minutes"], dtype=np.float64)[:, None]
+    in_game_home = np.asarray(columns.get("in_game_home_xg", np.zeros(n)), dtype=np.float64)[:, None]
+    in_game_away = np.asarray(columns.get("in_game_away_xg", np.zeros(n)), dtype=np.float64)[:, None]
+
+    start = np.arange(MINUTES, dtype=np.float64)
+    exposure = np.clip(start + 1 - elapsed, 0.0, 1.0)  # share of each minute still to play
+    midpoint = np.maximum(start, elapsed) + exposure / 2
+    home = _decay(np, midpoint, in_game_home, variant) / _decay(np, elapsed, in_game_home, variant)
+    away = _decay(np, midpoint, in_game_away, variant) / _decay(np, elapsed, in_game_away, variant)
+    home *= exposure * (lambda_home / RATE_SCALE)[:, None]
+    away *= exposure * (lambda_away / RATE_SCALE)[:, None]
+    return home, away
+
+
+def next_goal_distribution(columns, profile="next_goal", backend=None):
+    """
+    {"home": (n, 90), "away": (n, 90), "no_goal": (n,)}: the probability that
+    the next goal comes in each minute from each side, and of no more goals.
+    """
+    import numpy as np
+    home_hazard, away_hazard = hazards(columns, profile, backend)
+    total = home_hazard + away_hazard
+    cumulative = np.cumsum(total, axis=1)
+    # P(no goal before minute m) * P(a goal within minute m)
+    in_minute = np.exp(total - cumulative) * -np.expm1(-total)
+    home_share = np.divide(home_hazard, total, out=np.zeros_like(total), where=total > 0)
+    home = in_minute * home_share
+    return {"home": home, "away": in_minute - home, "no_goal": np.exp(-cumulative[:, -1])}
+
+
+def goal_before(distribution, minute, side=None):
+    """
+    Probability that the next goal comes before `minute` (from either side, or
+    "home"/"away" only), per state. Within a minute the probability is taken
+    as spread evenly.
+    """
+    import numpy as np
+    if side is None:
+        probs = distribution["home"] + distribution["away"]
+    else:
+        probs = distribution[side]
+    minute = min(max(float(minute), 0.0), float(MINUTES))
+    whole = int(minute)
+    out = probs[..., :whole].sum(axis=-1)
+    if whole < MINUTES:
+        out = out + (minute - whole) * probs[..., whole]
+    return np.asarray(out)
+
+
+def summary(distribution):
+    """
+    Per state: probability of another goal, of each side scoring next, and the
+    expected and median minute of the next goal given that there is one
+    (nan if no goal is possible).
+    """
+    import numpy as np
+    home = distribution["home"]
+    away = distribution["away"]
+    probs = home + away
+    prob_goal = probs.sum(axis=-1)
+    midpoints = np.arange(MINUTES) + 0.5
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = (probs * midpoints).sum(axis=-1) / prob_goal
+        cumulative = np.cumsum(probs, axis=-1) / prob_goal[..., None]
+    median = np.where(prob_goal > 0, np.argmax(cumulative >= 0.5, axis=-1) + 1.0, np.nan)
+    return {
+        "prob_goal": prob_goal,
+        "prob_home_next": home.sum(axis=-1),
+        "prob_away_next": away.sum(axis=-1),
+        "expected_minute": np.where(prob_goal > 0, expected, np.nan),
+        "median_minute": median,
+    }
+
+
+class GoalTimingCache:
+    """
+    Next goal distributions keyed by match state (TIMING_KEYS), computed on a
+    miss and shared by every caller after that. Each entry also holds its
+    summary() figures as floats. Cached arrays are read-only.
+    The oldest entries are dropped once there are more than max_entries.
+    """
+
+    def __init__(self, profile="next_goal", max_entries=10000, backend=None):
+        self.profile = profile
+        self.max_entries = max_entries
+        self.backend = backend
+        self.entries = {}  # state key -> {"home": (90,), "away": (90,), "no_goal": float, summary() floats}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(state):
+        return tuple(state.get(key, 0.0) for key in TIMING_KEYS)
+
+    def get(self, state):
+        """
+        Distribution for one state dict.
+        """
+        return self.get_many([state])[0]
+
+    def get_many(self, states):
+        """
+        Distributions for a list of state dicts, computing every miss in one
+        vectorised call.
+        """
+        return self._get([self.key(state) for state in states])
+
+    def get_columns(self, columns, n):
+        """
+        Distributions for a column dict of n states (lists or arrays; missing
+        keys count as 0), as get_many.
+        """
+        values = []
+        for key in TIMING_KEYS:
+            column = columns.get(key)
+            if column is None:
+                column = [0.0] * n
+            values.append(column.tolist() if hasattr(column, "tolist") else column)
+        return self._get(list(zip(*values)))
+
+    def _get(self, keys):
+        missing = {key: None for key in keys if key not in self.entries}
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        found = {}
+        if missing:
+            columns = {name: [values[i] for values in missing] for i, name in enumerate(TIMING_KEYS)}
+            distribution = next_goal_distribution(columns, self.profile, self.backend)
+            figures = summary(distribution)
+            for i, key in enumerate(missing):
+                # Rows are copied out of the batch, so dropping an entry frees its memory
+                entry = found[key] = {"home": distribution["home"][i].copy(), "away": distribution["away"][i].copy(),
+                                      "no_goal": float(distribution["no_goal"][i])}
+                entry["home"].flags.writeable = False
+                entry["away"].flags.writeable = False
+                for name, values in figures.items():
+                    entry[name] = float(values[i])
+            self.entries.update(found)
+            excess = len(self.entries) - self.max_entries
+            if excess > 0:
+                for key in list(self.entries)[:excess]:
+                    del self.entries[key]
+        return [found[key] if key in found else self.entries[key] for key in keys]
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+_SHARED = {}  # profile -> GoalTimingCache
+
+
+def shared_cache(profile="next_goal"):
+    """
+    The process-wide GoalTimingCache for a profile.
+    """
+    cache = _SHARED.get(profile)
+    if cache is None:
+        cache = _SHARED[profile] = GoalTimingCache(profile)
+    return cache
@@ -0,0 +1,101 @@
+"""
+One window hosting every Odds Apex model as tabs.
+
+    python launcher.py [next-goal] [match-odds] [combined] [over-2.5] ...
+
+Each tab is one of the app classes (IP_Goal, IP_Match, combined, PM_Goal)
+built inside a frame of a single Tk root, so opening another match or view
+adds a few widgets to a running process instead of starting an interpreter
+with its own Tk. Every tab prices through the same in-process pricing_core,
+whose factorial tables are built once, and the in-play tabs share one
+BetLedger: bets recorded in any tab ("Record Bet") stay open until cleared,
+and each stake is sized off the bankroll left after the open bets of every
+match. An app module is imported the first time one of its views
+is opened. With no arguments one tab of each model is opened.
+"""
+import importlib
+import sys
+import tkinter as tk
+from tkinter import ttk
+
+from bet_ledger import MARKET_OUTCOMES, BetLedger
+
+# view name -> (module, class, tab label, takes the shared ledger)
+VIEWS = {
+    "next-goal": ("IP_Goal", "FootballBettingModel", "Next Goal", True),
+    "match-odds": ("IP_Match", "FootballBettingModel", "Match Odds", True),
+    "combined": ("combined", "CombinedFootballBettingModel", "Combined", True),
+    "over-2.5": ("PM_Goal", "PreMatchGoalModel", "Over 2.5", False),
+}
+
+
+class OddsApexLauncher:
+    def __init__(self, root, ledger=None):
+        self.root = root
+        self.root.title("Odds Apex")
+        self.ledger = ledger if ledger is not None else BetLedger()
+        self.views = {}  # tab widget name -> app instance
+        self.opened = dict.fromkeys(VIEWS, 0)
+        self.create_widgets()
+
+    def create_widgets(self):
+        toolbar = ttk.Frame(self.root)
+        toolbar.grid(row=0, column=0, sticky="ew")
+        for column, (name, (_, _, label, _)) in enumerate(VIEWS.items()):
+            button = ttk.Button(toolbar, text="New " + label, command=lambda name=name: self.open_view(name))
+            button.grid(row=0, column=column, padx=5, pady=5)
+        close_button = ttk.Button(toolbar, text="Close Tab", command=self.close_view)
+        close_button.grid(row=0, column=len(VIEWS), padx=5, pady=5)
+
+        self.notebook = ttk.Notebook(self.root)
+        self.notebook.grid(row=1, column=0, sticky="nsew")
+        self.root.grid_rowconfigure(1, weight=1)
+        self.root.grid_columnconfigure(0, weight=1)
+
+    def open_view(self, name):
+        """
+        Add a tab with a new view of the named model and switch to it; returns the app instance.
+        """
+        module_name, class_name, label, shares_ledger = VIEWS[name]
+        cls = getattr(importlib.import_module(module_name), class_name)
+        frame = ttk.Frame(self.notebook)
+        self.opened[name] += 1
+        title = "%s %d" % (label, self.opened[name])
+        # Bets recorded in a tab are kept in the shared ledger under the tab's title
+        view = cls(frame, ledger=self.ledger, match_id=title) if shares_ledger else cls(frame)
+        self.notebook.add(frame, text=title)
+        self.notebook.select(frame)
+        self.views[str(frame)] = view
+        return view
+
+    def close_view(self):
+        current = self.notebook.select()
+        if not current:
+            return
+        self.notebook.forget(current)
+        view = self.views.pop(current, None)
+        # A closed tab's bets can no longer be cleared from the UI, so they leave the ledger with it
+        match_id = getattr(view, "match_id", None)
+        if match_id is not None:
+            for market in MARKET_OUTCOMES:
+                self.ledger.void(match_id, market)
+        self.root.nametowidget(current).destroy()
+
+
+def main(argv):
+    names = argv or list(VIEWS)
+    unknown = [name for name in names if name not in VIEWS]
+    if unknown:
+        print("unknown view %s; choose from %s" % (", ".join(unknown), ", ".join(VIEWS)), file=sys.stderr)
+        return 2
+    root = tk.Tk()
+    launcher = OddsApexLauncher(root)
+    for name in names:
+        launcher.open_view(name)
+    launcher.notebook.select(0)
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,407 @@
+"""
+Multi-match in-play pricing engine.
+
+Holds the current state of every live match, prices updates with the shared
+pricing core and keeps a precomputed price surface per match so goals and
+clock ticks can be answered by lookup. Between stats updates the accumulating
+stats are carried forward at their per-minute rates (price_surface.project_state),
+whether a price comes from the surface or from a full re-price.
+
+Updates may carry source_time, when the feed produced them. The engine keeps
+the time of the freshest odds for each market and of the freshest stats per
+match; a recommendation whose odds or stats are older than max_input_age is
+withheld (side None, "suppressed" saying why) rather than published. Each
+input value keeps the source_time it came with, and a value older than the
+one already held (a tick delivered out of order) is dropped, so the state
+never holds old values under a newer stamp. The feed-to-signal latency of every update is recorded in self.latency (see
+feed_latency.py).
+"""
+import time
+
+from feed_latency import ODDS_KEYS, STATS_KEYS, FeedLatency
+from pricing_core import (OVER_LINES, PROFILES, RATE_KEYS, match_odds_recommendation, new_state,
+                          next_goal_recommendation, over_probabilities, price_state)
+from match_timeseries import MatchTimeSeries
+from price_surface import SurfaceBuilder, project_state
+
+_RATE_KEYS = frozenset(RATE_KEYS)
+
+
+class LivePricingEngine:
+    def __init__(self, profile="combined", max_extra_goals=5, surfaces=True, publisher=None, ledger=None, signals=None,
+                 max_input_age=10.0, clock=time.time):
+        self.profile = profile
+        self.settings = PROFILES[profile]
+        self.matches = {}  # match_id -> current state dict
+        self.prices = {}   # match_id -> latest price dict
+        self.series = {}   # match_id -> MatchTimeSeries of every update()
+        self.surfaces = SurfaceBuilder(profile, max_extra_goals) if surfaces else None
+        # e.g. a shared_prices.SharedPriceTable; gets every new price
+        self.publisher = publisher
+        # bet_ledger.BetLedger; stakes are sized off the bankroll it leaves available
+        self.ledger = ledger
+        # edge_signals.EdgeMonitor; sees every new price and emits only edge changes
+        self.signals = signals
+        # Seconds after which odds or stats are too old to recommend on; None disables the guard
+        self.max_input_age = max_input_age
+        self.clock = clock  # same epoch as the feed's source_time
+        self.latency = FeedLatency()
+        self.input_times = {}  # match_id -> {"stats" or live odds key: source time}
+        self.value_times = {}  # match_id -> {input key: source time of the value in the state}
+        # match_id -> minute the accumulating stats (RATE_KEYS) were last reported at
+        self.stats_minutes = {}
+
+    def update(self, match_id, source_time=None, source_times=None, **changes):
+        """
+        Apply changed inputs to a match, re-price it and queue a surface refresh.
+        source_time defaults to now. An update merged from several feed ticks
+        (update_scheduler) passes source_times, input key -> when that value was
+        produced, and the oldest of them as source_time.
+        """
+        now = self.clock()
+        stamp = now if source_time is None else source_time
+        state = self._apply(match_id, changes, stamp, source_times or {})
+        prices = price_state(self._pricing_state(self._projected(match_id, state)), self.profile)
+        prices = self.prices[match_id] = self._guard(match_id, prices, now)
+        if self.publisher is not None:
+            self.publisher.publish(match_id, prices)
+        if self.signals is not None:
+            self.signals.observe(match_id, prices)
+        self.latency.record(match_id, self.clock() - stamp)
+        return prices
+
+    def absorb(self, match_id, source_time=None, source_times=None, **changes):
+        """
+        Apply changed inputs to a match without re-pricing it, e.g. an update
+        shed under load (update_scheduler); the next update() or on_goal()
+        prices them. Arguments as update().
+        """
+        stamp = self.clock() if source_time is None else source_time
+        self._apply(match_id, changes, stamp, source_times or {})
+
+    def on_goal(self, match_id, home_goals, away_goals, elapsed_minutes=None, source_time=None):
+        """
+        React to a goal (or a clock move when the score is unchanged) from the
+        price surface, falling back to a full re-price if the surface cannot
+        answer (not built yet, or a minute between its rows); both give the
+        same prices. Stats are left as they were, and so is their age; the next
+        update() carrying stats refreshes both.
+        """
+        now = self.clock()
+        stamp = now if source_time is None else source_time
+        state = self.matches[match_id]
+        changes = {"home_goals": home_goals, "away_goals": away_goals}
+        if elapsed_minutes is not None:
+            changes["elapsed_minutes"] = elapsed_minutes
+        state.update(self._newer(match_id, changes, stamp, {}))
+        home_goals = state["home_goals"]
+        away_goals = state["away_goals"]
+        elapsed_minutes = state["elapsed_minutes"]
+        fair = None
+        if self.surfaces is not None:
+            fair = self.surfaces.lookup(match_id, elapsed_minutes, home_goals, away_goals)
+        if fair is None:
+            prices = price_state(self._pricing_state(self._projected(match_id, state)), self.profile)
+        else:
+            prices = self._with_recommendations(fair, state)
+        prices = self.prices[match_id] = self._guard(match_id, prices, now)
+        if self.publisher is not None:
+            self.publisher.publish(match_id, prices)
+        if self.signals is not None:
+            self.signals.observe(match_id, prices)
+        self.latency.record(match_id, self.clock() - stamp)
+        return prices
+
+    def on_clock(self, match_id, elapsed_minutes, source_time=None):
+        state = self.matches[match_id]
+        return self.on_goal(match_id, state["home_goals"], state["away_goals"], elapsed_minutes, source_time)
+
+    def check_stale(self, now=None):
+        """
+        Withhold recommendations whose inputs have aged past max_input_age since
+        they were priced, publishing the change. Call it periodically when the
+        feed may go quiet; returns the ids of the matches changed.
+        """
+        now = self.clock() if now is None else now
+        changed = []
+        for match_id, prices in list(self.prices.items()):
+            guarded = self._guard(match_id, prices, now)
+            if guarded is prices:
+                continue
+            self.prices[match_id] = guarded
+            if self.publisher is not None:
+                self.publisher.publish(match_id, guarded)
+            if self.signals is not None:
+                self.signals.observe(match_id, guarded)
+            changed.append(match_id)
+        return changed
+
+    def input_ages(self, now=None):
+        """
+        {match_id: {input: seconds since its source time}} for monitoring.
+        """
+        now = self.clock() if now is None else now
+        return {match_id: {key: now - stamp for key, stamp in times.items()}
+                for match_id, times in self.input_times.items()}
+
+    def metrics(self):
+        """
+        Latency percentiles, suppression counters and input ages as one dict.
+        """
+        return self.latency.export(self.input_ages())
+
+    def lookup(self, match_id, minute, home_goals, away_goals):
+        """
+        Fair prices for a hypothetical future state, or None if not on the surface.
+        """
+        if self.surfaces is None:
+            return None
+        return self.surfaces.lookup(match_id, minute, home_goals, away_goals)
+
+    def features(self, match_id):
+        """
+        Current momentum features of a match (see MatchTimeSeries), kept up to date by update().
+        """
+        series = self.series.get(match_id)
+        return series.features if series is not None else None
+
+    def remove(self, match_id):
+        self.matches.pop(match_id, None)
+        self.series.pop(match_id, None)
+        self.prices.pop(match_id, None)
+        self.stats_minutes.pop(match_id, None)
+        self.input_times.pop(match_id, None)
+        self.value_times.pop(match_id, None)
+        self.latency.forget(match_id)
+        if self.surfaces is not None:
+            self.surfaces.discard(match_id)
+        if self.publisher is not None:
+            self.publisher.remove(match_id)
+        if self.signals is not None:
+            self.signals.forget(match_id)
+
+    def close(self):
+        if self.surfaces is not None:
+            self.surfaces.close()
+
+    def snapshot(self):
+        """
+        Everything needed to resume pricing, as plain picklable objects (see
+        checkpoint.py). The parts the engine keeps changing are copied, so the
+        snapshot can be pickled by another thread while pricing goes on; take
+        it from the thread that drives the engine. Price surfaces are left out
+        as restore_snapshot rebuilds them.
+        """
+        return {
+            "profile": self.profile,
+            "matches": {match_id: dict(state) for match_id, state in self.matches.items()},
+            "prices": dict(self.prices),  # price dicts are replaced, never changed
+            "series": {match_id: series.copy() for match_id, series in self.series.items()},
+            "ledger": self.ledger.copy() if self.ledger is not None else None,
+            "signal_positions": dict(self.signals.positions) if self.signals is not None else None,
+            "input_times": {match_id: dict(times) for match_id, times in self.input_times.items()},
+            "value_times": {match_id: dict(times) for match_id, times in self.value_times.items()},
+            "stats_minutes": dict(self.stats_minutes),
+        }
+
+    def restore_snapshot(self, snapshot):
+        """
+        Resume from snapshot(): matches, stats history, ledger and open signals
+        come back as they were; surfaces missing from the snapshot are rebuilt
+        in the background, and prices fall back to the full model until then.
+        """
+        if snapshot["profile"] != self.profile:
+            raise ValueError("snapshot is for profile %r, engine prices %r" % (snapshot["profile"], self.profile))
+        self.matches = snapshot["matches"]
+        self.prices = snapshot["prices"]
+        self.series = snapshot["series"]
+        self.input_times = snapshot.get("input_times", {})
+        self.value_times = snapshot.get("value_times", {})
+        self.stats_minutes = snapshot.get("stats_minutes", {})
+        if snapshot["ledger"] is not None:
+            self.ledger = snapshot["ledger"]
+        if self.signals is not None and snapshot["signal_positions"] is not None:
+            self.signals.positions = snapshot["signal_positions"]
+        if self.surfaces is not None:
+            surfaces = snapshot.get("surfaces", {})
+            self.surfaces.install(surfaces)
+            for match_id, state in self.matches.items():
+                if match_id not in surfaces:
+                    self.surfaces.submit(match_id, self._reported(match_id, state))
+
+    def _apply(self, match_id, changes, stamp, source_times):
+        """
+        Merge changes newer than the values held into the match's state, its
+        time series and input stamps, and queue a surface refresh; returns the state.
+        """
+        changes = self._newer(match_id, changes, stamp, source_times)
+        state = self.matches.get(match_id)
+        if state is None:
+            state = self.matches[match_id] = new_state()
+            self.stats_minutes[match_id] = state["elapsed_minutes"]
+        state.update(changes)
+        if not _RATE_KEYS.isdisjoint(changes):
+            self.stats_minutes[match_id] = state["elapsed_minutes"]
+        series = self.series.get(match_id)
+        if series is None:
+            series = self.series[match_id] = MatchTimeSeries()
+        series.append(state["elapsed_minutes"], state)
+        self._stamp(match_id, changes, stamp, source_times)
+        if self.surfaces is not None:
+            # The surface is built from the stats as reported and projects them itself
+            self.surfaces.submit(match_id, self._reported(match_id, state))
+        return state
+
+    def _newer(self, match_id, changes, stamp, source_times):
+        """
+        changes without the values older than the ones the state already
+        holds, recording the source time of every value kept.
+        """
+        times = self.value_times.setdefault(match_id, {})
+        newer = {}
+        for key, value in changes.items():
+            key_stamp = source_times.get(key, stamp)
+            if key_stamp < times.get(key, key_stamp):
+                continue
+            times[key] = key_stamp
+            newer[key] = value
+        if len(newer) < len(changes):
+            self.latency.count_out_of_order(len(changes) - len(newer))
+        return newer
+
+    def _stamp(self, match_id, changes, stamp, source_times):
+        times = None
+        for key in ODDS_KEYS.values():
+            if key in changes:
+                if times is None:
+                    times = self.input_times.setdefault(match_id, {})
+                key_stamp = source_times.get(key, stamp)
+                # Keep the newest stamp if the feed delivers out of order
+                if key_stamp > times.get(key, key_stamp - 1):
+                    times[key] = key_stamp
+        stats = STATS_KEYS.intersection(changes)
+        if stats:
+            times = self.input_times.setdefault(match_id, {})
+            # As if the merged ticks had arrived one by one: the newest stats tick wins
+            stats_stamp = max(source_times.get(key, stamp) for key in stats)
+            if stats_stamp > times.get("stats", stats_stamp - 1):
+                times["stats"] = stats_stamp
+
+    def _guard(self, match_id, prices, now):
+        """
+        prices with every recommendation made on stale odds or stats replaced by
+        a withheld one; the same dict if nothing is stale.
+        """
+        if self.max_input_age is None:
+            return prices
+        times = self.input_times.get(match_id)
+        if not times:
+            return prices
+        oldest = now - self.max_input_age
+        stats_time = times.get("stats")
+        stale_stats = stats_time is not None and stats_time < oldest
+        guarded = prices
+        for market, odds_key in ODDS_KEYS.items():
+            recommendation = prices.get(market)
+            if recommendation is None or recommendation.get("side") is None:
+                continue
+            if stale_stats:
+                reason = "stale_stats"
+            else:
+                odds_time = times.get(odds_key)
+                if odds_time is None or odds_time >= oldest:
+                    continue
+                reason = "stale_odds"
+            if guarded is prices:
+                guarded = dict(prices)
+            guarded[market] = {"side": None, "edge": 0.0, "suppressed": reason,
+                               "stale_edge": recommendation.get("edge", 0.0)}
+            self.latency.count_suppressed(reason)
+        return guarded
+
+    def _reported(self, match_id, state):
+        """
+        state with the clock at the minute its accumulating stats were reported.
+        """
+        minute = self.stats_minutes.get(match_id, state["elapsed_minutes"])
+        if minute == state["elapsed_minutes"]:
+            return state
+        return dict(state, elapsed_minutes=minute)
+
+    def _projected(self, match_id, state):
+        """
+        state with its accumulating stats carried forward from the minute they
+        were reported to the current one at their per-minute rates, which is
+        the state the price surface prices. Every path prices this, so a price
+        does not depend on whether the surface was ready.
+        """
+        reported = self._reported(match_id, state)
+        if reported is state:
+            return state
+        return project_state(reported, state["elapsed_minutes"], state["home_goals"], state["away_goals"])
+
+    def _pricing_state(self, state):
+        if self.ledger is None:
+            return state
+        return dict(state, account_balance=self.ledger.available_bankroll(state["account_balance"]))
+
+    def _with_recommendations(self, fair, state):
+        prices = dict(fair)
+        prices["over"] = over_probabilities(fair["lambda_home"], fair["lambda_away"],
+                                            state["home_goals"] + state["away_goals"],
+                                            OVER_LINES, self.settings["p_zero"])
+        balance = self._pricing_state(state)["account_balance"]
+        kelly = self.settings["kelly"]
+        prices["next_goal"] = next_goal_recommendation(prices["fair_next_goal"], state["live_next_goal_odds"],
+                                                       balance, kelly)
+        for outcome in ("home", "draw", "away"):
+            prices["prob_" + outcome] = 1 / prices["fair_" + outcome]
+            prices[outcome] = match_odds_recommendation(prices["fair_" + outcome], state["live_odds_" + outcome],
+                                                        balance, kelly)
+        return prices
+
+
+def _self_check():
+    """
+    Replay feed orderings the engine has got wrong before; returns a list of failures.
+    """
+    failures = []
+    now = [1000.0]
+    engine = LivePricingEngine(profile="match_odds", surfaces=False, clock=lambda: now[0])
+    state = new_state(home_xg=1.4, away_xg=1.1, elapsed_minutes=30.0, live_next_goal_odds=2.0,
+                      live_odds_home=2.0, live_odds_draw=3.4, live_odds_away=4.0, account_balance=1000.0)
+    engine.update("m", source_time=1000.0, **state)
+    # A tick from 15 s earlier arrives late: its odds must not replace the newer ones
+    engine.update("m", source_time=985.0, live_odds_home=9.0)
+    if engine.matches["m"]["live_odds_home"] != 2.0:
+        failures.append("out of order odds applied: live_odds_home %r" % engine.matches["m"]["live_odds_home"])
+    if engine.input_times["m"]["live_odds_home"] != 1000.0:
+        failures.append("out of order odds restamped: %r" % engine.input_times["m"]["live_odds_home"])
+    # ...while a newer tick still goes through, and a late goal does not undo the clock
+    engine.update("m", source_time=1001.0, live_odds_home=2.2)
+    engine.on_goal("m", 1, 0, 29.0, source_time=990.0)
+    if engine.matches["m"]["live_odds_home"] != 2.2:
+        failures.append("in order odds dropped")
+    if engine.matches["m"]["elapsed_minutes"] != 30.0:
+        failures.append("out of order clock applied: %r" % engine.matches["m"]["elapsed_minutes"])
+    # Odds gone stale while the feed is quiet are withheld
+    now[0] = 1020.0
+    engine.check_stale()
+    if engine.prices["m"]["home"].get("side") is not None:
+        failures.append("stale odds still recommended")
+    # A snapshot taken for the checkpoint writer does not move with the engine
+    snapshot = engine.snapshot()
+    engine.update("m", source_time=1021.0, home_sot=4, live_odds_home=2.4)
+    if snapshot["matches"]["m"]["live_odds_home"] != 2.2 or len(snapshot["series"]["m"]) != 3:
+        failures.append("snapshot changed by a later update")
+    return failures
+
+
+if __name__ == "__main__":
+    import sys
+
+    problems = _self_check()
+    for problem in problems:
+        print(problem)
+    print("ok" if not problems else "%d failures" % len(problems))
+    sys.exit(1 if problems else 0)
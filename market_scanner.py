@@ -0,0 +1,392 @@
+"""
+Cross-market consistency and overround scanner.
+
+The apps price next goal (IP_Goal), 1X2 (IP_Match, combined) and Over 2.5
+(PM_Goal) separately. scan() takes the live odds of every market for a whole
+card and, in one vectorised pass:
+
+  * computes the overround of each market (book percentage less one),
+  * backs out the remaining-goal lambdas each market is pricing, assuming
+    Poisson goals from the current score: home and away from the 1X2 odds, the
+    total from Over 2.5 and the total from the next goal (another goal in the
+    match) odds,
+  * flags matches whose markets imply totals more than `tolerance` apart, whose
+    1X2 lambdas are that far from our model's or whose next goal total is that
+    far from the model's next goal distribution (goal_timing.shared_cache(),
+    the one IP_Goal shows), or whose book is below zero
+    (an arbitrage) or above max_overround. Lambdas are compared by the gap
+    between their logs, with both floored at LAMBDA_FLOOR. A 1X2 book that is
+    all but decided (an outcome above DECIDED) is left out of the comparisons.
+
+Card columns (lists or arrays, one entry per match):
+
+    elapsed_minutes, home_goals, away_goals
+    live_odds_home, live_odds_draw, live_odds_away      1X2
+    live_over_odds, live_under_odds (optional)          Over/Under 2.5
+    live_next_goal_odds, live_no_goal_odds (optional)   next goal
+    the other pricing_core.STATE_KEYS                   for the model comparison
+
+Odds of 1 or less (or missing columns) mean the market is not offered; its
+results are NaN and it raises no flags. Without the optional second side a
+market has no overround and its implied probability keeps the margin.
+
+Needs numpy.
+"""
+from goal_timing import shared_cache
+from pricing_kernels import get_backend
+
+# Flag bits in the "flags" column
+OVERROUND_NEGATIVE = 1      # a book below 100%: backing every outcome wins
+OVERROUND_HIGH = 2
+MARKETS_DISAGREE = 4        # implied totals from 1X2, Over 2.5 and next goal differ
+MODEL_DISAGREES = 8         # 1X2 lambdas or the next goal total differ from the model's
+FLAG_NAMES = {
+    OVERROUND_NEGATIVE: "overround_negative",
+    OVERROUND_HIGH: "overround_high",
+    MARKETS_DISAGREE: "markets_disagree",
+    MODEL_DISAGREES: "model_disagrees",
+}
+
+MAX_GOALS = 16      # remaining goals per side on the implied-lambda grid
+MIN_LAMBDA = 1e-3
+MAX_LAMBDA = 5.0   # keeps the grid truncation (P(16+ goals)) below 1e-4
+# Lambdas are compared in log space, but never below this, so two near-zero
+# late-match lambdas are not flagged for their ratio alone
+LAMBDA_FLOOR = 0.25
+# A 1X2 book with an outcome priced above this barely pins down its two
+# lambdas, so it is left out of the comparisons. The total from Over 2.5 or
+# the next goal stays well determined however short the price, and a
+# mispriced book is often exactly the one that looks decided.
+DECIDED = 0.90
+
+
+def _column(np, card, key, n):
+    value = card.get(key)
+    if value is None:
+        return np.full(n, np.nan)
+    return np.asarray(value, dtype="float64")
+
+
+def _offered(np, odds):
+    return np.where(odds > 1, odds, np.nan)
+
+
+def _poisson_pmf(np, lam, max_goals):
+    """
+    (n, max_goals) Poisson pmf rows and their derivatives with respect to lambda.
+    """
+    k = np.arange(max_goals)
+    log_fact = np.cumsum(np.log(np.maximum(k, 1)))
+    pmf = np.exp(k * np.log(lam)[:, None] - lam[:, None] - log_fact)
+    shifted = np.zeros_like(pmf)
+    shifted[:, 1:] = pmf[:, :-1]
+    return pmf, shifted - pmf
+
+
+def _win_indices(np, goal_diff):
+    """
+    Home wins with i more goals if the away side scores fewer than i + diff:
+    P(home) = sum_i pmf_home[i] * cdf_away[i + diff - 1], and likewise for away.
+    With the cdfs padded by a leading zero these are the cdf columns to read.
+    """
+    goals = np.arange(MAX_GOALS)[None, :]
+    goal_diff = goal_diff[:, None]
+    return np.clip(goals + goal_diff, 0, MAX_GOALS), np.clip(goals - goal_diff, 0, MAX_GOALS)
+
+
+def _padded_cdf(np, pmf):
+    return np.hstack((np.zeros((len(pmf), 1)), np.cumsum(pmf, axis=1)))
+
+
+# Goal difference -> (log lambda_home, log lambda_away, P(home), P(away)) over a
+# coarse grid of lambdas, built on first use: the nearest grid point to a
+# match's 1X2 starts its Newton iterations, which otherwise can stall on the
+# wrong side of a ridge when one team leads by several goals.
+_START_GRIDS = {}
+
+
+def _start_grid(np, diff):
+    grid = _START_GRIDS.get(diff)
+    if grid is None:
+        logs = np.linspace(np.log(0.02), np.log(MAX_LAMBDA), 30)
+        log_home, log_away = (a.ravel() for a in np.meshgrid(logs, logs, indexing="ij"))
+        home_index, away_index = _win_indices(np, np.full(len(log_home), diff))
+        rows = np.arange(len(log_home))[:, None]
+        pmf_home, _ = _poisson_pmf(np, np.exp(log_home), MAX_GOALS)
+        pmf_away, _ = _poisson_pmf(np, np.exp(log_away), MAX_GOALS)
+        p_home = (pmf_home * _padded_cdf(np, pmf_away)[rows, home_index]).sum(axis=1)
+        p_away = (pmf_away * _padded_cdf(np, pmf_home)[rows, away_index]).sum(axis=1)
+        grid = _START_GRIDS[diff] = (log_home, log_away, p_home, p_away)
+    return grid
+
+
+def implied_match_lambdas(home_p, away_p, goal_diff, iterations=40, tol=1e-7):
+    """
+    Remaining-goal (lambda_home, lambda_away) whose Poisson score grid gives
+    the home and away win probabilities from the current goal difference.
+    Newton steps in log-lambda for every match at once; NaN where the inputs
+    are NaN.
+    """
+    import numpy as np
+
+    n = len(home_p)
+    goal_diff = np.asarray(goal_diff, dtype="float64").astype(int)
+    home_index, away_index = _win_indices(np, goal_diff)
+    valid = np.isfinite(home_p) & np.isfinite(away_p)
+    target_home = np.asarray(home_p, dtype="float64")
+    target_away = np.asarray(away_p, dtype="float64")
+    log_home = np.zeros(n)
+    log_away = np.zeros(n)
+    for diff in np.unique(goal_diff[valid]):
+        rows = np.nonzero(valid & (goal_diff == diff))[0]
+        grid_home, grid_away, grid_p_home, grid_p_away = _start_grid(np, int(diff))
+        distance = ((grid_p_home[None, :] - target_home[rows, None]) ** 2 +
+                    (grid_p_away[None, :] - target_away[rows, None]) ** 2)
+        nearest = distance.argmin(axis=1)
+        log_home[rows] = grid_home[nearest]
+        log_away[rows] = grid_away[nearest]
+    # Last accepted point, its residual and the step taken from it: a step that
+    # makes the residual worse is retried from that point at half the length
+    base_home = log_home.copy()
+    base_away = log_away.copy()
+    base_norm = np.full(n, np.inf)
+    last_home = np.zeros(n)
+    last_away = np.zeros(n)
+    low, high = np.log(MIN_LAMBDA), np.log(MAX_LAMBDA)
+    # Newton only runs on the matches that have not converged yet
+    active = np.nonzero(valid)[0]
+    for _ in range(iterations):
+        if not len(active):
+            break
+        rows = np.arange(len(active))[:, None]
+        lam_home = np.exp(log_home[active])
+        lam_away = np.exp(log_away[active])
+        pmf_home, dpmf_home = _poisson_pmf(np, lam_home, MAX_GOALS)
+        pmf_away, dpmf_away = _poisson_pmf(np, lam_away, MAX_GOALS)
+        zeros = np.zeros((len(active), 1))
+        cdf_home = _padded_cdf(np, pmf_home)
+        cdf_away = _padded_cdf(np, pmf_away)
+        # d/dlambda of a Poisson cdf at k is minus the pmf at k
+        pad_home = np.hstack((zeros, pmf_home))
+        pad_away = np.hstack((zeros, pmf_away))
+        at_home = home_index[active]
+        at_away = away_index[active]
+        cdf_away_at = cdf_away[rows, at_home]
+        cdf_home_at = cdf_home[rows, at_away]
+        f_home = (pmf_home * cdf_away_at).sum(axis=1) - target_home[active]
+        f_away = (pmf_away * cdf_home_at).sum(axis=1) - target_away[active]
+        # Jacobian with respect to log-lambda
+        j11 = (dpmf_home * cdf_away_at).sum(axis=1) * lam_home
+        j12 = -(pmf_home * pad_away[rows, at_home]).sum(axis=1) * lam_away
+        j21 = -(pmf_away * pad_home[rows, at_away]).sum(axis=1) * lam_home
+        j22 = (dpmf_away * cdf_home_at).sum(axis=1) * lam_away
+        det = j11 * j22 - j12 * j21
+        det = np.where(np.abs(det) > 1e-12, det, 1e-12)
+        step_home = (j22 * f_home - j12 * f_away) / det
+        step_away = (j11 * f_away - j21 * f_home) / det
+        # Shorten long steps as a whole, keeping the Newton direction
+        scale = 1.0 / np.maximum(1.0, np.maximum(np.abs(step_home), np.abs(step_away)))
+        step_home = step_home * scale
+        step_away = step_away * scale
+
+        norm = f_home * f_home + f_away * f_away
+        worse = norm > base_norm[active]
+        step_home = np.where(worse, last_home[active] / 2, step_home)
+        step_away = np.where(worse, last_away[active] / 2, step_away)
+        from_home = np.where(worse, base_home[active], log_home[active])
+        from_away = np.where(worse, base_away[active], log_away[active])
+        base_home[active] = from_home
+        base_away[active] = from_away
+        base_norm[active] = np.where(worse, base_norm[active], norm)
+        last_home[active] = step_home
+        last_away[active] = step_away
+        moved_home = np.clip(from_home - step_home, low, high)
+        moved_away = np.clip(from_away - step_away, low, high)
+        keep = np.maximum(np.abs(moved_home - from_home), np.abs(moved_away - from_away)) >= tol
+        log_home[active] = moved_home
+        log_away[active] = moved_away
+        active = active[keep & (norm > 1e-24)]
+    return np.where(valid, np.exp(log_home), np.nan), np.where(valid, np.exp(log_away), np.nan)
+
+
+def implied_over_total(over_p, goals_scored, line=2.5, iterations=40, tol=1e-7):
+    """
+    Remaining-goal total lambda whose Poisson gives over_p for the line.
+    NaN where the line is already beaten or over_p is NaN.
+    """
+    import numpy as np
+
+    need = np.floor(line - np.asarray(goals_scored, dtype="float64")) + 1  # goals still needed
+    valid = np.isfinite(over_p) & (need > 0)
+    need = np.where(valid, need, 1).astype(int)
+    target = np.where(valid, over_p, 0.5)
+    width = int(need.max()) + 1 if len(need) else 1
+    below = np.arange(width)[None, :] < need[:, None]
+    log_lam = np.full(len(target), np.log(1.5))
+    active = np.nonzero(valid)[0]
+    for _ in range(iterations):
+        if not len(active):
+            break
+        lam = np.exp(log_lam[active])
+        pmf, _ = _poisson_pmf(np, lam, width)
+        f = 1 - (pmf * below[active]).sum(axis=1) - target[active]
+        # d/dlambda P(N >= k) is the pmf at k - 1
+        slope = pmf[np.arange(len(lam)), need[active] - 1] * lam
+        step = f / np.where(slope > 1e-12, slope, 1e-12)
+        moved = np.clip(log_lam[active] - np.clip(step, -1, 1), np.log(MIN_LAMBDA), np.log(MAX_LAMBDA))
+        keep = np.abs(moved - log_lam[active]) >= tol
+        log_lam[active] = moved
+        active = active[keep]
+    return np.where(valid, np.exp(log_lam), np.nan)
+
+
+def _log_gap(np, a, b):
+    return np.abs(np.log(np.maximum(a, LAMBDA_FLOOR)) - np.log(np.maximum(b, LAMBDA_FLOOR)))
+
+
+def _nanmax(np, *columns):
+    stacked = np.vstack(columns)
+    out = np.full(stacked.shape[1], np.nan)
+    finite = np.isfinite(stacked)
+    any_finite = finite.any(axis=0)
+    out[any_finite] = np.where(finite, stacked, -np.inf).max(axis=0)[any_finite]
+    return out
+
+
+def scan(card, tolerance=0.15, max_overround=0.10, profile="match_odds", model=None, backend=None):
+    """
+    Scan a card of live odds; returns a dict of columns (numpy arrays) with
+    the overrounds, the implied lambdas and totals, the model's, the largest
+    gaps between them and a "flags" bitmask per match (see FLAG_NAMES).
+    model defaults to comparing with the model when the card has pre-match xG.
+    """
+    import numpy as np
+
+    n = len(card["elapsed_minutes"])
+    home_goals = np.asarray(card["home_goals"], dtype="float64")
+    away_goals = np.asarray(card["away_goals"], dtype="float64")
+    odds = {key: _offered(np, _column(np, card, key, n)) for key in (
+        "live_odds_home", "live_odds_draw", "live_odds_away", "live_over_odds", "live_under_odds",
+        "live_next_goal_odds", "live_no_goal_odds")}
+
+    book_1x2 = 1 / odds["live_odds_home"] + 1 / odds["live_odds_draw"] + 1 / odds["live_odds_away"]
+    book_ou = 1 / odds["live_over_odds"] + 1 / odds["live_under_odds"]
+    book_ng = 1 / odds["live_next_goal_odds"] + 1 / odds["live_no_goal_odds"]
+
+    home_p = 1 / odds["live_odds_home"] / book_1x2
+    away_p = 1 / odds["live_odds_away"] / book_1x2
+    lambda_home, lambda_away = implied_match_lambdas(home_p, away_p, home_goals - away_goals)
+    over_p = np.where(np.isfinite(book_ou), 1 / odds["live_over_odds"] / book_ou, 1 / odds["live_over_odds"])
+    total_over = implied_over_total(np.clip(over_p, 1e-6, 1 - 1e-6), home_goals + away_goals)
+    goal_p = np.where(np.isfinite(book_ng), 1 / odds["live_next_goal_odds"] / book_ng,
+                      1 / odds["live_next_goal_odds"])
+    total_next_goal = -np.log(1 - np.clip(goal_p, 1e-6, 1 - 1e-6))
+    total_1x2 = lambda_home + lambda_away
+
+    with np.errstate(invalid="ignore"):
+        open_1x2 = np.maximum(np.maximum(home_p, away_p), 1 - home_p - away_p) <= DECIDED
+    compare_1x2 = np.where(open_1x2, total_1x2, np.nan)
+
+    out = {
+        "overround_1x2": book_1x2 - 1,
+        "overround_over_under": book_ou - 1,
+        "overround_next_goal": book_ng - 1,
+        "implied_lambda_home": lambda_home,
+        "implied_lambda_away": lambda_away,
+        "implied_total_1x2": total_1x2,
+        "implied_total_over": total_over,
+        "implied_total_next_goal": total_next_goal,
+        "market_gap": _nanmax(np, _log_gap(np, compare_1x2, total_over),
+                              _log_gap(np, compare_1x2, total_next_goal),
+                              _log_gap(np, total_over, total_next_goal)),
+    }
+
+    if model is None:
+        model = "home_xg" in card and "away_xg" in card
+    if model:
+        model_home, model_away = get_backend(backend).lambda_chain(card, profile)
+        out["model_lambda_home"] = np.asarray(model_home, dtype="float64")
+        out["model_lambda_away"] = np.asarray(model_away, dtype="float64")
+        # Remaining goals the next goal distribution expects: minus the log of no more goals
+        timing = shared_cache("next_goal").get_columns(card, n)
+        out["model_total_next_goal"] = -np.log([entry["no_goal"] for entry in timing])
+        out["model_gap"] = _nanmax(np, np.where(open_1x2, _log_gap(np, out["model_lambda_home"], lambda_home), np.nan),
+                                   np.where(open_1x2, _log_gap(np, out["model_lambda_away"], lambda_away), np.nan),
+                                   _log_gap(np, out["model_total_next_goal"], total_next_goal))
+    else:
+        out["model_gap"] = np.full(n, np.nan)
+
+    overrounds = np.vstack((out["overround_1x2"], out["overround_over_under"], out["overround_next_goal"]))
+    with np.errstate(invalid="ignore"):
+        flags = np.where((overrounds < 0).any(axis=0), OVERROUND_NEGATIVE, 0)
+        flags |= np.where((overrounds > max_overround).any(axis=0), OVERROUND_HIGH, 0)
+        flags |= np.where(out["market_gap"] > tolerance, MARKETS_DISAGREE, 0)
+        flags |= np.where(out["model_gap"] > tolerance, MODEL_DISAGREES, 0)
+    out["flags"] = flags
+    return out
+
+
+def flagged(result, ids=None):
+    """
+    (match id or row index, [flag names]) for every flagged match.
+    """
+    out = []
+    for i in result["flags"].nonzero()[0]:
+        flags = int(result["flags"][i])
+        out.append((ids[i] if ids is not None else int(i),
+                    [name for bit, name in FLAG_NAMES.items() if flags & bit]))
+    return out
+
+
+def random_card(n, seed=0, overround=0.05, mispriced=0.05):
+    """
+    Seeded card in the shape scan() takes: pricing_kernels.random_columns
+    states whose 1X2, Over/Under 2.5 and next goal books are priced off the
+    same Poisson lambdas with the given margin, except for a `mispriced`
+    share of matches whose next goal book is priced off twice the total.
+    """
+    import random
+    from math import exp, factorial
+
+    from pricing_core import match_outcome_probabilities
+    from pricing_kernels import random_columns
+
+    rng = random.Random(seed)
+    card = random_columns(n, seed)
+    for key in ("live_over_odds", "live_under_odds", "live_no_goal_odds"):
+        card[key] = []
+    margin = 1 + overround
+
+    def price(p):
+        return 1 / (p * margin) if 0 < p * margin < 1 else 0.0
+
+    for i in range(n):
+        lambda_home = rng.uniform(0.05, 2.5) * (90 - card["elapsed_minutes"][i]) / 90 + 0.02
+        lambda_away = rng.uniform(0.05, 2.2) * (90 - card["elapsed_minutes"][i]) / 90 + 0.02
+        home, draw, away = match_outcome_probabilities(lambda_home, lambda_away, card["home_goals"][i],
+                                                       card["away_goals"][i], 0.0, MAX_GOALS)
+        card["live_odds_home"][i] = price(home)
+        card["live_odds_draw"][i] = price(draw)
+        card["live_odds_away"][i] = price(away)
+        total = lambda_home + lambda_away
+        need = 3 - card["home_goals"][i] - card["away_goals"][i]
+        over = 1 - sum(exp(-total) * total ** k / factorial(k) for k in range(need)) if need > 0 else 1.0
+        card["live_over_odds"].append(price(over) if need > 0 else 0.0)
+        card["live_under_odds"].append(price(1 - over) if need > 0 else 0.0)
+        if rng.random() < mispriced:
+            total *= 2
+        goal = 1 - exp(-total)
+        card["live_next_goal_odds"][i] = price(goal)
+        card["live_no_goal_odds"].append(price(1 - goal))
+    return card
+
+
+def card_from_states(states):
+    """
+    (ids, card) from a {match_id: state dict} mapping such as LivePricingEngine.matches.
+    """
+    ids = list(states)
+    keys = set()
+    for state in states.values():
+        keys.update(state)
+    return ids, {key: [states[match_id].get(key, 0.0) for match_id in ids] for key in keys}
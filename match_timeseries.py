@@ -0,0 +1,186 @@
+"""
+Per-match time series of in-play stats with incremental momentum features.
+
+Every update is appended with its match minute and wall-clock time. The
+features (windowed and EWMA rates for xG, shots on target, corners and box
+touches, plus a possession trend) are maintained as each update arrives from
+running sums and a small window of anchors, so reading them costs nothing and
+no update rescans the history. Long matches are downsampled by halving the
+stored resolution whenever the buffer fills; the features always see every
+update.
+"""
+import time
+from array import array
+from collections import deque
+
+from pricing_core import RATE_KEYS, state_from_fields
+
+# Stats stored per update: the accumulating counters plus possession
+SERIES_KEYS = RATE_KEYS + ("home_possession", "away_possession")
+
+# Short names used in the feature dict, e.g. home_xg_rate
+RATE_NAMES = {
+    "in_game_home_xg": "home_xg", "in_game_away_xg": "away_xg",
+    "home_sot": "home_sot", "away_sot": "away_sot",
+    "home_op_box_touches": "home_box_touches", "away_op_box_touches": "away_box_touches",
+    "home_corners": "home_corners", "away_corners": "away_corners",
+}
+
+
+class MatchTimeSeries:
+    """
+    Append-only series for one match.
+
+    features holds, per counter, "<name>_rate" (per 90 minutes over the last
+    `window` minutes) and "<name>_ewma" (per 90, half-life `half_life`
+    minutes), plus "possession_trend" (recent home possession less the match
+    average) and "home/away_corner_pressure" (corners plus a tenth of the box
+    touches, EWMA per 90).
+    """
+
+    def __init__(self, window=10.0, half_life=5.0, max_points=512):
+        self.window = window
+        self.half_life = half_life
+        self.max_points = max_points
+        self.clear()
+
+    def clear(self):
+        self.minutes = array("d")
+        self.timestamps = array("d")
+        self.columns = {key: array("d") for key in SERIES_KEYS}
+        self.stride = 1      # store every stride-th update
+        self.updates = 0
+        self.last = None     # (minute, values) of the latest update
+        self._anchors = deque()  # (minute, values) covering the rate window
+        self._ewma = dict.fromkeys(RATE_KEYS, 0.0)
+        self._possession_ewma = None
+        self._possession_sum = 0.0  # possession integrated over minutes
+        self._possession_minutes = 0.0
+        self.features = self._empty_features()
+
+    @staticmethod
+    def _empty_features():
+        features = {}
+        for name in RATE_NAMES.values():
+            features[name + "_rate"] = 0.0
+            features[name + "_ewma"] = 0.0
+        features["possession_trend"] = 0.0
+        features["home_corner_pressure"] = 0.0
+        features["away_corner_pressure"] = 0.0
+        return features
+
+    def append(self, minute, stats, timestamp=None):
+        """
+        Record one update; stats is a state dict (missing keys count as 0).
+        A minute earlier than the last one is treated as a corrected feed and
+        starts the series again.
+        """
+        values = tuple(float(stats.get(key, 0.0)) for key in SERIES_KEYS)
+        if self.last is not None and minute < self.last[0]:
+            self.clear()
+        self._store(minute, values, time.time() if timestamp is None else timestamp)
+        self._update_features(minute, values)
+        self.last = (minute, values)
+        self.updates += 1
+        return self.features
+
+    def append_fields(self, fields, timestamp=None):
+        """
+        Record the current contents of an app's tk variables.
+        """
+        state = state_from_fields(fields)
+        return self.append(state["elapsed_minutes"], state, timestamp)
+
+    def _store(self, minute, values, timestamp):
+        if self.updates % self.stride:
+            return
+        if len(self.minutes) >= self.max_points:
+            # Keep every other stored point and halve the resolution from here on
+            self.minutes = self.minutes[::2]
+            self.timestamps = self.timestamps[::2]
+            for key in SERIES_KEYS:
+                self.columns[key] = self.columns[key][::2]
+            self.stride *= 2
+            if self.updates % self.stride:
+                return
+        self.minutes.append(minute)
+        self.timestamps.append(timestamp)
+        for key, value in zip(SERIES_KEYS, values):
+            self.columns[key].append(value)
+
+    def _update_features(self, minute, values):
+        features = self.features
+        anchors = self._anchors
+        anchors.append((minute, values))
+        # Drop anchors once the next one also lies at or before the window start
+        while len(anchors) > 2 and anchors[1][0] <= minute - self.window:
+            anchors.popleft()
+        start_minute, start_values = anchors[0]
+        span = minute - start_minute
+        if span > 0:
+            for i, key in enumerate(RATE_KEYS):
+                features[RATE_NAMES[key] + "_rate"] = (values[i] - start_values[i]) / span * 90
+
+        home_possession = values[-2]
+        if self.last is None:
+            self._possession_ewma = home_possession
+            return
+        last_minute, last_values = self.last
+        dt = minute - last_minute
+        if dt <= 0:
+            return
+        alpha = 1 - 0.5 ** (dt / self.half_life)
+        for i, key in enumerate(RATE_KEYS):
+            rate = (values[i] - last_values[i]) / dt * 90
+            self._ewma[key] += alpha * (rate - self._ewma[key])
+            features[RATE_NAMES[key] + "_ewma"] = self._ewma[key]
+
+        self._possession_sum += home_possession * dt
+        self._possession_minutes += dt
+        self._possession_ewma += alpha * (home_possession - self._possession_ewma)
+        features["possession_trend"] = self._possession_ewma - self._possession_sum / self._possession_minutes
+
+        ewma = self._ewma
+        features["home_corner_pressure"] = ewma["home_corners"] + 0.1 * ewma["home_op_box_touches"]
+        features["away_corner_pressure"] = ewma["away_corners"] + 0.1 * ewma["away_op_box_touches"]
+
+    def copy(self):
+        """
+        An independent copy, e.g. for a snapshot pickled by another thread.
+        """
+        other = object.__new__(MatchTimeSeries)
+        other.__dict__.update(self.__dict__)
+        other.minutes = self.minutes[:]
+        other.timestamps = self.timestamps[:]
+        other.columns = {key: column[:] for key, column in self.columns.items()}
+        other._anchors = deque(self._anchors)
+        other._ewma = dict(self._ewma)
+        other.features = dict(self.features)
+        return other
+
+    def __getstate__(self):
+        # The stored points pickle as one block of doubles rather than an array per column
+        state = dict(self.__dict__)
+        packed = self.minutes + self.timestamps
+        for key in SERIES_KEYS:
+            packed.extend(self.columns[key])
+        state["minutes"] = packed
+        del state["timestamps"], state["columns"]
+        return state
+
+    def __setstate__(self, state):
+        packed = state.pop("minutes")
+        self.__dict__.update(state)
+        count = len(packed) // (len(SERIES_KEYS) + 2)
+        self.minutes = packed[:count]
+        self.timestamps = packed[count:2 * count]
+        self.columns = {key: packed[(i + 2) * count:(i + 3) * count] for i, key in enumerate(SERIES_KEYS)}
+
+    def column(self, key):
+        """
+        (minutes, values) arrays for one stored stat.
+        """
+        return self.minutes, self.columns[key]
+
+    def __len__(self):
+        return len(self.minutes)
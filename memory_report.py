@@ -0,0 +1,291 @@
+"""
+Memory profiling by pipeline stage, for batch and streaming use.
+
+Uses tracemalloc. Each stage is bracketed with get_traced_memory() and
+reset_peak(), which is cheap enough to wrap every call: "retained" is what
+the stage left allocated and "transient" is how far above its starting point
+memory peaked while it ran (score grids, temporary floats). The session peak
+also takes in what is allocated between stages and by other threads, such as
+the surface builder. Snapshots are
+only taken at the ends of a session, to attribute the retained memory to
+source files and to find the lines that keep growing.
+
+batch   prices n states and n fixtures through the batch_pricing stages and
+        reports bytes per match for each stage
+stream  drives a LivePricingEngine through a seeded session of ticks, samples
+        traced memory as it goes, and reports peak and steady-state memory
+        per match and the growth rate, flagged if it is above --max-growth
+
+    python memory_report.py [batch|stream|all] [--out=report.json] [--n=10000]
+                            [--matches=50] [--ticks=20000] [--max-growth=0.05]
+
+The report is JSON, printed or written to --out.
+"""
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from batch_pricing import _goal_probability, fixture_lambdas, random_fixtures
+from pricing_core import PROFILES
+from pricing_kernels import get_backend, random_columns
+
+# Source files whose retained memory is reported separately in stream mode
+TRACKED_FILES = ("live_engine.py", "pricing_core.py", "price_surface.py", "match_timeseries.py",
+                 "bet_ledger.py", "shared_prices.py")
+
+
+class StageProfiler:
+    """
+    Accumulates retained and transient bytes per named stage, and the highest
+    traced memory of the whole session. Each stage resets tracemalloc's peak,
+    so the peak since the last reset is folded in first; call sample_peak()
+    once more at the end of the session.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.peak_bytes = 0
+
+    def sample_peak(self):
+        self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+        return self.peak_bytes
+
+    @contextmanager
+    def stage(self, name):
+        self.sample_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_bytes = max(self.peak_bytes, peak)
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = {"calls": 0, "retained_bytes": 0, "transient_peak_bytes": 0}
+            stats["calls"] += 1
+            stats["retained_bytes"] += current - start
+            stats["transient_peak_bytes"] = max(stats["transient_peak_bytes"], peak - start)
+
+    def report(self, per=1, unit="match"):
+        """
+        Stage figures, also divided by `per` (matches, ticks) under "..._per_<unit>".
+        """
+        out = {}
+        for name, stats in self.stages.items():
+            row = dict(stats)
+            row["retained_bytes_per_" + unit] = stats["retained_bytes"] / per
+            row["transient_peak_bytes_per_" + unit] = stats["transient_peak_bytes"] / per
+            out[name] = row
+        return out
+
+
+# --- batch ---
+
+
+def profile_batch(n=10000, backend=None, compact=False):
+    kernels = get_backend(backend)
+    dtype = "float32" if compact else "float64"
+    tracemalloc.start()
+    states = StageProfiler()
+    with states.stage("inputs"):
+        columns = random_columns(n)
+        if kernels.name != "python":
+            import numpy as np
+            columns = {key: np.asarray(value, dtype=dtype) for key, value in columns.items()}
+    with states.stage("lambda_chain"):
+        lambda_home, lambda_away = kernels.lambda_chain(columns, "match_odds", dtype=dtype)
+    with states.stage("outcome_probabilities"):
+        probabilities = kernels.outcome_probabilities(lambda_home, lambda_away, columns["home_goals"],
+                                                      columns["away_goals"], PROFILES["match_odds"]["p_zero"],
+                                                      dtype=dtype)
+    with states.stage("goal_probability"):
+        goal = _goal_probability(lambda_home, lambda_away, columns["elapsed_minutes"], dtype)
+    del columns, lambda_home, lambda_away, probabilities, goal
+
+    fixtures = StageProfiler()
+    with fixtures.stage("inputs"):
+        columns = random_fixtures(n)
+        if kernels.name != "python":
+            import numpy as np
+            columns = {key: np.asarray(value, dtype=dtype) for key, value in columns.items()}
+    with fixtures.stage("fixture_lambdas"):
+        lambda_home, lambda_away = fixture_lambdas(columns, dtype)
+    with fixtures.stage("under_probabilities"):
+        kernels.under_probabilities(lambda_home, lambda_away, 2.5, 10, 0.0, dtype=dtype)
+    fixtures.sample_peak()
+    tracemalloc.stop()
+    return {
+        "n": n,
+        "backend": kernels.name,
+        "compact": compact,
+        "states": states.report(n),
+        "fixtures": fixtures.report(n),
+        "peak_bytes": max(states.peak_bytes, fixtures.peak_bytes),
+    }
+
+
+# --- streaming ---
+
+
+def tick_feed(matches, ticks, seed=0):
+    """
+    Seeded feed of (match_id, changes): the clock and in-game counters creep
+    forward, with the occasional goal.
+    """
+    rng = random.Random(seed)
+    state = {}
+    for i in range(ticks):
+        match_id = "m%d" % rng.randrange(matches)
+        s = state.get(match_id)
+        if s is None:
+            s = state[match_id] = {"elapsed_minutes": 0.0, "home_goals": 0, "away_goals": 0,
+                                   "in_game_home_xg": 0.0, "in_game_away_xg": 0.0, "home_sot": 0, "away_sot": 0,
+                                   "home_corners": 0, "away_corners": 0, "home_possession": 50.0,
+                                   "away_possession": 50.0, "home_xg": rng.uniform(0.8, 2.2),
+                                   "away_xg": rng.uniform(0.6, 1.8), "live_odds_home": 2.4,
+                                   "live_odds_draw": 3.3, "live_odds_away": 3.1, "live_next_goal_odds": 1.9,
+                                   "account_balance": 1000.0}
+        if s["elapsed_minutes"] >= 95:
+            # Full time: the next tick for this id is a new match
+            del state[match_id]
+            yield match_id, None
+            continue
+        s["elapsed_minutes"] = min(95.0, s["elapsed_minutes"] + rng.uniform(0.2, 1.5))
+        s["in_game_home_xg"] += rng.expovariate(40)
+        s["in_game_away_xg"] += rng.expovariate(50)
+        s["home_sot"] += rng.random() < 0.05
+        s["away_sot"] += rng.random() < 0.04
+        s["home_corners"] += rng.random() < 0.06
+        s["away_corners"] += rng.random() < 0.05
+        s["home_possession"] = min(75.0, max(25.0, s["home_possession"] + rng.uniform(-1, 1)))
+        s["away_possession"] = 100 - s["home_possession"]
+        if rng.random() < 0.02:
+            s["home_goals" if rng.random() < 0.55 else "away_goals"] += 1
+        yield match_id, dict(s)
+
+
+def _slope(points):
+    """
+    Least-squares slope of (x, y) points.
+    """
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / sxx if sxx else 0.0
+
+
+def _by_file(snapshot):
+    sizes = dict.fromkeys(TRACKED_FILES, 0)
+    for stat in snapshot.statistics("filename"):
+        name = stat.traceback[0].filename.replace("\\", "/").rsplit("/", 1)[-1]
+        if name in sizes:
+            sizes[name] += stat.size
+    return sizes
+
+
+def profile_stream(matches=50, ticks=20000, samples=50, surfaces=True, max_growth=0.05, seed=0, top=10):
+    """
+    A match takes about 110 of its own ticks to reach full time and be
+    removed, so ticks should be several times 110 * matches for the session
+    to reach a steady state of matches finishing and being replaced
+    (the defaults finish each id about three times).
+
+    Steady-state memory is the mean of the samples after the first half of the
+    session; growth is the slope over that second half, reported per 1000
+    ticks and flagged if the second half grew by more than max_growth of the
+    steady state.
+    """
+    from live_engine import LivePricingEngine
+
+    # One frame per trace: deeper tracebacks slow every allocation tenfold or more
+    tracemalloc.start()
+    engine = LivePricingEngine(surfaces=surfaces)
+    profiler = StageProfiler()
+    every = max(1, ticks // samples)
+    points = []
+    half_snapshot = None
+    start = time.perf_counter()
+    for i, (match_id, changes) in enumerate(tick_feed(matches, ticks, seed)):
+        if changes is None:
+            with profiler.stage("remove"):
+                engine.remove(match_id)
+        else:
+            with profiler.stage("update"):
+                engine.update(match_id, **changes)
+        if (i + 1) % every == 0:
+            current = tracemalloc.get_traced_memory()[0]
+            points.append((i + 1, current))
+            if half_snapshot is None and i + 1 >= ticks // 2:
+                half_snapshot = tracemalloc.take_snapshot()
+    elapsed = time.perf_counter() - start
+    if engine.surfaces is not None:
+        engine.surfaces.wait_idle(5.0)
+    profiler.sample_peak()
+    end_snapshot = tracemalloc.take_snapshot()
+    retained_by_file = _by_file(end_snapshot)
+    growing = []
+    if half_snapshot is not None:
+        for stat in end_snapshot.compare_to(half_snapshot, "lineno")[:top]:
+            if stat.size_diff <= 0:
+                break
+            frame = stat.traceback[0]
+            growing.append({"where": "%s:%d" % (frame.filename, frame.lineno),
+                            "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff})
+    live = len(engine.matches)
+    engine.close()
+    tracemalloc.stop()
+
+    second_half = [p for p in points if p[0] > ticks // 2] or points
+    steady = sum(y for _, y in second_half) / len(second_half)
+    slope = _slope(second_half)
+    half_growth = slope * (ticks - ticks // 2)
+    return {
+        "matches": matches,
+        "live_matches_at_end": live,
+        "matches_finished": profiler.stages.get("remove", {}).get("calls", 0),
+        "ticks": ticks,
+        "surfaces": surfaces,
+        "ticks_per_second": ticks / elapsed,
+        "peak_bytes": profiler.peak_bytes,
+        "steady_state_bytes": steady,
+        "steady_state_bytes_per_match": steady / max(1, live),
+        "growth_bytes_per_1000_ticks": slope * 1000,
+        "growth_flagged": half_growth > max_growth * steady,
+        "retained_bytes_by_file": retained_by_file,
+        "top_growing_lines": growing,
+        "stages": profiler.report(ticks, "tick"),
+        "samples": points,
+    }
+
+
+def main(argv):
+    args = [a for a in argv if not a.startswith("--")]
+    flags = dict((a.split("=", 1) + [""])[:2] for a in argv if a.startswith("--"))
+    mode = args[0] if args else "all"
+    report = {"python": platform.python_version(), "platform": platform.platform()}
+    if mode in ("batch", "all"):
+        report["batch"] = profile_batch(int(flags.get("--n") or 10000), flags.get("--backend") or None,
+                                        "--compact" in flags)
+    if mode in ("stream", "all"):
+        report["stream"] = profile_stream(int(flags.get("--matches") or 50), int(flags.get("--ticks") or 20000),
+                                          surfaces="--no-surfaces" not in flags,
+                                          max_growth=float(flags.get("--max-growth") or 0.05))
+    text = json.dumps(report, indent=2)
+    if flags.get("--out"):
+        with open(flags["--out"], "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report.get("stream", {}).get("growth_flagged") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,146 @@
+"""
+Headless command-line pricing, one subcommand per model.
+
+    python odds_cli.py next-goal  home_xg=1.6 away_xg=1.1 elapsed_minutes=60 live_next_goal_odds=2.4
+    python odds_cli.py match-odds --json states.json
+    python odds_cli.py combined   --csv states.csv
+    python odds_cli.py over-2.5   --json - < fixtures.json
+
+Inputs are key=value arguments, a JSON object or list of objects (--json,
+"-" for stdin) or a CSV file with one input per row (--csv). Keys are
+pricing_core.STATE_KEYS (over-2.5: FIXTURE_KEYS) or the apps' field labels;
+anything missing is zero, as in a freshly opened app window. Fields that are
+not model inputs, such as a match id, are copied to the output unchanged.
+over-2.5 blends each fixture with the learned weight of its "league" field
+(blend_weights.py; PM_Goal's 70/30 blend until results have been settled).
+Output is one JSON object per input, one per line.
+
+Start-up loads no tkinter, numpy or app module: only argparse, json and csv,
+and pricing_core once the arguments have been parsed. Cold start is measured
+by benchmarks/bench_cli_startup.py.
+"""
+import argparse
+import json
+import sys
+
+# subcommand -> (pricing_core profile, output keys); over-2.5 is the pre-match model
+MODELS = {
+    "next-goal": ("next_goal", ("lambda_home", "lambda_away", "goal_probability", "fair_next_goal", "next_goal")),
+    "match-odds": ("match_odds", ("lambda_home", "lambda_away", "prob_home", "prob_draw", "prob_away",
+                                  "fair_home", "fair_draw", "fair_away", "home", "draw", "away")),
+    "combined": ("combined", None),
+    "over-2.5": (None, None),
+}
+
+
+def _schema(model):
+    """
+    (input keys, integer keys, label -> key) for a subcommand.
+    """
+    import pricing_core
+    if MODELS[model][0] is None:
+        return pricing_core.FIXTURE_KEYS, frozenset(pricing_core.FIXTURE_INT_KEYS), pricing_core.FIXTURE_LABELS
+    return pricing_core.STATE_KEYS, frozenset(("home_goals", "away_goals")), pricing_core.FIELD_KEYS
+
+
+def parse_input(model, values, where="input"):
+    """
+    Split a {name: value} mapping into (model inputs, pass-through fields).
+    Raises ValueError naming `where` for a value that is not a number.
+    """
+    keys, int_keys, labels = _schema(model)
+    inputs = dict.fromkeys(keys, 0.0)
+    for key in int_keys:
+        inputs[key] = 0
+    extra = {}
+    for name, value in values.items():
+        key = labels.get(name, name)
+        if key not in inputs:
+            extra[name] = value
+            continue
+        if value is None or value == "":
+            continue
+        try:
+            inputs[key] = int(float(value)) if key in int_keys else float(value)
+        except (TypeError, ValueError):
+            raise ValueError("%s: %s=%r is not a number" % (where, name, value)) from None
+    return inputs, extra
+
+
+def price(model, inputs, weights=None, league=None):
+    """
+    The model's output dict for parsed inputs; over-2.5 takes its blend
+    weight for `league` from weights (a blend_weights.BlendWeights).
+    """
+    import pricing_core
+    profile, keys = MODELS[model]
+    if profile is None:
+        if weights is None:
+            return pricing_core.price_fixture(inputs)
+        return pricing_core.price_fixture(inputs, weights.weight(league))
+    prices = pricing_core.price_state(inputs, profile)
+    if keys is None:
+        return prices
+    return {key: prices[key] for key in keys}
+
+
+def read_inputs(args):
+    """
+    Yield (mapping, where) for every input given on the command line.
+    """
+    if args.json is not None:
+        if args.json == "-":
+            data = json.load(sys.stdin)
+        else:
+            with open(args.json) as f:
+                data = json.load(f)
+        items = data if isinstance(data, list) else [data]
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValueError("%s: item %d is not an object" % (args.json, i))
+            yield item, "%s item %d" % (args.json, i)
+    if args.csv is not None:
+        import csv
+        f = sys.stdin if args.csv == "-" else open(args.csv, newline="")
+        with f:
+            reader = csv.DictReader(f)
+            for line, row in enumerate(reader, 2):
+                yield {name.strip(): value for name, value in row.items() if name is not None}, \
+                    "%s line %d" % (args.csv, line)
+    if args.values or (args.json is None and args.csv is None):
+        values = {}
+        for arg in args.values:
+            name, sep, value = arg.partition("=")
+            if not sep:
+                raise ValueError("expected key=value, got %r" % arg)
+            values[name.strip()] = value
+        yield values, "arguments"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price in-play states or pre-match fixtures without the GUI.")
+    parser.add_argument("model", choices=tuple(MODELS))
+    parser.add_argument("values", nargs="*", help="inputs as key=value")
+    parser.add_argument("--json", metavar="FILE", help="JSON object or list of objects; - reads stdin")
+    parser.add_argument("--csv", metavar="FILE", help="CSV with a header row; - reads stdin")
+    parser.add_argument("--indent", type=int, default=None, help="pretty-print each output")
+    args = parser.parse_args(argv)
+
+    write = sys.stdout.write
+    weights = None
+    if MODELS[args.model][0] is None:
+        from blend_weights import load_weights
+        weights = load_weights()
+    try:
+        for values, where in read_inputs(args):
+            inputs, extra = parse_input(args.model, values, where)
+            out = dict(extra)
+            out.update(price(args.model, inputs, weights, extra.get("league") or None))
+            write(json.dumps(out, indent=args.indent) + "\n")
+    except (OSError, ValueError) as e:
+        parser.exit(1, "odds_cli: %s\n" % e)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Precomputed in-play price surfaces.
+
+For a live match the surface holds fair odds for every reachable future state:
+the current minute and each whole minute after it x home goals x away goals,
+with the in-game stats projected forward at their current per-minute rates.
+Reacting to a goal or to the clock is then a table lookup instead of a full
+re-price. A minute between two rows is not interpolated: lookup() returns
+None and the caller re-prices, so a price never depends on whether it came
+from the surface.
+"""
+import threading
+from array import array
+from math import floor
+
+from pricing_core import (PROFILES, RATE_KEYS, compute_lambdas, fair_odds,
+                          match_outcome_probabilities, next_goal_probability)
+
+# Inputs that only move the clock, the score or the market. A change in any
+# other input invalidates the surface.
+_LOOKUP_KEYS = frozenset((
+    "elapsed_minutes", "home_goals", "away_goals",
+    "live_next_goal_odds", "live_odds_home", "live_odds_draw", "live_odds_away",
+    "account_balance",
+))
+
+
+def surface_key(state):
+    """
+    The part of a state a surface is built from; equal keys give equal surfaces.
+    """
+    return tuple(sorted((k, v) for k, v in state.items() if k not in _LOOKUP_KEYS))
+
+
+def project_state(state, minute, home_goals, away_goals):
+    """
+    The state at a later minute and score, with accumulating stats held at their current rates.
+    """
+    projected = dict(state)
+    elapsed = state["elapsed_minutes"]
+    if elapsed > 0 and minute != elapsed:
+        growth = minute / elapsed
+        for key in RATE_KEYS:
+            projected[key] = state[key] * growth
+    projected["elapsed_minutes"] = minute
+    projected["home_goals"] = home_goals
+    projected["away_goals"] = away_goals
+    return projected
+
+
+def _row_count(start_minute):
+    """
+    Rows from start_minute to full time, one per whole minute (one row if the
+    match is already past 90).
+    """
+    return max(0, int(floor(90 - start_minute))) + 1
+
+
+class PriceSurface:
+    """
+    Fair odds over (minute, home goals, away goals) for one match state.
+
+    The lambda chain only sees the score through the goal difference, so each
+    minute is stored as one row per reachable goal difference and lookups by
+    absolute score index into that row. Rows are filled minute by minute
+    (fill_minute) so a surface can be served while it is still being built.
+    """
+
+    def __init__(self, state, profile="combined", max_extra_goals=5):
+        self.state = dict(state)
+        self.key = surface_key(state)
+        self.profile = profile
+        self.p_zero = PROFILES[profile]["p_zero"]
+        self.max_extra_goals = max_extra_goals
+        self.home_goals = state["home_goals"]
+        self.away_goals = state["away_goals"]
+        # Rows at start_minute + k, so the state's own minute is on the grid
+        self.start_minute = max(0.0, float(state["elapsed_minutes"]))
+        # rows[minute - start_minute][diff - base_diff + max_extra_goals]
+        self.rows = [None] * _row_count(self.start_minute)
+        self.filled = 0
+        self._packed = None
+
+    @property
+    def minutes(self):
+        return [self.start_minute + k for k in range(len(self.rows))]
+
+    @property
+    def complete(self):
+        return self.filled == len(self.rows)
+
+    def fill_minute(self, minute):
+        """
+        Price every reachable goal difference at one minute.
+        """
+        row = []
+        for offset in range(-self.max_extra_goals, self.max_extra_goals + 1):
+            # Any score with this difference gives the same prices
+            home_goals = self.home_goals + max(0, offset)
+            away_goals = self.away_goals + max(0, -offset)
+            projected = project_state(self.state, minute, home_goals, away_goals)
+            lambda_home, lambda_away = compute_lambdas(projected, self.profile)
+            goal_probability = next_goal_probability(lambda_home, lambda_away, 90 - minute)
+            home_p, draw_p, away_p = match_outcome_probabilities(lambda_home, lambda_away,
+                                                                 home_goals, away_goals, self.p_zero)
+            row.append((lambda_home, lambda_away, goal_probability,
+                        fair_odds(home_p), fair_odds(draw_p), fair_odds(away_p)))
+        index = int(round(minute - self.start_minute))
+        if self.rows[index] is None:
+            self.filled += 1
+        self.rows[index] = row
+
+    def fill(self):
+        for minute in self.minutes:
+            self.fill_minute(minute)
+        return self
+
+    # A complete surface is pickled as one flat array of doubles rather than
+    # ~6000 float objects; the array is built once and reused by later
+    # checkpoints, and a restored surface decodes its rows as they are looked up.
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if self.complete:
+            if self._packed is None:
+                packed = array("d")
+                for index in range(len(self.rows)):
+                    for values in self._row(index):
+                        packed.extend(values)
+                self._packed = packed
+            state["rows"] = None
+            state["_packed"] = self._packed
+        else:
+            state["_packed"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.rows is None:
+            self.rows = [None] * _row_count(self.start_minute)
+
+    def _row(self, index):
+        row = self.rows[index]
+        if row is None and self._packed is not None:
+            width = 6 * (2 * self.max_extra_goals + 1)
+            flat = self._packed[index * width:(index + 1) * width]
+            row = self.rows[index] = [tuple(flat[i:i + 6]) for i in range(0, width, 6)]
+        return row
+
+    def lookup(self, minute, home_goals, away_goals):
+        """
+        Fair prices at a future minute and score, or None if that state is
+        unreachable from this surface, its minute is not on the surface's grid
+        of whole minutes from start_minute, or has not been built yet.
+        """
+        extra_home = home_goals - self.home_goals
+        extra_away = away_goals - self.away_goals
+        if extra_home < 0 or extra_away < 0:
+            return None
+        if extra_home > self.max_extra_goals or extra_away > self.max_extra_goals:
+            return None
+        offset = minute - self.start_minute
+        index = int(round(offset))
+        if index < 0 or index >= len(self.rows) or abs(offset - index) > 1e-9:
+            return None
+        row = self.rows[index]
+        if row is None:
+            row = self._row(index)
+            if row is None:
+                return None
+        lambda_home, lambda_away, goal_probability, fair_home, fair_draw, fair_away = \
+            row[extra_home - extra_away + self.max_extra_goals]
+        return {
+            "lambda_home": lambda_home,
+            "lambda_away": lambda_away,
+            "goal_probability": goal_probability,
+            "fair_next_goal": 1 / goal_probability,
+            "fair_home": fair_home,
+            "fair_draw": fair_draw,
+            "fair_away": fair_away,
+        }
+
+
+class SurfaceBuilder:
+    """
+    Background thread that keeps a PriceSurface per match up to date.
+
+    submit() only records the latest state for a match; the worker builds the
+    surface minute by minute starting from the current minute and publishes it
+    as soon as the first minute is ready. If a newer state for the same match
+    arrives mid-build the stale build is abandoned. States whose surface_key
+    has not changed (clock, score or market moves only) are not rebuilt.
+    """
+
+    def __init__(self, profile="combined", max_extra_goals=5):
+        self.profile = profile
+        self.max_extra_goals = max_extra_goals
+        self.surfaces = {}
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="surface-builder", daemon=True)
+        self._thread.start()
+
+    def submit(self, match_id, state):
+        with self._cond:
+            current = self.surfaces.get(match_id)
+            if match_id not in self._pending and current is not None and current.key == surface_key(state):
+                return False
+            self._pending[match_id] = dict(state)
+            self._cond.notify()
+        return True
+
+    def discard(self, match_id):
+        with self._cond:
+            # A None entry also cancels a build already in progress
+            self._pending[match_id] = None
+            self.surfaces.pop(match_id, None)
+            self._cond.notify()
+
+    def lookup(self, match_id, minute, home_goals, away_goals):
+        surface = self.surfaces.get(match_id)
+        if surface is None:
+            return None
+        return surface.lookup(minute, home_goals, away_goals)
+
+    def export(self):
+        """
+        The complete surfaces, for a checkpoint; surfaces still being built are left out.
+        """
+        with self._cond:
+            return {match_id: surface for match_id, surface in self.surfaces.items()
+                    if surface.complete and match_id not in self._pending}
+
+    def install(self, surfaces):
+        """
+        Adopt surfaces restored from a checkpoint.
+        """
+        with self._cond:
+            self.surfaces.update(surfaces)
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """
+        Block until every submitted state has a complete surface.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and all(s.complete for s in self.surfaces.values()),
+                timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                match_id, state = self._pending.popitem()
+                if state is None:
+                    self.surfaces.pop(match_id, None)
+                    self._cond.notify_all()
+                    continue
+            surface = PriceSurface(state, self.profile, self.max_extra_goals)
+            for minute in surface.minutes:
+                surface.fill_minute(minute)
+                with self._cond:
+                    if self._closed or match_id in self._pending:
+                        break
+                    if surface.filled == 1:
+                        self.surfaces[match_id] = surface
+            with self._cond:
+                self._cond.notify_all()
@@ -0,0 +1,437 @@
+"""
+Headless pricing maths shared by the Odds Apex apps.
+
+The functions here reproduce the calculations in IP_Goal.py, IP_Match.py,
+combined.py and PM_Goal.py without touching tkinter, so they can be driven
+from plain dicts of inputs. A "profile" selects which app's variant of the
+decay, scoreline and staking rules is used.
+"""
+from math import exp, lgamma, log
+
+# Per-app model settings. IP_Goal and IP_Match share the same lambda chain and
+# differ only in their Kelly fraction; combined.py has its own gentler decay,
+# scoreline rules and scales every in-game adjustment by the fraction remaining.
+PROFILES = {
+    "next_goal": {"p_zero": 0.06, "kelly": 0.05, "variant": "in_play"},
+    "match_odds": {"p_zero": 0.06, "kelly": 0.25, "variant": "in_play"},
+    "combined": {"p_zero": 0.01, "kelly": 0.25, "variant": "combined"},
+}
+
+# GUI field label -> state dict key
+FIELD_KEYS = {
+    "Home Avg Goals Scored": "home_avg_goals_scored",
+    "Home Avg Goals Conceded": "home_avg_goals_conceded",
+    "Away Avg Goals Scored": "away_avg_goals_scored",
+    "Away Avg Goals Conceded": "away_avg_goals_conceded",
+    "Home Xg": "home_xg",
+    "Away Xg": "away_xg",
+    "Elapsed Minutes": "elapsed_minutes",
+    "Home Goals": "home_goals",
+    "Away Goals": "away_goals",
+    "In-Game Home Xg": "in_game_home_xg",
+    "In-Game Away Xg": "in_game_away_xg",
+    "Home Possession %": "home_possession",
+    "Away Possession %": "away_possession",
+    "Home Shots on Target": "home_sot",
+    "Away Shots on Target": "away_sot",
+    "Home Opp Box Touches": "home_op_box_touches",
+    "Away Opp Box Touches": "away_op_box_touches",
+    "Home Corners": "home_corners",
+    "Away Corners": "away_corners",
+    "Live Next Goal Odds": "live_next_goal_odds",
+    "Live Odds Home": "live_odds_home",
+    "Live Odds Draw": "live_odds_draw",
+    "Live Odds Away": "live_odds_away",
+    "Account Balance": "account_balance",
+}
+
+STATE_KEYS = tuple(FIELD_KEYS.values())
+
+# Total goals lines priced alongside the match odds
+OVER_LINES = (0.5, 1.5, 2.5, 3.5, 4.5)
+
+# In-game counters that accumulate over the match (as opposed to possession,
+# which is a share, or the pre-match averages, which are fixed).
+RATE_KEYS = (
+    "in_game_home_xg", "in_game_away_xg",
+    "home_sot", "away_sot",
+    "home_op_box_touches", "away_op_box_touches",
+    "home_corners", "away_corners",
+)
+
+
+def new_state(**values):
+    """
+    Build an in-play state dict with every input defaulted to zero,
+    the same as a freshly opened (or reset) app window.
+    """
+    state = dict.fromkeys(STATE_KEYS, 0.0)
+    state["home_goals"] = 0
+    state["away_goals"] = 0
+    state.update(values)
+    return state
+
+
+def state_from_fields(fields):
+    """
+    Read a state dict out of an app's tk variables.
+    """
+    return new_state(**{FIELD_KEYS[label]: var.get() for label, var in fields.items() if label in FIELD_KEYS})
+
+
+# log(k!) for k = 0, 1, ...; grown on demand by log_factorials()
+_LOG_FACTORIAL = [lgamma(k + 1) for k in range(16)]
+
+
+def log_factorials(n):
+    """
+    Table of log(k!) with at least n entries.
+    """
+    table = _LOG_FACTORIAL
+    for k in range(len(table), n):
+        table.append(lgamma(k + 1))
+    return table
+
+
+def zero_inflated_poisson_probability(lam, k, p_zero=0.06):
+    if k == 0:
+        return p_zero + (1 - p_zero) * exp(-lam)
+    if lam == 0:
+        return 0.0
+    # In log space, so large k or lam neither overflows lam ** k nor k!
+    p = (1 - p_zero) * exp(k * log(abs(lam)) - lam - log_factorials(k + 1)[k])
+    # PM_Goal's expected goals can go negative; keep the sign lam ** k gives
+    return -p if lam < 0 and k % 2 else p
+
+
+def zip_pmf(lam, max_goals, p_zero=0.06):
+    """
+    [P(0), ..., P(max_goals - 1)] of the zero-inflated Poisson, for any
+    max_goals. Matches zero_inflated_poisson_probability term by term.
+    """
+    if lam <= 0:
+        return [zero_inflated_poisson_probability(lam, k, p_zero) for k in range(max_goals)]
+    log_fact = _LOG_FACTORIAL if len(_LOG_FACTORIAL) >= max_goals else log_factorials(max_goals)
+    log_lam = log(lam)
+    scale = 1 - p_zero
+    pmf = [scale * exp(k * log_lam - lam - lf) for k, lf in zip(range(max_goals), log_fact)]
+    pmf[0] = p_zero + scale * exp(-lam)
+    return pmf
+
+
+def time_decay_adjustment(lambda_xg, elapsed_minutes, in_game_xg, variant="in_play"):
+    remaining_minutes = 90 - elapsed_minutes
+    if variant == "combined":
+        base_decay = max(exp(-0.005 * elapsed_minutes), 0.4)
+        if remaining_minutes < 10:
+            base_decay *= 0.75
+    else:
+        base_decay = max(exp(-0.01 * elapsed_minutes), 0.6)
+        if in_game_xg > 1.5:
+            base_decay *= 1.15
+        elif remaining_minutes < 10:
+            base_decay *= 0.65
+    return max(0.1, lambda_xg * base_decay)
+
+
+def adjust_xg_for_scoreline(home_goals, away_goals, lambda_home, lambda_away, elapsed_minutes, variant="in_play"):
+    goal_diff = home_goals - away_goals
+    if variant == "combined":
+        if goal_diff == 1:
+            lambda_home *= 0.9
+            lambda_away *= 1.2
+        elif goal_diff == -1:
+            lambda_home *= 1.2
+            lambda_away *= 0.9
+        elif abs(goal_diff) >= 2:
+            lambda_home *= 0.8
+            lambda_away *= 1.3 if goal_diff > 0 else 0.8
+        if elapsed_minutes > 75 and abs(goal_diff) >= 1:
+            if goal_diff > 0:
+                lambda_home *= 0.85
+                lambda_away *= 1.15
+            else:
+                lambda_home *= 1.15
+                lambda_away *= 0.85
+        return lambda_home, lambda_away
+
+    if goal_diff == 1:
+        lambda_home *= 0.9
+        lambda_away *= 1.2
+    elif goal_diff == -1:
+        lambda_home *= 1.2
+        lambda_away *= 0.9
+    elif goal_diff == 0:
+        lambda_home *= 1.05
+        lambda_away *= 1.05
+    elif abs(goal_diff) >= 2:
+        lambda_home *= 0.8
+        lambda_away *= 1.3 if goal_diff > 0 else 0.8
+    if elapsed_minutes > 75 and abs(goal_diff) >= 1:
+        lambda_home *= 0.85
+        lambda_away *= 1.15 if goal_diff > 0 else 0.85
+    return lambda_home, lambda_away
+
+
+def dynamic_kelly(edge, kelly_fraction=0.25):
+    return max(0, kelly_fraction * edge)
+
+
+def compute_lambdas(state, profile="match_odds"):
+    """
+    Run the lambda multiplier chain for the remainder of the match.
+    Returns (lambda_home, lambda_away).
+    """
+    variant = PROFILES[profile]["variant"]
+    s = state
+    elapsed_minutes = s["elapsed_minutes"]
+    remaining_minutes = 90 - elapsed_minutes
+
+    if variant == "combined":
+        # Every in-game adjustment is scaled by the share of the match left
+        scale = max(0.0, remaining_minutes / 90.0)
+        base_home = s["home_xg"] * scale
+        base_away = s["away_xg"] * scale
+    else:
+        scale = 1.0
+        base_home = s["in_game_home_xg"] + (s["home_xg"] * remaining_minutes / 90)
+        base_away = s["in_game_away_xg"] + (s["away_xg"] * remaining_minutes / 90)
+
+    lambda_home = time_decay_adjustment(base_home, elapsed_minutes, s["in_game_home_xg"], variant)
+    lambda_away = time_decay_adjustment(base_away, elapsed_minutes, s["in_game_away_xg"], variant)
+
+    lambda_home, lambda_away = adjust_xg_for_scoreline(s["home_goals"], s["away_goals"],
+                                                       lambda_home, lambda_away, elapsed_minutes, variant)
+
+    pm_component_home = s["home_avg_goals_scored"] / max(0.75, s["away_avg_goals_conceded"])
+    pm_component_away = s["away_avg_goals_scored"] / max(0.75, s["home_avg_goals_conceded"])
+    lambda_home = (lambda_home * 0.85) + (pm_component_home * 0.15 * scale)
+    lambda_away = (lambda_away * 0.85) + (pm_component_away * 0.15 * scale)
+
+    lambda_home *= 1 + ((s["home_possession"] - 50) / 200) * scale
+    lambda_away *= 1 + ((s["away_possession"] - 50) / 200) * scale
+
+    if s["in_game_home_xg"] > 1.2:
+        lambda_home *= (1 + 0.15 * scale)
+    if s["in_game_away_xg"] > 1.2:
+        lambda_away *= (1 + 0.15 * scale)
+
+    lambda_home *= 1 + (s["home_sot"] / 20) * scale
+    lambda_away *= 1 + (s["away_sot"] / 20) * scale
+
+    lambda_home *= 1 + ((s["home_op_box_touches"] - 20) / 200) * scale
+    lambda_away *= 1 + ((s["away_op_box_touches"] - 20) / 200) * scale
+    lambda_home *= 1 + ((s["home_corners"] - 4) / 50) * scale
+    lambda_away *= 1 + ((s["away_corners"] - 4) / 50) * scale
+
+    return lambda_home, lambda_away
+
+
+def next_goal_probability(lambda_home, lambda_away, remaining_minutes):
+    """
+    Probability of another goal in the remaining minutes, clamped to [0.30, 0.90].
+    """
+    goal_probability = 1 - exp(-((lambda_home + lambda_away) * (remaining_minutes / 45.0)))
+    return max(0.30, min(0.90, goal_probability))
+
+
+def match_outcome_probabilities(lambda_home, lambda_away, home_goals, away_goals, p_zero=0.06, max_goals=6):
+    """
+    Home/draw/away probabilities from a max_goals x max_goals grid of remaining goals,
+    normalised over the grid. Returns (home, draw, away).
+    """
+    pmf_home = zip_pmf(lambda_home, max_goals, p_zero)
+    pmf_away = zip_pmf(lambda_away, max_goals, p_zero)
+    home_win = 0
+    away_win = 0
+    draw = 0
+    for gh in range(max_goals):
+        for ga in range(max_goals):
+            prob = pmf_home[gh] * pmf_away[ga]
+            if home_goals + gh > away_goals + ga:
+                home_win += prob
+            elif home_goals + gh < away_goals + ga:
+                away_win += prob
+            else:
+                draw += prob
+    total = home_win + away_win + draw
+    if total > 0:
+        home_win /= total
+        away_win /= total
+        draw /= total
+    return home_win, draw, away_win
+
+
+def over_probabilities(lambda_home, lambda_away, goals_scored, lines=OVER_LINES, p_zero=0.06, max_goals=6):
+    """
+    Probability that the final total goals go over each line, from the same
+    normalised grid of remaining goals as the match odds.
+    """
+    pmf_home = zip_pmf(lambda_home, max_goals, p_zero)
+    pmf_away = zip_pmf(lambda_away, max_goals, p_zero)
+    totals = [0.0] * (2 * max_goals - 1)
+    for gh in range(max_goals):
+        for ga in range(max_goals):
+            totals[gh + ga] += pmf_home[gh] * pmf_away[ga]
+    grid_total = sum(totals)
+    overs = []
+    for line in lines:
+        over = sum(p for extra, p in enumerate(totals) if goals_scored + extra > line)
+        overs.append(over / grid_total if grid_total > 0 else 0.0)
+    return overs
+
+
+def fair_odds(probability):
+    return 1 / probability if probability > 0 else float('inf')
+
+
+def match_odds_recommendation(fair, live, account_balance, kelly_fraction=0.25):
+    """
+    Lay/back recommendation for one 1X2 selection, as printed by IP_Match and combined.
+    Returns a dict with "side" of "lay", "back" or None.
+    """
+    if fair > live:
+        edge = (fair - live) / fair
+        liability = account_balance * dynamic_kelly(edge, kelly_fraction)
+        lay_stake = liability / (live - 1) if (live - 1) > 0 else 0
+        return {"side": "lay", "edge": edge, "liability": liability, "stake": lay_stake}
+    if fair < live:
+        edge = (live - fair) / fair
+        stake = account_balance * dynamic_kelly(edge, kelly_fraction)
+        return {"side": "back", "edge": edge, "stake": stake, "profit": stake * (live - 1)}
+    return {"side": None, "edge": 0.0}
+
+
+def next_goal_recommendation(fair, live, account_balance, kelly_fraction=0.05):
+    """
+    Lay/back recommendation for the next goal market, as printed by IP_Goal.
+    """
+    if live > 0 and fair > live:
+        edge = (fair - live) / fair
+        liability = account_balance * dynamic_kelly(edge, kelly_fraction)
+        profit = liability / (live - 1) if (live - 1) > 0 else 0
+        return {"side": "lay", "edge": edge, "liability": liability, "profit": profit}
+    if live > 0 and live > fair:
+        edge = (live - fair) / fair
+        stake = account_balance * dynamic_kelly(edge, kelly_fraction)
+        return {"side": "back", "edge": edge, "stake": stake, "profit": stake * (live - 1)}
+    return {"side": None, "edge": 0.0}
+
+
+def price_state(state, profile="match_odds"):
+    """
+    Price one in-play state: lambdas, next goal and 1X2 fair odds plus
+    recommendations against whatever live odds the state carries.
+    """
+    settings = PROFILES[profile]
+    lambda_home, lambda_away = compute_lambdas(state, profile)
+    goal_probability = next_goal_probability(lambda_home, lambda_away, 90 - state["elapsed_minutes"])
+    home_p, draw_p, away_p = match_outcome_probabilities(lambda_home, lambda_away,
+                                                         state["home_goals"], state["away_goals"],
+                                                         settings["p_zero"])
+    prices = {
+        "lambda_home": lambda_home,
+        "lambda_away": lambda_away,
+        "goal_probability": goal_probability,
+        "fair_next_goal": 1 / goal_probability,
+        "prob_home": home_p,
+        "prob_draw": draw_p,
+        "prob_away": away_p,
+        "fair_home": fair_odds(home_p),
+        "fair_draw": fair_odds(draw_p),
+        "fair_away": fair_odds(away_p),
+        "over": over_probabilities(lambda_home, lambda_away, state["home_goals"] + state["away_goals"],
+                                   OVER_LINES, settings["p_zero"]),
+    }
+    balance = state["account_balance"]
+    prices["next_goal"] = next_goal_recommendation(prices["fair_next_goal"], state["live_next_goal_odds"],
+                                                   balance, settings["kelly"])
+    for outcome in ("home", "draw", "away"):
+        prices[outcome] = match_odds_recommendation(prices["fair_" + outcome], state["live_odds_" + outcome],
+                                                    balance, settings["kelly"])
+    return prices
+
+
+# ----- Pre-match (PM_Goal) -----
+FIXTURE_KEYS = (
+    "avg_goals_home_scored", "avg_goals_home_conceded",
+    "avg_goals_away_scored", "avg_goals_away_conceded",
+    "injuries_home", "injuries_away",
+    "position_home", "position_away",
+    "form_home", "form_away",
+    "home_xg_scored", "away_xg_scored",
+    "home_xg_conceded", "away_xg_conceded",
+    "live_over_odds",
+)
+
+FIXTURE_INT_KEYS = ("injuries_home", "injuries_away", "position_home", "position_away", "form_home", "form_away")
+
+# PM_Goal's field labels, accepted alongside FIXTURE_KEYS wherever fixtures are read
+FIXTURE_LABELS = dict(zip((
+    "Avg Goals Home Scored", "Avg Goals Home Conceded", "Avg Goals Away Scored", "Avg Goals Away Conceded",
+    "Injuries Home", "Injuries Away", "Position Home", "Position Away",
+    "Form Home", "Form Away", "Home xG Scored", "Away xG Scored",
+    "Home xG Conceded", "Away xG Conceded", "Live Over 2.5 Odds"
+), FIXTURE_KEYS))
+
+
+def zip_probability(lam, k, p_zero=0.0):
+    return zero_inflated_poisson_probability(lam, k, p_zero)
+
+
+def pre_match_expected_goals(fixture):
+    """
+    PM_Goal's raw expected goals for each team. Returns (home, away).
+    """
+    f = fixture
+    adjusted_home_goals = ((f["avg_goals_home_scored"] + f["home_xg_scored"] +
+                            f["avg_goals_away_conceded"] + f["away_xg_conceded"]) / 4)
+    adjusted_home_goals *= (1 - 0.03 * f["injuries_home"])
+    adjusted_home_goals += f["form_home"] * 0.1 - f["position_home"] * 0.01
+
+    adjusted_away_goals = ((f["avg_goals_away_scored"] + f["away_xg_scored"] +
+                            f["avg_goals_home_conceded"] + f["home_xg_conceded"]) / 4)
+    adjusted_away_goals *= (1 - 0.03 * f["injuries_away"])
+    adjusted_away_goals += f["form_away"] * 0.1 - f["position_away"] * 0.01
+    return adjusted_home_goals, adjusted_away_goals
+
+
+def under_probability(lambda_home, lambda_away, line=2.5, goal_range=10, p_zero=0.0):
+    # Only scores with i + j <= line count, so neither pmf needs more terms than that
+    top = max(0, min(goal_range, int(line) + 1))
+    pmf_home = zip_pmf(lambda_home, top, p_zero)
+    pmf_away = zip_pmf(lambda_away, top, p_zero)
+    under_prob = 0.0
+    for i in range(top):
+        for j in range(top):
+            if (i + j) <= line:
+                under_prob += pmf_home[i] * pmf_away[j]
+    return under_prob
+
+
+def price_fixture(fixture, blend_factor=0.3):
+    """
+    PM_Goal's Over 2.5 price: model probability blended with the market.
+    """
+    home, away = pre_match_expected_goals(fixture)
+    under_prob_model = under_probability(home, away)
+    over_prob_model = 1 - under_prob_model
+
+    live_over_odds = fixture["live_over_odds"]
+    live_over_prob = 1 / live_over_odds if live_over_odds > 0 else 0
+    live_under_prob = 1 - live_over_prob
+
+    final_over_prob = over_prob_model * (1 - blend_factor) + live_over_prob * blend_factor
+    final_under_prob = under_prob_model * (1 - blend_factor) + live_under_prob * blend_factor
+    sum_final = final_over_prob + final_under_prob
+    if sum_final > 0:
+        final_over_prob /= sum_final
+        final_under_prob /= sum_final
+
+    return {
+        "lambda_home": home,
+        "lambda_away": away,
+        "over_prob_model": over_prob_model,
+        "over_prob": final_over_prob,
+        "fair_over": fair_odds(final_over_prob),
+    }
@@ -0,0 +1,501 @@
+"""
+Batched pricing kernels with interchangeable backends.
+
+The hot maths (ZIP pmf, score-grid accumulation, lambda multiplier chain and
+the lay/back staking branches) is exposed over columns of inputs so a whole
+card of matches is priced per call. Three backends implement the same API:
+
+    python  the scalar reference in pricing_core, one match at a time
+    numpy   vectorised over matches
+    numba   JIT-compiled loops (pricing_kernels_numba), cached on disk
+
+get_backend() picks numba, numpy or python, the first that is ready, unless
+ODDS_APEX_BACKEND or the caller names one. numba only counts as ready once
+the process has loaded it (preload_jit(), or naming it): importing numba and
+its cached machine code costs a cold process most of a second, which only
+long-running processes pricing many batches win back, so pricing_service
+preloads it and short-lived scripts stay on numpy.
+
+check_parity() compares a backend with the reference and check_backends()
+every available one; running this module as a script (or regression_harness
+check) exits non-zero if any differs.
+
+Kernels take dtype="float32" for compact batch pricing (see batch_pricing).
+The python backend ignores it and always computes in double precision.
+"""
+import os
+import random
+import sys
+
+import pricing_core
+from pricing_core import PROFILES, STATE_KEYS
+
+# Side codes returned by stakes()
+NO_BET = 0
+BACK = 1
+LAY = -1
+
+MARKETS = ("match_odds", "next_goal")
+
+
+class PythonKernels:
+    """
+    Reference backend: loops over pricing_core's scalar functions.
+    """
+    name = "python"
+
+    def zip_pmf(self, lams, max_goals=6, p_zero=0.06, dtype="float64"):
+        return [pricing_core.zip_pmf(lam, max_goals, p_zero) for lam in lams]
+
+    def outcome_probabilities(self, lambda_home, lambda_away, home_goals, away_goals, p_zero=0.06, max_goals=6,
+                              dtype="float64"):
+        home, draw, away = [], [], []
+        for lh, la, hg, ag in zip(lambda_home, lambda_away, home_goals, away_goals):
+            h, d, a = pricing_core.match_outcome_probabilities(lh, la, hg, ag, p_zero, max_goals)
+            home.append(h)
+            draw.append(d)
+            away.append(a)
+        return home, draw, away
+
+    def under_probabilities(self, lambda_home, lambda_away, line=2.5, max_goals=10, p_zero=0.0, dtype="float64"):
+        return [pricing_core.under_probability(lh, la, line, max_goals, p_zero)
+                for lh, la in zip(lambda_home, lambda_away)]
+
+    def lambda_chain(self, columns, profile="match_odds", dtype="float64"):
+        n = len(columns["elapsed_minutes"])
+        lambda_home, lambda_away = [], []
+        for i in range(n):
+            state = {key: columns[key][i] for key in STATE_KEYS if key in columns}
+            lh, la = pricing_core.compute_lambdas(pricing_core.new_state(**state), profile)
+            lambda_home.append(lh)
+            lambda_away.append(la)
+        return lambda_home, lambda_away
+
+    def stakes(self, fair, live, balance, kelly_fraction=0.25, market="match_odds"):
+        recommend = (pricing_core.next_goal_recommendation if market == "next_goal"
+                     else pricing_core.match_odds_recommendation)
+        out = {"side": [], "edge": [], "stake": [], "liability": [], "profit": []}
+        for f, odds, b in zip(fair, live, _broadcast(balance, len(fair))):
+            rec = recommend(f, odds, b, kelly_fraction)
+            side, stake, liability, profit = _normalise_recommendation(rec, odds)
+            out["side"].append(side)
+            out["edge"].append(rec["edge"])
+            out["stake"].append(stake)
+            out["liability"].append(liability)
+            out["profit"].append(profit)
+        return out
+
+
+def _broadcast(value, n):
+    if isinstance(value, (int, float)):
+        return [value] * n
+    return value
+
+
+def _normalise_recommendation(rec, live):
+    """
+    Map a pricing_core recommendation onto (side, stake, liability, profit):
+    for a lay the stake is the lay stake and profit what the backer loses,
+    for a back the liability is the stake itself.
+    """
+    if rec["side"] == "lay":
+        liability = rec["liability"]
+        stake = liability / (live - 1) if (live - 1) > 0 else 0
+        return LAY, stake, liability, stake
+    if rec["side"] == "back":
+        return BACK, rec["stake"], rec["stake"], rec["profit"]
+    return NO_BET, 0.0, 0.0, 0.0
+
+
+class NumpyKernels:
+    """
+    Vectorised backend: every kernel is a handful of array operations over matches.
+    """
+    name = "numpy"
+
+    def __init__(self):
+        import numpy
+        self.np = numpy
+        self._k = {}
+
+    def _goals(self, max_goals, dtype="float64"):
+        if (max_goals, dtype) not in self._k:
+            np = self.np
+            k = np.arange(max_goals, dtype=dtype)
+            log_fact = np.array(pricing_core.log_factorials(max_goals)[:max_goals], dtype=dtype)
+            goals = np.arange(max_goals, dtype=np.int16)
+            diff = goals[:, None] - goals[None, :]
+            self._k[max_goals, dtype] = (k, log_fact, diff)
+        return self._k[max_goals, dtype]
+
+    def zip_pmf(self, lams, max_goals=6, p_zero=0.06, dtype="float64"):
+        np = self.np
+        k, log_fact, _ = self._goals(max_goals, dtype)
+        lams = np.asarray(lams, dtype=dtype)
+        p_zero = lams.dtype.type(p_zero)
+        # exp(k log lam - lam - log k!): one exp per cell and no overflow for
+        # large k; lam = 0 is nudged to the smallest normal so log stays finite
+        log_lams = np.log(np.maximum(lams, np.finfo(lams.dtype).tiny))
+        pmf = (1 - p_zero) * np.exp(k * log_lams[:, None] - lams[:, None] - log_fact)
+        negative = lams < 0
+        if negative.any():
+            # PM_Goal's expected goals can go negative; keep the sign lam ** k gives
+            lam = lams[negative][:, None]
+            sign = np.where(k % 2 == 1, -1, 1).astype(lams.dtype)
+            pmf[negative] = sign * (1 - p_zero) * np.exp(k * np.log(-lam) - lam - log_fact)
+        pmf[:, 0] = p_zero + (1 - p_zero) * np.exp(-lams)
+        return pmf
+
+    def _score_grid(self, lambda_home, lambda_away, max_goals, p_zero, dtype):
+        # (n, max_goals, max_goals) joint pmf of remaining goals
+        return self.zip_pmf(lambda_home, max_goals, p_zero, dtype)[:, :, None] * \
+            self.zip_pmf(lambda_away, max_goals, p_zero, dtype)[:, None, :]
+
+    def under_probabilities(self, lambda_home, lambda_away, line=2.5, max_goals=10, p_zero=0.0, dtype="float64"):
+        np = self.np
+        k = np.arange(max_goals)
+        under = (k[:, None] + k[None, :]) <= line
+        grid = self._score_grid(lambda_home, lambda_away, max_goals, p_zero, dtype)
+        return np.where(under, grid, 0).sum(axis=(1, 2), dtype=dtype)
+
+    def outcome_probabilities(self, lambda_home, lambda_away, home_goals, away_goals, p_zero=0.06, max_goals=6,
+                              dtype="float64"):
+        np = self.np
+        _, _, diff = self._goals(max_goals, dtype)
+        grid = self._score_grid(lambda_home, lambda_away, max_goals, p_zero, dtype)
+        goal_diff = np.asarray(home_goals).astype(np.int16) - np.asarray(away_goals).astype(np.int16)
+        final_diff = goal_diff[:, None, None] + diff
+        home = np.where(final_diff > 0, grid, 0).sum(axis=(1, 2), dtype=dtype)
+        away = np.where(final_diff < 0, grid, 0).sum(axis=(1, 2), dtype=dtype)
+        draw = np.where(final_diff == 0, grid, 0).sum(axis=(1, 2), dtype=dtype)
+        total = home + draw + away
+        total = np.where(total > 0, total, 1.0)
+        return home / total, draw / total, away / total
+
+    def lambda_chain(self, columns, profile="match_odds", dtype="float64"):
+        np = self.np
+        variant = PROFILES[profile]["variant"]
+        n = len(columns["elapsed_minutes"])
+        c = {key: (np.asarray(columns[key], dtype=dtype) if key in columns else np.zeros(n, dtype=dtype))
+             for key in STATE_KEYS}
+        elapsed = c["elapsed_minutes"]
+        remaining = 90 - elapsed
+        ig_home = c["in_game_home_xg"]
+        ig_away = c["in_game_away_xg"]
+
+        if variant == "combined":
+            scale = np.maximum(0.0, remaining / 90.0)
+            base_home = c["home_xg"] * scale
+            base_away = c["away_xg"] * scale
+            decay = np.maximum(np.exp(-0.005 * elapsed), 0.4)
+            decay_home = decay_away = np.where(remaining < 10, decay * 0.75, decay)
+        else:
+            scale = 1.0
+            base_home = ig_home + (c["home_xg"] * remaining / 90)
+            base_away = ig_away + (c["away_xg"] * remaining / 90)
+            decay = np.maximum(np.exp(-0.01 * elapsed), 0.6)
+            late_decay = np.where(remaining < 10, decay * 0.65, decay)
+            decay_home = np.where(ig_home > 1.5, decay * 1.15, late_decay)
+            decay_away = np.where(ig_away > 1.5, decay * 1.15, late_decay)
+        lambda_home = np.maximum(0.1, base_home * decay_home)
+        lambda_away = np.maximum(0.1, base_away * decay_away)
+
+        mult_home, mult_away, late_home, late_away = _scoreline_multipliers(
+            np, c["home_goals"] - c["away_goals"], elapsed, variant, dtype)
+        lambda_home = lambda_home * mult_home * late_home
+        lambda_away = lambda_away * mult_away * late_away
+
+        pm_home = c["home_avg_goals_scored"] / np.maximum(0.75, c["away_avg_goals_conceded"])
+        pm_away = c["away_avg_goals_scored"] / np.maximum(0.75, c["home_avg_goals_conceded"])
+        lambda_home = (lambda_home * 0.85) + (pm_home * 0.15 * scale)
+        lambda_away = (lambda_away * 0.85) + (pm_away * 0.15 * scale)
+
+        lambda_home = lambda_home * (1 + ((c["home_possession"] - 50) / 200) * scale)
+        lambda_away = lambda_away * (1 + ((c["away_possession"] - 50) / 200) * scale)
+        lambda_home = np.where(ig_home > 1.2, lambda_home * (1 + 0.15 * scale), lambda_home)
+        lambda_away = np.where(ig_away > 1.2, lambda_away * (1 + 0.15 * scale), lambda_away)
+        lambda_home = lambda_home * (1 + (c["home_sot"] / 20) * scale)
+        lambda_away = lambda_away * (1 + (c["away_sot"] / 20) * scale)
+        lambda_home = lambda_home * (1 + ((c["home_op_box_touches"] - 20) / 200) * scale)
+        lambda_away = lambda_away * (1 + ((c["away_op_box_touches"] - 20) / 200) * scale)
+        lambda_home = lambda_home * (1 + ((c["home_corners"] - 4) / 50) * scale)
+        lambda_away = lambda_away * (1 + ((c["away_corners"] - 4) / 50) * scale)
+        return lambda_home, lambda_away
+
+    def stakes(self, fair, live, balance, kelly_fraction=0.25, market="match_odds"):
+        np = self.np
+        fair = np.asarray(fair, dtype=np.float64)
+        live = np.asarray(live, dtype=np.float64)
+        balance = np.asarray(balance, dtype=np.float64)
+        side = np.where(fair > live, LAY, np.where(fair < live, BACK, NO_BET))
+        if market == "next_goal":
+            side = np.where(live > 0, side, NO_BET)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            edge = np.where(side == NO_BET, 0.0, np.abs(fair - live) / fair)
+            amount = balance * np.fmax(0.0, kelly_fraction * edge)
+            lay_stake = np.where(live - 1 > 0, amount / (live - 1), 0.0)
+        lay = side == LAY
+        back = side == BACK
+        return {
+            "side": side,
+            "edge": edge,
+            "stake": np.where(lay, lay_stake, np.where(back, amount, 0.0)),
+            "liability": np.where(side == NO_BET, 0.0, amount),
+            "profit": np.where(lay, lay_stake, np.where(back, amount * (live - 1), 0.0)),
+        }
+
+
+def _scoreline_multipliers(np, goal_diff, elapsed, variant, dtype="float64"):
+    """
+    The scoreline adjustment as per-match multipliers: the goal difference
+    factor and the after-75-minutes factor, applied one after the other.
+    """
+    up = goal_diff > 0
+    led = np.abs(goal_diff) >= 1
+    late = (elapsed > 75) & led
+    if variant == "combined":
+        mult_home = np.select([goal_diff == 1, goal_diff == -1, np.abs(goal_diff) >= 2], [0.9, 1.2, 0.8], 1.0)
+        mult_away = np.select([goal_diff == 1, goal_diff == -1, np.abs(goal_diff) >= 2],
+                              [1.2, 0.9, np.where(up, 1.3, 0.8)], 1.0)
+        late_home = np.where(late, np.where(up, 0.85, 1.15), 1.0)
+    else:
+        mult_home = np.select([goal_diff == 1, goal_diff == -1, goal_diff == 0, np.abs(goal_diff) >= 2],
+                              [0.9, 1.2, 1.05, 0.8], 1.0)
+        mult_away = np.select([goal_diff == 1, goal_diff == -1, goal_diff == 0, np.abs(goal_diff) >= 2],
+                              [1.2, 0.9, 1.05, np.where(up, 1.3, 0.8)], 1.0)
+        late_home = np.where(late, 0.85, 1.0)
+    late_away = np.where(late, np.where(up, 1.15, 0.85), 1.0)
+    return tuple(np.asarray(m, dtype=dtype) for m in (mult_home, mult_away, late_home, late_away))
+
+
+class NumbaKernels(NumpyKernels):
+    """
+    JIT backend: the numpy API with the per-match loops compiled by numba.
+    Compiled code is cached next to pricing_kernels_numba so only the first
+    run on a machine pays for compilation.
+    """
+    name = "numba"
+
+    def __init__(self):
+        NumpyKernels.__init__(self)
+        import pricing_kernels_numba
+        self.jit = pricing_kernels_numba
+
+    def zip_pmf(self, lams, max_goals=6, p_zero=0.06, dtype="float64"):
+        return self.jit.zip_pmf(self.np.asarray(lams, dtype=dtype), max_goals, p_zero)
+
+    def outcome_probabilities(self, lambda_home, lambda_away, home_goals, away_goals, p_zero=0.06, max_goals=6,
+                              dtype="float64"):
+        np = self.np
+        return self.jit.outcome_probabilities(
+            np.asarray(lambda_home, dtype=dtype), np.asarray(lambda_away, dtype=dtype),
+            np.asarray(home_goals, dtype=np.int64) - np.asarray(away_goals, dtype=np.int64),
+            p_zero, max_goals)
+
+    def under_probabilities(self, lambda_home, lambda_away, line=2.5, max_goals=10, p_zero=0.0, dtype="float64"):
+        np = self.np
+        return self.jit.under_probabilities(np.asarray(lambda_home, dtype=dtype), np.asarray(lambda_away, dtype=dtype),
+                                            line, max_goals, p_zero)
+
+    def lambda_chain(self, columns, profile="match_odds", dtype="float64"):
+        np = self.np
+        n = len(columns["elapsed_minutes"])
+        args = [np.asarray(columns[key], dtype=dtype) if key in columns else np.zeros(n, dtype=dtype)
+                for key in self.jit.LAMBDA_INPUTS]
+        combined = PROFILES[profile]["variant"] == "combined"
+        return self.jit.lambda_chain(combined, *args)
+
+
+# name -> factory; factories raise ImportError when their dependency is missing
+BACKENDS = {
+    "numba": NumbaKernels,
+    "numpy": NumpyKernels,
+    "python": PythonKernels,
+}
+
+# Tried in order when no backend is named
+AUTO_BACKENDS = ("numba", "numpy", "python")
+# Skipped by the automatic choice until loaded, as loading them is slow
+PRELOAD_BACKENDS = ("numba",)
+
+_instances = {}
+
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+
+def available_backends():
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name=None):
+    """
+    Return a kernel backend by name, or the first one in AUTO_BACKENDS that
+    can be imported (and, for PRELOAD_BACKENDS, is loaded already).
+    ODDS_APEX_BACKEND overrides the automatic choice.
+    """
+    if name is None:
+        name = os.environ.get("ODDS_APEX_BACKEND") or None
+    if name is not None:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+    for candidate in AUTO_BACKENDS:
+        if candidate in PRELOAD_BACKENDS and candidate not in _instances:
+            continue
+        try:
+            return get_backend(candidate)
+        except ImportError:
+            continue
+    raise ImportError("no pricing kernel backend is available")
+
+
+def preload_jit():
+    """
+    Load the numba backend now so get_backend() picks it from here on; for
+    long-running processes. Returns False if numba is not installed.
+    """
+    try:
+        get_backend("numba")
+    except ImportError:
+        return False
+    return True
+
+
+# ----- Parity checks -----
+def random_columns(n, seed=0):
+    """
+    Seeded in-play inputs covering every branch of the lambda chain.
+    """
+    rng = random.Random(seed)
+    columns = {key: [] for key in STATE_KEYS}
+    for _ in range(n):
+        possession = rng.uniform(25, 75)
+        row = {
+            "home_avg_goals_scored": rng.uniform(0, 3),
+            "home_avg_goals_conceded": rng.uniform(0, 3),
+            "away_avg_goals_scored": rng.uniform(0, 3),
+            "away_avg_goals_conceded": rng.uniform(0, 3),
+            "home_xg": rng.uniform(0, 3),
+            "away_xg": rng.uniform(0, 3),
+            "elapsed_minutes": rng.uniform(0, 95),
+            "home_goals": rng.randint(0, 4),
+            "away_goals": rng.randint(0, 4),
+            "in_game_home_xg": rng.uniform(0, 3),
+            "in_game_away_xg": rng.uniform(0, 3),
+            "home_possession": possession,
+            "away_possession": 100 - possession,
+            "home_sot": rng.randint(0, 12),
+            "away_sot": rng.randint(0, 12),
+            "home_op_box_touches": rng.uniform(0, 50),
+            "away_op_box_touches": rng.uniform(0, 50),
+            "home_corners": rng.randint(0, 12),
+            "away_corners": rng.randint(0, 12),
+            "live_next_goal_odds": rng.choice((0.0, rng.uniform(1.01, 6))),
+            "live_odds_home": rng.uniform(1.01, 12),
+            "live_odds_draw": rng.uniform(1.01, 12),
+            "live_odds_away": rng.uniform(1.01, 12),
+            "account_balance": rng.uniform(0, 5000),
+        }
+        for key in STATE_KEYS:
+            columns[key].append(row[key])
+    return columns
+
+
+def _max_rel_error(expected, actual):
+    worst = 0.0
+    for e, a in zip(expected, actual):
+        e = float(e)
+        a = float(a)
+        if e == a:
+            continue
+        worst = max(worst, abs(e - a) / max(abs(e), 1e-300))
+    return worst
+
+
+def check_parity(backend, n=2000, seed=0, tolerance=1e-9):
+    """
+    Compare every kernel of a backend against the python reference.
+    Returns a dict of kernel -> max relative error; raises AssertionError
+    if any exceeds the tolerance.
+    """
+    if isinstance(backend, str):
+        backend = get_backend(backend)
+    reference = PythonKernels()
+    columns = random_columns(n, seed)
+    errors = {}
+    for profile in PROFILES:
+        ref_home, ref_away = reference.lambda_chain(columns, profile)
+        got_home, got_away = backend.lambda_chain(columns, profile)
+        errors["lambda_chain/" + profile] = max(_max_rel_error(ref_home, got_home),
+                                                _max_rel_error(ref_away, got_away))
+
+        p_zero = PROFILES[profile]["p_zero"]
+        ref_pmf = reference.zip_pmf(ref_home, 6, p_zero)
+        got_pmf = backend.zip_pmf(ref_home, 6, p_zero)
+        errors["zip_pmf/" + profile] = max(_max_rel_error(r, g) for r, g in zip(ref_pmf, got_pmf))
+
+        ref_probs = reference.outcome_probabilities(ref_home, ref_away, columns["home_goals"],
+                                                    columns["away_goals"], p_zero)
+        got_probs = backend.outcome_probabilities(ref_home, ref_away, columns["home_goals"],
+                                                  columns["away_goals"], p_zero)
+        errors["outcome_probabilities/" + profile] = max(_max_rel_error(r, g)
+                                                         for r, g in zip(ref_probs, got_probs))
+
+        errors["under_probabilities/" + profile] = _max_rel_error(
+            reference.under_probabilities(ref_home, ref_away), backend.under_probabilities(ref_home, ref_away))
+
+    fair = [1 / p for p in reference.outcome_probabilities(*reference.lambda_chain(columns),
+                                                           columns["home_goals"], columns["away_goals"])[0]]
+    for market, live_key in (("match_odds", "live_odds_home"), ("next_goal", "live_next_goal_odds")):
+        ref_stakes = reference.stakes(fair, columns[live_key], columns["account_balance"], market=market)
+        got_stakes = backend.stakes(fair, columns[live_key], columns["account_balance"], market=market)
+        errors["stakes/" + market] = max(_max_rel_error(ref_stakes[k], got_stakes[k]) for k in ref_stakes)
+
+    failed = {k: v for k, v in errors.items() if v > tolerance}
+    if failed:
+        # Raised explicitly so the check still runs under python -O
+        raise AssertionError("%s backend differs from reference: %r" % (backend.name, failed))
+    return errors
+
+
+def check_backends(n=2000, seed=0, tolerance=1e-9, report=None):
+    """
+    check_parity() for every backend that imports; returns the failures as
+    messages (empty if all agree). report, if given, is called with a line
+    per backend.
+    """
+    failures = []
+    for backend_name in BACKENDS:
+        try:
+            kernels = get_backend(backend_name)
+        except ImportError as exc:
+            if report is not None:
+                report(f"{backend_name}: unavailable ({exc})")
+            continue
+        try:
+            worst = max(check_parity(kernels, n, seed, tolerance).values())
+        except AssertionError as exc:
+            failures.append(str(exc))
+            continue
+        if report is not None:
+            report(f"{backend_name}: ok (max relative error {worst:.2e})")
+    return failures
+
+
+if __name__ == "__main__":
+    # Before the checks load numba, which would make it the default
+    default = get_backend().name
+    problems = check_backends(report=print)
+    for problem in problems:
+        print(problem)
+    print(f"default backend: {default}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,192 @@
+"""
+Numba-compiled loops behind pricing_kernels.NumbaKernels.
+
+Importing this module raises ImportError when numba is not installed. Every
+function is compiled with cache=True so the machine code is kept on disk
+(in __pycache__, or NUMBA_CACHE_DIR) and later processes start without
+recompiling.
+"""
+from math import lgamma
+
+import numpy as np
+from numba import njit
+
+# Column order of lambda_chain's array arguments
+LAMBDA_INPUTS = (
+    "elapsed_minutes", "home_goals", "away_goals",
+    "home_xg", "away_xg", "in_game_home_xg", "in_game_away_xg",
+    "home_avg_goals_scored", "home_avg_goals_conceded",
+    "away_avg_goals_scored", "away_avg_goals_conceded",
+    "home_possession", "away_possession", "home_sot", "away_sot",
+    "home_op_box_touches", "away_op_box_touches", "home_corners", "away_corners",
+)
+
+
+@njit(cache=True)
+def _log_factorials(max_goals):
+    table = np.empty(max_goals)
+    for k in range(max_goals):
+        table[k] = lgamma(k + 1.0)
+    return table
+
+
+@njit(cache=True)
+def _pmf_row(lam, max_goals, p_zero, log_fact, out):
+    exp_neg = np.exp(-lam)
+    out[0] = p_zero + (1 - p_zero) * exp_neg
+    if lam == 0:
+        out[1:] = 0
+        return
+    # Log space: no overflow of lam ** k or k! however large k gets
+    log_lam = np.log(abs(lam))
+    for k in range(1, max_goals):
+        p = (1 - p_zero) * np.exp(k * log_lam - lam - log_fact[k])
+        # PM_Goal's expected goals can go negative; keep the sign lam ** k gives
+        out[k] = -p if lam < 0 and k % 2 == 1 else p
+
+
+@njit(cache=True)
+def zip_pmf(lams, max_goals, p_zero):
+    out = np.empty((lams.shape[0], max_goals), dtype=lams.dtype)
+    log_fact = _log_factorials(max_goals)
+    for i in range(lams.shape[0]):
+        _pmf_row(lams[i], max_goals, p_zero, log_fact, out[i])
+    return out
+
+
+@njit(cache=True)
+def outcome_probabilities(lambda_home, lambda_away, goal_diff, p_zero, max_goals):
+    n = lambda_home.shape[0]
+    home = np.empty_like(lambda_home)
+    draw = np.empty_like(lambda_home)
+    away = np.empty_like(lambda_home)
+    pmf_home = np.empty(max_goals, dtype=lambda_home.dtype)
+    pmf_away = np.empty(max_goals, dtype=lambda_home.dtype)
+    log_fact = _log_factorials(max_goals)
+    for i in range(n):
+        _pmf_row(lambda_home[i], max_goals, p_zero, log_fact, pmf_home)
+        _pmf_row(lambda_away[i], max_goals, p_zero, log_fact, pmf_away)
+        h = 0.0
+        d = 0.0
+        a = 0.0
+        for gh in range(max_goals):
+            for ga in range(max_goals):
+                prob = pmf_home[gh] * pmf_away[ga]
+                final = goal_diff[i] + gh - ga
+                if final > 0:
+                    h += prob
+                elif final < 0:
+                    a += prob
+                else:
+                    d += prob
+        total = h + d + a
+        if total > 0:
+            h /= total
+            d /= total
+            a /= total
+        home[i] = h
+        draw[i] = d
+        away[i] = a
+    return home, draw, away
+
+
+@njit(cache=True)
+def under_probabilities(lambda_home, lambda_away, line, max_goals, p_zero):
+    n = lambda_home.shape[0]
+    under = np.empty_like(lambda_home)
+    pmf_home = np.empty(max_goals, dtype=lambda_home.dtype)
+    pmf_away = np.empty(max_goals, dtype=lambda_home.dtype)
+    log_fact = _log_factorials(max_goals)
+    for i in range(n):
+        _pmf_row(lambda_home[i], max_goals, p_zero, log_fact, pmf_home)
+        _pmf_row(lambda_away[i], max_goals, p_zero, log_fact, pmf_away)
+        total = 0.0
+        for gh in range(max_goals):
+            for ga in range(max_goals):
+                if gh + ga <= line:
+                    total += pmf_home[gh] * pmf_away[ga]
+        under[i] = total
+    return under
+
+
+@njit(cache=True)
+def _decay(lambda_xg, elapsed, in_game_xg, combined):
+    remaining = 90 - elapsed
+    if combined:
+        base_decay = max(np.exp(-0.005 * elapsed), 0.4)
+        if remaining < 10:
+            base_decay *= 0.75
+    else:
+        base_decay = max(np.exp(-0.01 * elapsed), 0.6)
+        if in_game_xg > 1.5:
+            base_decay *= 1.15
+        elif remaining < 10:
+            base_decay *= 0.65
+    return max(0.1, lambda_xg * base_decay)
+
+
+@njit(cache=True)
+def lambda_chain(combined, elapsed_minutes, home_goals, away_goals,
+                 home_xg, away_xg, in_game_home_xg, in_game_away_xg,
+                 home_avg_goals_scored, home_avg_goals_conceded,
+                 away_avg_goals_scored, away_avg_goals_conceded,
+                 home_possession, away_possession, home_sot, away_sot,
+                 home_op_box_touches, away_op_box_touches, home_corners, away_corners):
+    n = elapsed_minutes.shape[0]
+    out_home = np.empty_like(elapsed_minutes)
+    out_away = np.empty_like(elapsed_minutes)
+    for i in range(n):
+        elapsed = elapsed_minutes[i]
+        remaining = 90 - elapsed
+        ig_home = in_game_home_xg[i]
+        ig_away = in_game_away_xg[i]
+        if combined:
+            scale = max(0.0, remaining / 90.0)
+            base_home = home_xg[i] * scale
+            base_away = away_xg[i] * scale
+        else:
+            scale = 1.0
+            base_home = ig_home + (home_xg[i] * remaining / 90)
+            base_away = ig_away + (away_xg[i] * remaining / 90)
+        lh = _decay(base_home, elapsed, ig_home, combined)
+        la = _decay(base_away, elapsed, ig_away, combined)
+
+        goal_diff = home_goals[i] - away_goals[i]
+        if goal_diff == 1:
+            lh *= 0.9
+            la *= 1.2
+        elif goal_diff == -1:
+            lh *= 1.2
+            la *= 0.9
+        elif goal_diff == 0:
+            if not combined:
+                lh *= 1.05
+                la *= 1.05
+        else:
+            lh *= 0.8
+            la *= 1.3 if goal_diff > 0 else 0.8
+        if elapsed > 75 and abs(goal_diff) >= 1:
+            if goal_diff > 0:
+                lh *= 0.85
+                la *= 1.15
+            else:
+                lh *= 1.15 if combined else 0.85
+                la *= 0.85
+
+        lh = (lh * 0.85) + ((home_avg_goals_scored[i] / max(0.75, away_avg_goals_conceded[i])) * 0.15 * scale)
+        la = (la * 0.85) + ((away_avg_goals_scored[i] / max(0.75, home_avg_goals_conceded[i])) * 0.15 * scale)
+        lh *= 1 + ((home_possession[i] - 50) / 200) * scale
+        la *= 1 + ((away_possession[i] - 50) / 200) * scale
+        if ig_home > 1.2:
+            lh *= (1 + 0.15 * scale)
+        if ig_away > 1.2:
+            la *= (1 + 0.15 * scale)
+        lh *= 1 + (home_sot[i] / 20) * scale
+        la *= 1 + (away_sot[i] / 20) * scale
+        lh *= 1 + ((home_op_box_touches[i] - 20) / 200) * scale
+        la *= 1 + ((away_op_box_touches[i] - 20) / 200) * scale
+        lh *= 1 + ((home_corners[i] - 4) / 50) * scale
+        la *= 1 + ((away_corners[i] - 4) / 50) * scale
+        out_home[i] = lh
+        out_away[i] = la
+    return out_home, out_away
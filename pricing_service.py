@@ -0,0 +1,382 @@
+"""
+Local HTTP/JSON pricing service.
+
+Endpoints (POST a JSON object, get a JSON object back):
+
+    /next-goal    in-play state (pricing_core.STATE_KEYS)  -> next goal price and recommendation
+    /match-odds   in-play state                            -> 1X2 fair odds and recommendations
+    /over-under   pre-match fixture (pricing_core.FIXTURE_KEYS) -> Over 2.5 price
+                  with its "league"'s learned blend weight (blend_weights.py)
+    GET /metrics  per-endpoint request counts, batch sizes and latency percentiles
+
+/next-goal and /match-odds take ?profile= to pick the app whose model is used
+(next_goal, match_odds or combined). Requests arriving together are coalesced
+into one vectorised batch_pricing call per endpoint: a batch is flushed when
+it reaches max_batch requests or when its oldest request has waited
+max_delay_ms. Connections are HTTP/1.1 keep-alive. Responses are strict
+JSON: infinite fair odds (a zero probability) and undefined edges are null.
+
+    python pricing_service.py [--host 127.0.0.1] [--port 8765] [--max-delay-ms 2] [--max-batch 256]
+                              [--blend-weights blend_weights.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from batch_pricing import price_fixtures, price_states
+from blend_weights import WeightsFile
+from pricing_core import FIXTURE_INT_KEYS, FIXTURE_KEYS, PROFILES, STATE_KEYS, new_state
+from pricing_kernels import BACK, LAY, get_backend, preload_jit
+
+SIDES = {BACK: "back", LAY: "lay"}
+MAX_GOALS = 99  # per side, in a request
+
+
+def _columns(rows, keys):
+    return {key: [row[key] for row in rows] for key in keys}
+
+
+def _recommendations(kernels, fair, live, balance, kelly, market):
+    stakes = kernels.stakes(fair, live, balance, kelly, market)
+    out = []
+    for i in range(len(fair)):
+        side = SIDES.get(int(stakes["side"][i]))
+        rec = {"side": side, "edge": float(stakes["edge"][i])}
+        if side is not None:
+            rec.update(stake=float(stakes["stake"][i]), liability=float(stakes["liability"][i]),
+                       profit=float(stakes["profit"][i]))
+        out.append(rec)
+    return out
+
+
+def price_next_goal(states, profile="next_goal"):
+    kernels = get_backend()
+    columns = _columns([new_state(**s) for s in states], STATE_KEYS)
+    prices = price_states(columns, profile, backend=kernels)
+    recs = _recommendations(kernels, prices["fair_next_goal"], columns["live_next_goal_odds"],
+                            columns["account_balance"], PROFILES[profile]["kelly"], "next_goal")
+    return [{
+        "lambda_home": float(prices["lambda_home"][i]),
+        "lambda_away": float(prices["lambda_away"][i]),
+        "goal_probability": float(prices["goal_probability"][i]),
+        "fair_next_goal": float(prices["fair_next_goal"][i]),
+        "next_goal": recs[i],
+    } for i in range(len(states))]
+
+
+def price_match_odds(states, profile="match_odds"):
+    kernels = get_backend()
+    columns = _columns([new_state(**s) for s in states], STATE_KEYS)
+    prices = price_states(columns, profile, backend=kernels)
+    recs = {outcome: _recommendations(kernels, prices["fair_" + outcome], columns["live_odds_" + outcome],
+                                      columns["account_balance"], PROFILES[profile]["kelly"], "match_odds")
+            for outcome in ("home", "draw", "away")}
+    results = []
+    for i in range(len(states)):
+        result = {key: float(prices[key][i]) for key in ("lambda_home", "lambda_away", "prob_home", "prob_draw",
+                                                         "prob_away", "fair_home", "fair_draw", "fair_away")}
+        for outcome in ("home", "draw", "away"):
+            result[outcome] = recs[outcome][i]
+        results.append(result)
+    return results
+
+
+def price_over_under(fixtures, weights):
+    """
+    weights is a blend_weights.BlendWeights; each fixture is blended with the
+    weight of its optional "league" field.
+    """
+    factors = weights.blend_factors([fixture.get("league") for fixture in fixtures])
+    prices = price_fixtures(_columns(fixtures, FIXTURE_KEYS), factors)
+    return [{key: float(values[i]) for key, values in prices.items()} for i in range(len(fixtures))]
+
+
+def check_item(path, item):
+    """
+    Reject a request body before it joins a batch, so one bad request cannot
+    fail the others: every input must be a finite number, goals and the
+    fixture counts whole numbers, and goals within 0..MAX_GOALS.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("expected a JSON object")
+    keys = FIXTURE_KEYS if path == "/over-under" else STATE_KEYS
+    if path == "/over-under":
+        missing = [key for key in keys if key not in item]
+        if missing:
+            raise ValueError("missing fixture fields: " + ", ".join(missing))
+        if not isinstance(item.get("league", ""), str):
+            raise ValueError("league must be a string")
+    for key in keys:
+        value = item.get(key, 0)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{key} must be a number")
+        try:
+            finite = math.isfinite(value)
+        except OverflowError:
+            finite = False
+        if not finite:
+            raise ValueError(f"{key} must be a finite number")
+    if path == "/over-under":
+        for key in FIXTURE_INT_KEYS:
+            if item[key] != int(item[key]):
+                raise ValueError(f"{key} must be a whole number")
+    else:
+        # The kernels do goal arithmetic in int16
+        for key in ("home_goals", "away_goals"):
+            value = item.get(key, 0)
+            if value != int(value) or not 0 <= value <= MAX_GOALS:
+                raise ValueError(f"{key} must be a whole number from 0 to {MAX_GOALS}")
+
+
+class LatencyStats:
+    """
+    Request count, batch sizes and a window of recent latencies for one endpoint.
+    """
+
+    def __init__(self, window=10000):
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.requests += 1
+        self.latencies.append(seconds)
+
+    def snapshot(self):
+        ordered = sorted(self.latencies)
+
+        def pct(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "latency_ms": {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99),
+                           "max": ordered[-1] * 1000 if ordered else 0.0},
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests for one pricing function into batches.
+
+    submit() queues an item and waits for its result. A collector task takes
+    the first waiting item, keeps gathering until max_batch items or
+    max_delay seconds after that first item, then prices the batch in a worker
+    thread so the event loop keeps accepting requests meanwhile. Items are
+    grouped by key (e.g. the profile) and each group is priced in one call.
+    """
+
+    def __init__(self, price, stats, max_batch=256, max_delay=0.002):
+        self.price = price
+        self.stats = stats
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def submit(self, key, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((key, item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            groups = {}
+            for key, item, future in batch:
+                groups.setdefault(key, []).append((item, future))
+            for key, entries in groups.items():
+                self.stats.batches += 1
+                self.stats.batched_requests += len(entries)
+                try:
+                    results = await loop.run_in_executor(None, self.price, key, [item for item, _ in entries])
+                except Exception as exc:
+                    for _, future in entries:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                for (_, future), result in zip(entries, results):
+                    if not future.done():
+                        future.set_result(result)
+
+    def close(self):
+        self.task.cancel()
+
+
+class PricingService:
+    def __init__(self, max_batch=256, max_delay_ms=2.0, weights_path=None):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        # Re-read when `blend_weights.py settle` rewrites it
+        self.weights = WeightsFile(weights_path)
+        self.stats = {path: LatencyStats() for path in ("/next-goal", "/match-odds", "/over-under")}
+        self.batchers = {}
+        self.server = None
+        self._connections = set()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        routes = {
+            "/next-goal": lambda profile, items: price_next_goal(items, profile or "next_goal"),
+            "/match-odds": lambda profile, items: price_match_odds(items, profile or "match_odds"),
+            "/over-under": lambda _, items: price_over_under(items, self.weights.get()),
+        }
+        self.batchers = {path: MicroBatcher(price, self.stats[path], self.max_batch, self.max_delay)
+                         for path, price in routes.items()}
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        for batcher in self.batchers.values():
+            batcher.close()
+        if self.server is not None:
+            self.server.close()
+            # Idle keep-alive connections see EOF and their handlers return
+            for writer in list(self._connections):
+                writer.close()
+            await self.server.wait_closed()
+            while self._connections:
+                await asyncio.sleep(0.001)
+
+    def metrics(self):
+        return {path: stats.snapshot() for path, stats in self.stats.items()}
+
+    async def _handle(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._dispatch(method, target, body)
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError:
+            _write_response(writer, 400, {"error": "malformed request"}, False)
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/metrics" and method == "GET":
+            return 200, self.metrics()
+        batcher = self.batchers.get(url.path)
+        if batcher is None:
+            return 404, {"error": "unknown endpoint " + url.path}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        stats = self.stats[url.path]
+        start = time.perf_counter()
+        profile = parse_qs(url.query).get("profile", [None])[0]
+        if profile is not None and profile not in PROFILES:
+            stats.errors += 1
+            return 400, {"error": "unknown profile " + profile}
+        try:
+            item = json.loads(body or b"{}")
+            check_item(url.path, item)
+            result = await batcher.submit(profile, item)
+        except (ValueError, KeyError, TypeError) as exc:
+            stats.errors += 1
+            return 400, {"error": str(exc)}
+        stats.record(time.perf_counter() - start)
+        return 200, result
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ValueError("bad request line")
+    method, target, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def _finite(value):
+    """
+    value with every infinite or nan float (e.g. fair odds of a zero
+    probability) replaced by None, which JSON can carry.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(_finite(payload), allow_nan=False).encode()
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode() + body)
+
+
+async def serve(host="127.0.0.1", port=8765, max_batch=256, max_delay_ms=2.0, weights_path=None):
+    # A service runs long enough to win back loading the JIT kernels
+    preload_jit()
+    service = PricingService(max_batch, max_delay_ms, weights_path)
+    address = await service.start(host, port)
+    print(f"pricing service on http://{address[0]}:{address[1]} (backend: {get_backend().name})")
+    try:
+        await service.server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP pricing service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    parser.add_argument("--blend-weights", help="learned blend weights file (default blend_weights.WEIGHTS_PATH)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_delay_ms, args.blend_weights))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,353 @@
+"""
+Golden-output regression harness with performance gates.
+
+Runs every model headlessly over a seeded grid of inputs: the three in-play
+apps (their own calculate methods, driven through stand-in tk variables and
+widgets, so the rendered text is checked too), the pricing_core profiles they
+correspond to and PM_Goal's Over 2.5 price. The outputs are stored as a
+golden file. A later check re-runs the grid, diffs every number against the
+golden values within tolerance and times each model against the stored
+baseline. check also runs pricing_kernels.check_backends(), so a kernel
+backend that drifts from the python reference fails it too.
+
+    python regression_harness.py record [golden]   # write outputs and timings
+    python regression_harness.py check [golden]    # exit 1 on any difference or slowdown
+
+check takes --no-perf to compare outputs only and --max-regression=0.25 to
+set the allowed slowdown.
+
+The timings are only meaningful on the machine that recorded them; after
+moving machines, run `record --perf-only` to refresh the baseline without
+touching the golden outputs.
+"""
+import gc
+import gzip
+import itertools
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+from batch_pricing import random_fixtures
+from bet_ledger import BetLedger
+from match_timeseries import MatchTimeSeries
+from pricing_core import FIELD_KEYS, FIXTURE_KEYS, STATE_KEYS, price_fixture, price_state
+from pricing_kernels import check_backends, random_columns
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "regression.json.gz")
+FORMAT = 1
+
+# --- inputs ---
+
+
+def edge_states():
+    """
+    Hand-picked corners of the in-play models: clock near the decay and
+    scoreline thresholds, big leads, xG either side of the boosts, no live price.
+    """
+    states = []
+    for elapsed, (hg, ag), xg, live in itertools.product(
+            (0.0, 44.5, 60.0, 75.0, 80.0, 85.0, 89.9, 90.0, 95.0),
+            ((0, 0), (1, 0), (0, 1), (2, 0), (0, 2), (3, 1), (1, 4)),
+            (0.0, 1.25, 1.6),
+            (0.0, 2.5)):
+        state = dict.fromkeys(STATE_KEYS, 0.0)
+        state.update(home_avg_goals_scored=1.5, home_avg_goals_conceded=1.1, away_avg_goals_scored=1.2,
+                     away_avg_goals_conceded=1.4, home_xg=1.6, away_xg=1.1, elapsed_minutes=elapsed,
+                     home_goals=hg, away_goals=ag, in_game_home_xg=xg, in_game_away_xg=xg / 2,
+                     home_possession=55.0, away_possession=45.0, home_sot=4, away_sot=2,
+                     home_op_box_touches=20.0, away_op_box_touches=12.0, home_corners=5, away_corners=3,
+                     live_next_goal_odds=live, live_odds_home=live or 2.1, live_odds_draw=3.4,
+                     live_odds_away=live * 1.6 or 4.0, account_balance=1000.0)
+        states.append(state)
+    return states
+
+
+def grid(n=500, seed=0):
+    """
+    (states, fixtures): edge_states() plus n seeded random states, and n seeded fixtures.
+    """
+    columns = random_columns(n, seed)
+    states = edge_states() + [{key: values[i] for key, values in columns.items()} for i in range(n)]
+    fixtures = random_fixtures(n, seed)
+    fixtures = [{key: fixtures[key][i] for key in FIXTURE_KEYS} for i in range(n)]
+    return states, fixtures
+
+
+# --- headless app drivers ---
+
+
+class _Var:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _Widget:
+    """
+    Records what an app writes to a label or text box.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def config(self, text=None, foreground=None, **_):
+        if text is not None:
+            self.parts.append("%s|%s" % (foreground or "", text))
+
+    def insert(self, _index, text, tag=None):
+        self.parts.append("%s|%s" % (tag or "", text))
+
+    def delete(self, *_):
+        self.parts = []
+
+
+def app_runner(module_name, class_name, method, outputs):
+    """
+    A function pricing one state through an app's own calculate method and
+    returning the text it rendered.
+    """
+    import importlib
+    cls = getattr(importlib.import_module(module_name), class_name)
+    labels = {key: label for label, key in FIELD_KEYS.items()}
+
+    def run(state):
+        app = object.__new__(cls)
+        app.fields = {labels[key]: _Var(value) for key, value in state.items() if key in labels}
+        app.ledger = BetLedger()
+        app.series = MatchTimeSeries()
+        widgets = [_Widget() for _ in outputs]
+        for name, widget in zip(outputs, widgets):
+            setattr(app, name, widget)
+        getattr(app, method)()
+        return "".join(part for widget in widgets for part in widget.parts)
+
+    return run
+
+
+APPS = {
+    "app:IP_Goal": ("IP_Goal", "FootballBettingModel", "calculate_fair_odds", ("next_goal_label", "timing_label")),
+    "app:IP_Match": ("IP_Match", "FootballBettingModel", "calculate_fair_odds", ("recommendation_text",)),
+    "app:combined": ("combined", "CombinedFootballBettingModel", "calculate_all", ("output_text",)),
+}
+
+
+def _flatten(prices, prefix=""):
+    flat = {}
+    for key, value in prices.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + "."))
+        elif isinstance(value, (list, tuple)):
+            for i, item in enumerate(value):
+                flat["%s%s.%d" % (prefix, key, i)] = item
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def models():
+    """
+    name -> (function of one input, which input list it takes).
+    """
+    table = {}
+    for profile in ("next_goal", "match_odds", "combined"):
+        table["core:" + profile] = ((lambda state, profile=profile: _flatten(price_state(state, profile))), "states")
+    table["core:over_2.5"] = ((lambda fixture: _flatten(price_fixture(fixture))), "fixtures")
+    for name, spec in APPS.items():
+        run = app_runner(*spec)
+        table[name] = ((lambda state, run=run: {"text": run(state)}), "states")
+    return table
+
+
+# --- running ---
+
+
+def run_outputs(table, inputs):
+    """
+    Columnar outputs: {model: {field: [value per input]}}.
+    """
+    outputs = {}
+    for name, (fn, kind) in table.items():
+        columns = {}
+        for i, item in enumerate(inputs[kind]):
+            for field, value in fn(item).items():
+                columns.setdefault(field, [None] * len(inputs[kind]))[i] = value
+        outputs[name] = columns
+    return outputs
+
+
+def run_perf(table, inputs, repeats=5):
+    """
+    Per model: best-of-repeats throughput and the median per-call p50/p99
+    latency, after one warm-up pass and with the garbage collector paused.
+    """
+    perf = {}
+    for name, (fn, kind) in table.items():
+        items = inputs[kind]
+        for item in items:
+            fn(item)
+        rates, p50s, p99s = [], [], []
+        gc.collect()
+        gc.disable()
+        for _ in range(repeats):
+            latencies = []
+            clock = time.perf_counter
+            start = clock()
+            for item in items:
+                t = clock()
+                fn(item)
+                latencies.append(clock() - t)
+            elapsed = clock() - start
+            latencies.sort()
+            rates.append(len(items) / elapsed)
+            p50s.append(latencies[len(latencies) // 2])
+            p99s.append(latencies[int(0.99 * (len(latencies) - 1))])
+        gc.enable()
+        perf[name] = {
+            "per_second": max(rates),
+            "p50_us": sorted(p50s)[repeats // 2] * 1e6,
+            "p99_us": sorted(p99s)[repeats // 2] * 1e6,
+        }
+    return perf
+
+
+def _same(a, b, rel_tol, abs_tol):
+    if isinstance(a, str) or isinstance(b, str) or a is None or b is None:
+        return a == b
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    if math.isinf(a) or math.isinf(b):
+        return a == b
+    return math.isclose(a, b, rel_tol=rel_tol, abs_tol=abs_tol)
+
+
+def diff_outputs(golden, outputs, rel_tol=1e-9, abs_tol=1e-12, limit=20):
+    """
+    Differences between two output sets, as readable strings (at most `limit` per field).
+    """
+    problems = []
+    for name, columns in golden.items():
+        got = outputs.get(name)
+        if got is None:
+            problems.append("%s: model missing" % name)
+            continue
+        for field, expected in columns.items():
+            values = got.get(field)
+            if values is None:
+                problems.append("%s.%s: field missing" % (name, field))
+                continue
+            bad = [i for i, (a, b) in enumerate(zip(expected, values)) if not _same(a, b, rel_tol, abs_tol)]
+            for i in bad[:limit]:
+                problems.append("%s.%s[%d]: golden %r, now %r" % (name, field, i, expected[i], values[i]))
+            if len(bad) > limit:
+                problems.append("%s.%s: %d more differences" % (name, field, len(bad) - limit))
+        for field in set(got) - set(columns):
+            problems.append("%s.%s: new field not in golden" % (name, field))
+    return problems
+
+
+def diff_perf(baseline, perf, max_regression=0.25):
+    """
+    Models whose throughput fell, or whose p99 latency rose, by more than max_regression.
+    """
+    problems = []
+    for name, base in baseline.items():
+        now = perf.get(name)
+        if now is None:
+            continue
+        if now["per_second"] < base["per_second"] * (1 - max_regression):
+            problems.append("%s: throughput %.0f/s, baseline %.0f/s" % (name, now["per_second"], base["per_second"]))
+        if now["p99_us"] > base["p99_us"] * (1 + max_regression):
+            problems.append("%s: p99 %.1f us, baseline %.1f us" % (name, now["p99_us"], base["p99_us"]))
+    return problems
+
+
+# --- golden files ---
+
+
+def load(path=GOLDEN_PATH):
+    with gzip.open(path, "rt") as f:
+        return json.load(f)
+
+
+def save(golden, path=GOLDEN_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # mtime=0 keeps the file byte-identical when nothing changed
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+        f.write(json.dumps(golden, sort_keys=True, separators=(",", ":")).encode())
+
+
+def record(path=GOLDEN_PATH, n=500, seed=0, perf_only=False):
+    table = models()
+    if perf_only:
+        golden = load(path)
+        states, fixtures = grid(golden["n"], golden["seed"])
+    else:
+        states, fixtures = grid(n, seed)
+        golden = {"format": FORMAT, "n": n, "seed": seed, "outputs": run_outputs(table, {"states": states,
+                                                                                      "fixtures": fixtures})}
+    golden["perf"] = run_perf(table, {"states": states, "fixtures": fixtures})
+    golden["machine"] = {"python": platform.python_version(), "platform": platform.platform()}
+    save(golden, path)
+    return golden
+
+
+def check(path=GOLDEN_PATH, rel_tol=1e-9, abs_tol=1e-12, max_regression=0.25, perf=True, attempts=3):
+    """
+    Re-run the golden grid; returns (output differences and backend parity
+    failures, performance regressions).
+    """
+    golden = load(path)
+    if golden.get("format") != FORMAT:
+        raise ValueError("golden file %s has format %r, expected %d" % (path, golden.get("format"), FORMAT))
+    table = models()
+    states, fixtures = grid(golden["n"], golden["seed"])
+    inputs = {"states": states, "fixtures": fixtures}
+    problems = diff_outputs(golden["outputs"], run_outputs(table, inputs), rel_tol, abs_tol)
+    slow = []
+    if perf:
+        # A shared machine can stall any one run; a model only fails if it is
+        # slow on every attempt, judged on its best figures across attempts
+        best = {}
+        for _ in range(attempts):
+            for name, stats in run_perf(table, inputs).items():
+                kept = best.setdefault(name, stats)
+                kept["per_second"] = max(kept["per_second"], stats["per_second"])
+                kept["p50_us"] = min(kept["p50_us"], stats["p50_us"])
+                kept["p99_us"] = min(kept["p99_us"], stats["p99_us"])
+            slow = diff_perf(golden["perf"], best, max_regression)
+            if not slow:
+                break
+    # Last, as loading the numba backend makes it the automatic choice from then on
+    problems += check_backends()
+    return problems, slow
+
+
+def main(argv):
+    args = [a for a in argv if not a.startswith("--")]
+    flags = dict((a.split("=", 1) + [""])[:2] for a in argv if a.startswith("--"))
+    command = args[0] if args else "check"
+    path = args[1] if len(args) > 1 else GOLDEN_PATH
+    if command == "record":
+        golden = record(path, perf_only="--perf-only" in flags)
+        for name, stats in golden["perf"].items():
+            print("%-18s %10.0f/s  p50 %7.1f us  p99 %7.1f us" % (name, stats["per_second"], stats["p50_us"],
+                                                                 stats["p99_us"]))
+        print("recorded", path)
+        return 0
+    problems, slow = check(path, perf="--no-perf" not in flags,
+                           max_regression=float(flags.get("--max-regression") or 0.25))
+    for line in problems + slow:
+        print(line)
+    print("%d output differences, %d performance regressions" % (len(problems), len(slow)))
+    return 1 if problems or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
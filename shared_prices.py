@@ -0,0 +1,225 @@
+"""
+Shared-memory price table: one writer, many reader processes.
+
+The pricing engine publishes each match's outputs into a fixed-size record in
+a multiprocessing.shared_memory segment; consumers (execution, risk,
+dashboards) attach by name and read without any serialisation or IPC.
+
+Layout (little-endian):
+
+    header   64 bytes: magic, version, capacity, record size
+    records  capacity x RECORD.size bytes, one slot per match
+
+Every record starts with a sequence counter used as a seqlock. The writer
+makes it odd, writes the payload, then makes it even again; a reader copies
+the record and accepts it only if the counter was even and unchanged across
+the copy, retrying otherwise. Readers never block the writer. The scheme
+relies on the writer's stores becoming visible in program order, which x86
+guarantees; on weakly ordered CPUs a reader could rarely accept a mixed record.
+"""
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from pricing_core import OVER_LINES
+
+MAGIC = b"OAPRICE1"
+VERSION = 1
+HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+MATCH_ID_SIZE = 32
+
+# Segments created by this process, which its own readers must not unregister
+_OWNED = set()
+
+SIDE_CODES = {None: 0, "back": 1, "lay": -1}
+SIDE_NAMES = {code: side for side, code in SIDE_CODES.items()}
+
+# Price fields after the sequence counter, match id and publish time
+PRICE_FIELDS = (
+    "lambda_home", "lambda_away", "goal_probability", "fair_next_goal",
+    "fair_home", "fair_draw", "fair_away",
+) + tuple("over_%g" % line for line in OVER_LINES) + (
+    "stake_next_goal", "stake_home", "stake_draw", "stake_away",
+)
+MARKETS = ("next_goal", "home", "draw", "away")
+
+RECORD = struct.Struct("<Q%dsd%dd4b4x" % (MATCH_ID_SIZE, len(PRICE_FIELDS)))
+SEQ = struct.Struct("<Q")
+PAYLOAD = struct.Struct("<%dsd%dd4b4x" % (MATCH_ID_SIZE, len(PRICE_FIELDS)))
+
+
+class TornRead(Exception):
+    """
+    A record stayed mid-write for the whole read timeout (e.g. the writer died).
+    """
+
+
+def _record_values(match_id, prices, published):
+    values = [match_id, published,
+              prices["lambda_home"], prices["lambda_away"], prices["goal_probability"],
+              prices["fair_next_goal"], prices["fair_home"], prices["fair_draw"], prices["fair_away"]]
+    values.extend(prices.get("over", (0.0,) * len(OVER_LINES)))
+    for market in MARKETS:
+        rec = prices.get(market) or {}
+        values.append(rec.get("liability", 0.0) if rec.get("side") == "lay" else rec.get("stake", 0.0))
+    for market in MARKETS:
+        values.append(SIDE_CODES[(prices.get(market) or {}).get("side")])
+    return values
+
+
+def _decode(values):
+    match_id = values[0].rstrip(b"\0").decode()
+    record = {"match_id": match_id, "published": values[1]}
+    record.update(zip(PRICE_FIELDS, values[2:2 + len(PRICE_FIELDS)]))
+    for market, code in zip(MARKETS, values[2 + len(PRICE_FIELDS):]):
+        record["side_" + market] = SIDE_NAMES[code]
+    return record
+
+
+class SharedPriceTable:
+    """
+    Writer side: owns the segment and assigns one slot per match.
+    """
+
+    def __init__(self, name=None, capacity=1024):
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + capacity * RECORD.size)
+        self.name = self.shm.name
+        _OWNED.add(self.name)
+        self.buf = self.shm.buf
+        self.buf[:HEADER_SIZE + capacity * RECORD.size] = bytes(HEADER_SIZE + capacity * RECORD.size)
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, capacity, RECORD.size)
+        self.slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._seq = [0] * capacity
+
+    def publish(self, match_id, prices, published=None):
+        """
+        Write one match's prices (a pricing_core.price_state dict) into its slot.
+        """
+        # Build the record first, so a rejected id or price dict never takes a slot
+        key = match_id.encode()
+        if len(key) > MATCH_ID_SIZE:
+            raise ValueError("match id longer than %d bytes: %r" % (MATCH_ID_SIZE, match_id))
+        values = _record_values(key, prices, time.time() if published is None else published)
+        slot = self.slots.get(match_id)
+        if slot is None:
+            if not self._free:
+                raise RuntimeError("shared price table is full (%d matches)" % self.capacity)
+            slot = self.slots[match_id] = self._free.pop()
+        self._write(slot, values)
+
+    def remove(self, match_id):
+        slot = self.slots.pop(match_id, None)
+        if slot is None:
+            return
+        self._write(slot, [b"", 0.0] + [0.0] * len(PRICE_FIELDS) + [0] * len(MARKETS))
+        self._free.append(slot)
+
+    def _write(self, slot, values):
+        offset = HEADER_SIZE + slot * RECORD.size
+        seq = self._seq[slot] + 1
+        SEQ.pack_into(self.buf, offset, seq)                 # odd: write in progress
+        PAYLOAD.pack_into(self.buf, offset + SEQ.size, *values)
+        self._seq[slot] = seq + 1
+        SEQ.pack_into(self.buf, offset, seq + 1)             # even: consistent
+
+    def close(self, unlink=True):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _OWNED.discard(self.name)
+
+
+class SharedPriceReader:
+    """
+    Reader side: attaches to a published table by name.
+
+    Match slots are found by scanning record ids; the slot map is cached and
+    rescanned only when a match is not where it was last seen.
+    """
+
+    def __init__(self, name, timeout=0.1):
+        self.shm = shared_memory.SharedMemory(name=name)
+        if self.shm.name not in _OWNED:
+            # Only the writer should unlink the segment when its process exits
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.buf = self.shm.buf
+        magic, version, self.capacity, record_size = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError("%s is not a compatible shared price table" % name)
+        self.timeout = timeout
+        self.slots = {}
+        self.torn_retries = 0
+
+    def _read_slot(self, slot):
+        offset = HEADER_SIZE + slot * RECORD.size
+        deadline = None
+        spins = 0
+        while True:
+            values = RECORD.unpack_from(self.buf, offset)
+            if values[0] & 1 == 0 and SEQ.unpack_from(self.buf, offset)[0] == values[0]:
+                return values[0], values[1:]
+            self.torn_retries += 1
+            spins += 1
+            if spins > 64:
+                # The writer was descheduled mid-record; stop spinning and yield
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                elif now > deadline:
+                    raise TornRead("slot %d stayed mid-write for %.3fs" % (slot, self.timeout))
+                time.sleep(0)
+
+    def _scan(self):
+        self.slots = {}
+        for slot in range(self.capacity):
+            seq, values = self._read_slot(slot)
+            if seq and values[0].rstrip(b"\0"):
+                self.slots[values[0].rstrip(b"\0").decode()] = slot
+
+    def read(self, match_id):
+        """
+        Latest consistent record for a match, or None if it is not published.
+        """
+        for attempt in range(2):
+            slot = self.slots.get(match_id)
+            if slot is not None:
+                seq, values = self._read_slot(slot)
+                if values[0].rstrip(b"\0").decode() == match_id:
+                    record = _decode(values)
+                    record["seq"] = seq
+                    return record
+            if attempt == 0:
+                self._scan()
+        return None
+
+    def read_all(self):
+        self._scan()
+        records = {}
+        for match_id, slot in self.slots.items():
+            seq, values = self._read_slot(slot)
+            if values[0].rstrip(b"\0"):
+                record = _decode(values)
+                record["seq"] = seq
+                records[record["match_id"]] = record
+        return records
+
+    def as_array(self):
+        """
+        Zero-copy numpy structured view of every slot (numpy required). The
+        view is not seqlock-checked, so use read() where consistency matters,
+        and drop the view before close().
+        """
+        import numpy as np
+        fields = [("seq", "<u8"), ("match_id", "S%d" % MATCH_ID_SIZE), ("published", "<f8")]
+        fields += [(name, "<f8") for name in PRICE_FIELDS]
+        fields += [("side_" + market, "i1") for market in MARKETS] + [("pad", "V4")]
+        dtype = np.dtype(fields)
+        return np.ndarray((self.capacity,), dtype=dtype, buffer=self.buf, offset=HEADER_SIZE)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
@@ -0,0 +1,201 @@
+"""
+Priority scheduler in front of a LivePricingEngine.
+
+Feed handlers submit() match updates as they arrive; the pricing loop calls
+drain() with a budget of time or updates. Updates for a match that is already
+waiting are coalesced into one (later values win), so a burst of ticks costs
+one re-price. Each input keeps the source_time of the tick that last set
+it, and the merged update is priced against those (its latency counted from
+the oldest), so coalescing never makes an input look fresher than it is.
+drain() prices the waiting matches most urgent first, where
+urgency is a weighted sum of
+
+    goal        the update changes the score
+    exposure    worst-case loss of the match's open markets in the ledger,
+                as a share of the bankroll
+    late        how far into the match it is, with the last ten minutes (the
+                regime where time_decay_adjustment cuts the decay further)
+                counted in full
+    edge        the largest edge in the match's current recommendations
+    staleness   seconds the update has been waiting, over stale_after
+
+Whatever is still waiting after a drain is shed, lowest urgency first, until
+at most max_pending matches wait. Shedding only skips the re-price: the shed
+inputs (and their source times) are folded into the engine's state with
+LivePricingEngine.absorb(), so the next update of that match prices them.
+Updates that change the score are never shed. Every submit, coalesce,
+dispatch and shed is counted in stats().
+
+    scheduler = UpdateScheduler(engine, max_pending=200)
+    feed thread:    scheduler.submit(match_id, source_time=t, elapsed_minutes=63, home_sot=4)
+    pricing loop:   for match_id, prices in scheduler.drain(budget_seconds=0.05): ...
+"""
+import threading
+import time
+
+from bet_ledger import MARKET_OUTCOMES
+
+DEFAULT_WEIGHTS = {"goal": 10.0, "exposure": 5.0, "late": 2.0, "edge": 4.0, "staleness": 1.0}
+
+# Inputs on_goal() can price from the surface without a full re-price
+_SURFACE_KEYS = frozenset(("home_goals", "away_goals", "elapsed_minutes"))
+
+
+class PendingUpdate:
+    __slots__ = ("match_id", "changes", "source_times", "queued_at", "coalesced")
+
+    def __init__(self, match_id, changes, queued_at):
+        self.match_id = match_id
+        self.changes = changes
+        self.source_times = {}  # input key -> source_time of the tick that set it
+        self.queued_at = queued_at
+        self.coalesced = 0
+
+
+class UpdateScheduler:
+    def __init__(self, engine, max_pending=500, weights=None, stale_after=2.0, clock=time.monotonic):
+        self.engine = engine
+        self.max_pending = max_pending
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.stale_after = stale_after
+        self.clock = clock
+        self.pending = {}  # match_id -> PendingUpdate
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.shed = 0
+        self.shed_ticks = 0  # submitted ticks whose re-price was shed, counting coalesced ones
+        self.shed_inputs = 0  # input values folded into the engine's state by shedding
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def submit(self, match_id, source_time=None, **changes):
+        """
+        Queue changed inputs for a match, merging them into any update still waiting.
+        """
+        with self._lock:
+            self.submitted += 1
+            pending = self.pending.get(match_id)
+            if pending is None:
+                pending = self.pending[match_id] = PendingUpdate(match_id, changes, self.clock())
+            else:
+                pending.changes.update(changes)
+                pending.coalesced += 1
+                self.coalesced += 1
+            times = pending.source_times
+            for key in changes:
+                if source_time is None:
+                    times.pop(key, None)
+                else:
+                    times[key] = source_time
+
+    def urgency(self, pending, now=None):
+        """
+        Weighted urgency of a waiting update (see the module docstring).
+        """
+        now = self.clock() if now is None else now
+        w = self.weights
+        state = self.engine.matches.get(pending.match_id)
+        changes = pending.changes
+        score = 0.0
+        if state is None or self._changes_score(state, changes):
+            score += w["goal"]
+        elapsed = changes.get("elapsed_minutes", state["elapsed_minutes"] if state is not None else 0.0)
+        score += w["late"] * (1.0 if 90 - elapsed < 10 else max(0.0, elapsed / 90))
+        ledger = self.engine.ledger
+        if ledger is not None and ledger.open_liability > 0:
+            worst = sum(ledger.worst_case(pending.match_id, market) for market in MARKET_OUTCOMES)
+            bankroll = ledger.available_bankroll() + ledger.open_liability
+            score += w["exposure"] * (min(1.0, worst / bankroll) if bankroll > 0 else 1.0)
+        prices = self.engine.prices.get(pending.match_id)
+        if prices is not None:
+            edge = max(prices[market].get("edge", 0.0) for market in ("next_goal", "home", "draw", "away"))
+            score += w["edge"] * min(1.0, edge)
+        score += w["staleness"] * (now - pending.queued_at) / self.stale_after
+        return score
+
+    @staticmethod
+    def _changes_score(state, changes):
+        return (changes.get("home_goals", state["home_goals"]) != state["home_goals"] or
+                changes.get("away_goals", state["away_goals"]) != state["away_goals"])
+
+    def drain(self, budget_seconds=None, max_updates=None):
+        """
+        Price waiting updates, most urgent first, until the budget runs out or
+        nothing is waiting; then shed down to max_pending. Returns a list of
+        (match_id, prices) for the updates priced.
+        """
+        start = self.clock()
+        with self._lock:
+            ranked = sorted(self.pending.values(), key=lambda p: self.urgency(p, start), reverse=True)
+        priced = []
+        for pending in ranked:
+            if max_updates is not None and len(priced) >= max_updates:
+                break
+            if budget_seconds is not None and priced and self.clock() - start >= budget_seconds:
+                break
+            with self._lock:
+                # Take the latest merged changes; a submit after ranking has already been folded in
+                pending = self.pending.pop(pending.match_id, None)
+            if pending is None:
+                continue
+            priced.append((pending.match_id, self._dispatch(pending)))
+            wait = self.clock() - pending.queued_at
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        self.dispatched += len(priced)
+        self._shed(ranked)
+        return priced
+
+    def _dispatch(self, pending):
+        engine = self.engine
+        state = engine.matches.get(pending.match_id)
+        changes = pending.changes
+        source_times = pending.source_times
+        source_time = min(source_times.values()) if source_times else None
+        if state is not None and _SURFACE_KEYS.issuperset(changes):
+            return engine.on_goal(pending.match_id, changes.get("home_goals", state["home_goals"]),
+                                  changes.get("away_goals", state["away_goals"]),
+                                  changes.get("elapsed_minutes", state["elapsed_minutes"]), source_time)
+        return engine.update(pending.match_id, source_time, source_times, **changes)
+
+    def _shed(self, ranked):
+        shed = []
+        with self._lock:
+            excess = len(self.pending) - self.max_pending
+            if excess <= 0:
+                return
+            # Lowest urgency first; updates that arrived after ranking are kept
+            for pending in reversed(ranked):
+                if excess <= 0:
+                    break
+                current = self.pending.get(pending.match_id)
+                if current is not pending:
+                    continue
+                state = self.engine.matches.get(pending.match_id)
+                if state is None or self._changes_score(state, pending.changes):
+                    continue
+                del self.pending[pending.match_id]
+                shed.append(pending)
+                self.shed += 1
+                self.shed_ticks += 1 + pending.coalesced
+                self.shed_inputs += len(pending.changes)
+                excess -= 1
+        for pending in shed:
+            source_times = pending.source_times
+            source_time = min(source_times.values()) if source_times else None
+            self.engine.absorb(pending.match_id, source_time, source_times, **pending.changes)
+
+    def stats(self):
+        return {
+            "pending": len(self.pending),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "dispatched": self.dispatched,
+            "shed": self.shed,
+            "shed_ticks": self.shed_ticks,
+            "shed_inputs": self.shed_inputs,
+            "mean_wait_seconds": self.wait_total / self.dispatched if self.dispatched else 0.0,
+            "max_wait_seconds": self.wait_max,
+        }